@@ -0,0 +1,440 @@
+"""
+Micro-benchmark de l'extraction par regex de ClassificateurMedicamentsAlgerien.
+
+Compare analyser_format_algerian (modèles précompilés) à une copie figée de
+l'ancienne implémentation (modèles recompilés / recherchés un par un à chaque
+appel) sur un corpus déterministe dérivé de CAS_TESTS: variantes en
+majuscules, sur une seule ligne, lignes mélangées, bruit OCR et confusions de
+caractères. Vérifie d'abord que les deux versions donnent exactement les mêmes
+entités pour chaque étiquette, puis mesure les étiquettes/seconde.
+
+Mesure aussi le mode bibliothèque: predire() avec sa sortie console contre
+ExtracteurMedicaments.analyser_format_algerian, et predire_lot() sur un gros
+corpus en 1 puis N processus. Détaille enfin le temps passé dans chaque
+extracteur de REGISTRE_CHAMPS, et le débit quand seuls quelques champs sont
+demandés (--champs).
+
+Usage:
+    python benchmark_extraction.py
+    python benchmark_extraction.py --labels 5000 --repeat 5 --lot 50000 --processus 8
+    python benchmark_extraction.py --champs numero_lot date_peremption
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from reberta_med_classification import CAS_TESTS, REGISTRE_CHAMPS, ClassificateurMedicamentsAlgerien, ExtracteurMedicaments
+
+ROOT = Path(__file__).resolve().parent.parent
+OCR_OUTPUT = ROOT / "text_extraction" / "ocr_output.json"
+
+# Cas limites ajoutés au corpus tels quels
+CAS_LIMITES = [
+    "NADPHARMAGIC 20 mg Comprimés B/30 LOT 12",
+    "VIGNETTE-SAIDAL PARALGAN 500mg/30mg - Paracétamol - B/16 Comprimés",
+    "HIKMA AMOXIL 1 g - Amoxicilline - Poudre - EXP: 03-27",
+    "Crème 1% B/1 tube 15 g PPA 120.00DA",
+    "COMPRIMÉS 0.5 mcg 250 µg 5 ml Sirop LOT N° 4A/12 D.E: 12/34/567 - LOT",
+    "Boîte de 20 Gélules - 10mg - Oméprazole - N° D.E 23/11 - FAB 01/2025 EXP 01/2027",
+    "",
+    "- - -",
+]
+
+# Confusions de caractères typiques de Tesseract sur les vignettes
+CONFUSIONS = {'O': '0', '0': 'O', 'I': '1', 'l': '1', 'S': '5', 'B': '8', 'e': 'é', 'g': 'q'}
+
+
+def mots_bruit_ocr() -> List[str]:
+    """Jetons parasites réels tirés de text_extraction/ocr_output.json"""
+    try:
+        with open(OCR_OUTPUT, 'r', encoding='utf-8') as f:
+            mots = json.load(f).get('clean_text_one_line', '').split()
+    except (OSError, ValueError):
+        mots = []
+    return mots or ['Ï', 'LD', 'NPE', '©', 'Ÿ', '|', '_', 'SRE']
+
+
+def construire_corpus(nombre: int, graine: int = 0) -> List[str]:
+    """Corpus déterministe de `nombre` étiquettes"""
+    aleatoire = random.Random(graine)
+    bruit = mots_bruit_ocr()
+    bases = [cas['texte'] for cas in CAS_TESTS]
+
+    corpus = list(CAS_LIMITES) + bases
+    while len(corpus) < nombre:
+        texte = aleatoire.choice(bases)
+        lignes = [l for l in texte.replace(' - ', '\n').split('\n') if l.strip()]
+
+        if aleatoire.random() < 0.5:
+            aleatoire.shuffle(lignes)
+        if aleatoire.random() < 0.3:
+            lignes = [aleatoire.choice(bruit) + ' ' + l if aleatoire.random() < 0.3 else l for l in lignes]
+            lignes.insert(aleatoire.randrange(len(lignes) + 1), ' '.join(aleatoire.sample(bruit, 5)))
+        separateur = aleatoire.choice(['\n', ' ', ' - '])
+        texte = separateur.join(lignes)
+
+        if aleatoire.random() < 0.2:
+            texte = texte.upper()
+        if aleatoire.random() < 0.3:
+            texte = ''.join(
+                CONFUSIONS.get(c, c) if aleatoire.random() < 0.05 else c
+                for c in texte
+            )
+        corpus.append(texte)
+    return corpus[:nombre]
+
+
+# ==================================================
+# RÉFÉRENCE: ancienne implémentation (ne pas modifier)
+# ==================================================
+def analyser_reference(clf: ExtracteurMedicaments, texte: str) -> Dict[str, List[str]]:
+    """Copie figée de l'ancien analyser_format_algerian (regex recompilées à chaque appel)"""
+
+    entites = {
+        'nom_medicament': [],
+        'principe_actif': [],
+        'dosage': [],
+        'forme_pharmaceutique': [],
+        'entreprise': [],
+        'numero_lot': [],
+        'date_fabrication': [],
+        'date_peremption': [],
+        'prix': [],
+        'numero_enregistrement': []
+    }
+
+    # Normaliser le texte (gère l'entrée multi-ligne)
+    texte = re.sub(r'\s+', ' ', texte).strip()
+    texte_maj = texte.upper()
+
+    # ==================== ENTREPRISE ====================
+    entreprise_trouvee = None
+    for entreprise in clf.entreprises_algeriennes:
+        modeles = [
+            rf'\b{entreprise}\b',
+            rf'VIGNETTE[-\s]*{entreprise}',
+            rf'{entreprise}[-\s]*VIGNETTE',
+            rf'\b{entreprise}[-\s]+[A-Z]',
+        ]
+        for modele in modeles:
+            if re.search(modele, texte_maj):
+                entites['entreprise'].append(entreprise)
+                entreprise_trouvee = entreprise
+                break
+        if entreprise_trouvee:
+            break
+
+    # ==================== NOM DU MÉDICAMENT ====================
+    nom_medicament = None
+
+    # Stratégie 1: modèle ENTREPRISE-MEDICAMENT
+    if entreprise_trouvee:
+        modele = rf'{entreprise_trouvee}[-\s]+([A-Z][A-Z\s&\.]+?)(?:\s+\d+(?:\.\d+)?(?:mg|g|%)|(?:\s+-\s+)|(?:\s+L\.?P\.?))'
+        correspondance = re.search(modele, texte, re.IGNORECASE)
+        if correspondance:
+            nom_medicament = correspondance.group(1).strip()
+
+    # Stratégie 2: chercher le mot en majuscules avant le dosage
+    if not nom_medicament:
+        modele = r'\b([A-Z][A-Z]+(?:\s+[A-Z\.&LP]+)*)\s+\d+(?:\.\d+)?(?:mg|g|%)'
+        correspondance = re.search(modele, texte)
+        if correspondance:
+            nom_potentiel = correspondance.group(1).strip()
+            if nom_potentiel.upper() not in clf.entreprises_algeriennes:
+                nom_medicament = nom_potentiel
+
+    # Stratégie 3: chercher le modèle "dosage MEDICAMENT" ou "dosage MEDICAMENT"
+    if not nom_medicament:
+        modele = r'\d+(?:\.\d+)?\s*(?:mg|g|%|ml)\s+([A-Z][A-Z]+(?:\s+[A-Z\.&LP]+)*)'
+        correspondance = re.search(modele, texte)
+        if correspondance:
+            nom_potentiel = correspondance.group(1).strip()
+            if nom_potentiel.upper() not in clf.entreprises_algeriennes and nom_potentiel.upper() not in ['VIGNETTE', 'PRIX', 'LOT', 'FAB', 'EXP', 'PER']:
+                nom_medicament = nom_potentiel
+
+    # Stratégie 4: chercher un mot en majuscules à la FIN (format mélangé comme "... - CLAMOXYL")
+    if not nom_medicament:
+        modele = r'-\s+([A-Z]{3,}(?:\s+[A-Z\.&LP]+)*)\s*$'
+        correspondance = re.search(modele, texte)
+        if correspondance:
+            nom_potentiel = correspondance.group(1).strip()
+            if nom_potentiel.upper() not in clf.entreprises_algeriennes and nom_potentiel.upper() not in ['VIGNETTE', 'PRIX', 'LOT', 'FAB', 'EXP', 'PER']:
+                nom_medicament = nom_potentiel
+
+    # Stratégie 5: premier mot en majuscules qui n'est pas une entreprise
+    if not nom_medicament:
+        modele = r'\b([A-Z]{3,}(?:\s+[A-Z\.&LP]+)*)\b'
+        correspondances = re.findall(modele, texte)
+        for correspondance in correspondances:
+            if correspondance.upper() not in clf.entreprises_algeriennes and correspondance.upper() not in ['VIGNETTE', 'PRIX', 'LOT', 'FAB', 'EXP', 'PER']:
+                nom_medicament = correspondance
+                break
+
+    if nom_medicament:
+        entites['nom_medicament'].append(nom_medicament)
+
+    # ==================== PRINCIPE ACTIF ====================
+    modele_principe = r'-\s+([A-Z][a-zéèêàç]+(?:\s+[A-Z]?[a-zéèêàç]+)*)\s+-'
+    correspondances_principe = re.findall(modele_principe, texte)
+    for principe in correspondances_principe:
+        if nom_medicament and principe.upper() != nom_medicament.upper():
+            entites['principe_actif'].append(principe.strip())
+
+    # Modèle 2: mots avec "mg" ou dosage contenant des mots-clés de principes
+    if not entites['principe_actif']:
+        modele = r'\d+(?:\.\d+)?\s*(?:mg|g|%|ml)\s*[–-]\s*([a-zéèêàç\s]+(?:sodique|chlorhydrate|sulfate|phosphate|base|acide))'
+        correspondance = re.search(modele, texte, re.IGNORECASE)
+        if correspondance:
+            entites['principe_actif'].append(correspondance.group(1).strip())
+
+    # Modèle 3: chercher le modèle "dosage PRINCIPE" (ex: "1g AMOXICILLINE")
+    if not entites['principe_actif']:
+        modele = r'\d+(?:\.\d+)?\s*(?:mg|g|%|ml)\s+([A-Z][A-Z]+)'
+        correspondance = re.search(modele, texte)
+        if correspondance:
+            principe_potentiel = correspondance.group(1).strip()
+            if principe_potentiel.upper() not in clf.entreprises_algeriennes and (not nom_medicament or principe_potentiel != nom_medicament):
+                entites['principe_actif'].append(principe_potentiel)
+
+    # Modèle 4: mots en casse mixte contenant des mots-clés de principes
+    if not entites['principe_actif']:
+        modele = r'\b([A-Z][a-zéèêàç]+(?:\s+[a-zéèêàç]+)?)\b'
+        correspondances = re.findall(modele, texte)
+        for correspondance in correspondances:
+            correspondance_min = correspondance.lower()
+            if any(mot in correspondance_min for mot in clf.mots_cles_principes):
+                entites['principe_actif'].append(correspondance)
+                break
+
+    # ==================== DOSAGE ====================
+    modeles_dosage = [
+        r'\b(\d+(?:\.\d+)?\s*mg(?:/\d+(?:\.\d+)?mg)?)\b',
+        r'\b(\d+(?:\.\d+)?\s*g)\b',
+        r'\b(\d+(?:\.\d+)?\s*ml)\b',
+        r'\b(\d+(?:\.\d+)?\s*%)\b',
+        r'\b(\d+(?:\.\d+)?\s*mcg)\b',
+        r'\b(\d+(?:\.\d+)?\s*µg)\b',
+    ]
+    for modele in modeles_dosage:
+        correspondances = re.findall(modele, texte, re.IGNORECASE)
+        for correspondance in correspondances:
+            correspondance_normalisee = re.sub(r'\s+', '', correspondance)
+            if correspondance_normalisee not in entites['dosage']:
+                entites['dosage'].append(correspondance_normalisee)
+
+    # ==================== FORME PHARMACEUTIQUE ====================
+    modeles_forme = [
+        (r'([A-Za-zéèêàç]+)\s*/?\s*[BbEe]/?(\d+)', lambda m: f"{m.group(2)} {m.group(1).lower()}"),
+        (r'[Bb]o[iî]te\s+de\s+(\d+)\s+([A-Za-zéèêàç]+)', lambda m: f"{m.group(1)} {m.group(2).lower()}"),
+        (r'([A-Za-zéèêàç]+)\s+boîte\s+de\s+(\d+)', lambda m: f"{m.group(2)} {m.group(1).lower()}"),
+        (r'[BbEe]/?(\d+)\s+([A-Za-zéèêàç]+)', lambda m: f"{m.group(1)} {m.group(2).lower()}"),
+    ]
+
+    for modele, formateur in modeles_forme:
+        correspondance = re.search(modele, texte, re.IGNORECASE)
+        if correspondance:
+            try:
+                mot_forme = correspondance.group(2) if len(correspondance.groups()) >= 2 else correspondance.group(1)
+            except:
+                continue
+
+            if any(f in mot_forme.lower() for f in clf.formes_pharmaceutiques):
+                entites['forme_pharmaceutique'].append(formateur(correspondance))
+                break
+
+    # Modèle pour les formes autonomes (ex: "Comprimés" sur sa propre ligne)
+    if not entites['forme_pharmaceutique']:
+        for forme in clf.formes_pharmaceutiques:
+            modele = rf'\b({forme})\b'
+            correspondance = re.search(modele, texte, re.IGNORECASE)
+            if correspondance:
+                entites['forme_pharmaceutique'].append(correspondance.group(1).lower())
+                break
+
+    # ==================== NUMÉRO DE LOT ====================
+    modeles_lot = [
+        r'LOT\s*[n°:]*\s*:?\s*([A-Z0-9]+(?:\s*/?\s*\d+)?)',
+        r'N°?\s*LOT\s*:?\s*([A-Z0-9\s/]+?)(?:\s+-|\s+FAB|\s+PER|\s+EXP|$)',
+        r'Lot\s+n°?\s*:?\s*([A-Z0-9\s]+?)(?:\s+-|\s+FAB|$)',
+        r'LOT\s+([A-Z0-9]+)',
+    ]
+    for modele in modeles_lot:
+        correspondance = re.search(modele, texte, re.IGNORECASE)
+        if correspondance:
+            lot = correspondance.group(1).strip()
+            lot = re.sub(r'\s+', ' ', lot)
+            entites['numero_lot'].append(lot)
+            break
+
+    # ==================== DATE DE FABRICATION ====================
+    modeles_fab = [
+        r'FAB(?:RICATO?)?\s*[B:]?\s*:?\s*(\d{1,2}[-/]\d{2,4})',
+        r'Date\s+Fab(?:rication)?\s*:?\s*(\d{1,2}[-/]\d{2,4})',
+        r'Fab\s*:?\s*(\d{1,2}[-/]\d{2,4})',
+        r'FAB\s+(\d{2}-\d{4})',
+        r'FAB\s+(\d{2}-\d{2})',
+        r'\bFAB\s+(\d{2}/\d{4})',
+    ]
+    for modele in modeles_fab:
+        correspondance = re.search(modele, texte, re.IGNORECASE)
+        if correspondance:
+            entites['date_fabrication'].append(correspondance.group(1))
+            break
+
+    # ==================== DATE DE PÉREMPTION ====================
+    modeles_exp = [
+        r'(?:PER(?:IOD[OI])?|EXP(?:IRATION)?)\s*:?\s*(\d{1,2}[-/]\d{2,4})',
+        r'Date\s+Exp(?:iration)?\s*:?\s*(\d{1,2}[-/]\d{2,4})',
+        r'Péremption\s*:?\s*(\d{1,2}[-/]\d{2,4})',
+        r'EXP\s+(\d{2}-\d{4})',
+        r'EXP:\s*(\d{2}-\d{2})',
+        r'\bEXP\s+(\d{2}/\d{4})',
+    ]
+    for modele in modeles_exp:
+        correspondance = re.search(modele, texte, re.IGNORECASE)
+        if correspondance:
+            entites['date_peremption'].append(correspondance.group(1))
+            break
+
+    # ==================== PRIX ====================
+    modeles_prix = [
+        r'TR\s*[=:]\s*(\d+(?:\.\d+)?)\s*DA',
+        r'T\.R\s*[=:]\s*(\d+(?:\.\d+)?)\s*DA',
+        r'Tarif\s+de\s+Réf?(?:érence)?\s*[=:]\s*(\d+(?:\.\d+)?)\s*DA',
+        r'PPA\s*[=:+]?\s*(\d+(?:\.\d+)?)\s*DA',
+        r'Prix\s*[+]?\s*SHP\s*[=:]\s*(\d+(?:\.\d+)?)',
+        r'PRIX\s*[=:]\s*(\d+(?:\.\d+)?)',
+        r'PRIX\s+(\d+(?:\.\d+)?)DA',
+        r'TR\s+(\d+(?:\.\d+)?)DA',
+        r'T\.R\s+(\d+(?:\.\d+)?)DA',
+    ]
+    for modele in modeles_prix:
+        correspondance = re.search(modele, texte, re.IGNORECASE)
+        if correspondance:
+            prix = correspondance.group(1)
+            entites['prix'].append(prix + ' DA')
+            break
+
+    # ==================== NUMÉRO D'ENREGISTREMENT (D.E) ====================
+    modeles_de = [
+        r'D\.?E\s*[n°]*\s*:?\s*([\d/A-Z\s]+?)(?:\s+-|\s+LOT|\s+FAB|\s+\d{4}/\d{4}|$)',
+        r'N°\s*D\.?E\s*:?\s*([\d/A-Z\s]+?)(?:\s+-|$)',
+    ]
+    for modele in modeles_de:
+        correspondance = re.search(modele, texte, re.IGNORECASE)
+        if correspondance:
+            num_de = correspondance.group(1).strip()
+            num_de = re.sub(r'\s+', ' ', num_de)
+            num_de = re.sub(r'\s+\d{4}$', '', num_de)
+            if num_de:
+                entites['numero_enregistrement'].append(num_de)
+                break
+
+    return entites
+
+
+def mesurer(analyser, corpus: List[str], repetitions: int) -> float:
+    """Meilleur débit (étiquettes/s) sur `repetitions` passes"""
+    meilleur = float('inf')
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        for texte in corpus:
+            analyser(texte)
+        meilleur = min(meilleur, time.perf_counter() - debut)
+    return len(corpus) / meilleur
+
+
+def principale():
+    parser = argparse.ArgumentParser(description="Benchmark de l'extraction regex (avant / après précompilation)")
+    parser.add_argument('--labels', type=int, default=2000, help="Taille du corpus")
+    parser.add_argument('--repeat', type=int, default=3, help="Passes chronométrées (on garde la meilleure)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--lot', type=int, default=20000, help="Taille du corpus de predire_lot (0 = ignorer)")
+    parser.add_argument('--processus', type=int, default=os.cpu_count() or 1, help="Processus de predire_lot")
+    parser.add_argument('--champs', nargs='+', default=['numero_lot', 'date_peremption'],
+                        choices=list(REGISTRE_CHAMPS), help="Champs de la mesure d'extraction partielle")
+    args = parser.parse_args()
+
+    # La référence ne connaît que les regex: comparer sans nomenclature
+    os.environ.pop('DICTIONNAIRE_MEDICAMENTS', None)
+    classificateur = ExtracteurMedicaments()
+    corpus = construire_corpus(args.labels, args.seed)
+    print(f"📚 Corpus: {len(corpus)} étiquettes")
+
+    # ==================== IDENTITÉ ====================
+    differences = 0
+    for texte in corpus:
+        attendu = analyser_reference(classificateur, texte)
+        obtenu = classificateur.analyser_format_algerian(texte)
+        if attendu != obtenu:
+            differences += 1
+            if differences <= 5:
+                print(f"\n❌ Sortie différente pour: {texte!r}")
+                print(f"   avant: {attendu}")
+                print(f"   après: {obtenu}")
+    if differences:
+        print(f"\n❌ {differences} étiquette(s) avec une sortie différente")
+        sys.exit(1)
+    print("✅ Sorties identiques sur tout le corpus")
+
+    # ==================== DÉBIT ====================
+    avant = mesurer(lambda t: analyser_reference(classificateur, t), corpus, args.repeat)
+    apres = mesurer(classificateur.analyser_format_algerian, corpus, args.repeat)
+    print(f"\n{'Version':<22}{'étiquettes/s':>14}")
+    print(f"{'avant (référence)':<22}{avant:>14.0f}")
+    print(f"{'après (précompilé)':<22}{apres:>14.0f}")
+    print(f"\n⚡ Accélération: x{apres / avant:.2f}")
+
+    # ==================== MODE BIBLIOTHÈQUE ====================
+    with open(os.devnull, 'w', encoding='utf-8') as nul, contextlib.redirect_stdout(nul):
+        console = ClassificateurMedicamentsAlgerien(results_dir=os.path.join(ROOT, "Classifier", "results"))
+        avec_console = mesurer(console.predire, corpus, args.repeat)
+    print(f"\n{'predire() (console)':<22}{avec_console:>14.0f}")
+    print(f"{'extraction pure':<22}{apres:>14.0f}")
+
+    # ==================== PAR EXTRACTEUR ====================
+    durees = {}
+    for texte in corpus:
+        classificateur.analyser_format_algerian(texte, durees=durees)
+    total = sum(durees.values())
+    print(f"\n{'Extracteur':<24}{'µs/étiquette':>14}{'part':>8}")
+    for nom, duree in sorted(durees.items(), key=lambda e: -e[1]):
+        print(f"{nom:<24}{duree / len(corpus) * 1e6:>14.1f}{duree / total:>8.0%}")
+
+    for texte in corpus:
+        complet = classificateur.analyser_format_algerian(texte)
+        partiel = classificateur.analyser_format_algerian(texte, args.champs)
+        if partiel != {champ: complet[champ] for champ in args.champs}:
+            print(f"❌ Extraction partielle différente pour: {texte!r}")
+            sys.exit(1)
+    partiel = mesurer(lambda t: classificateur.analyser_format_algerian(t, args.champs), corpus, args.repeat)
+    print(f"\n{'Champs demandés':<40}{'étiquettes/s':>14}")
+    print(f"{'tous':<40}{apres:>14.0f}")
+    print(f"{', '.join(args.champs):<40}{partiel:>14.0f}")
+
+    if args.lot > 0:
+        gros_corpus = construire_corpus(args.lot, args.seed + 1)
+        print(f"\n📦 predire_lot sur {len(gros_corpus)} étiquettes")
+        debut = time.perf_counter()
+        sequentiel = classificateur.predire_lot(gros_corpus)
+        duree = time.perf_counter() - debut
+        print(f"{'1 processus':<22}{len(gros_corpus) / duree:>14.0f}")
+        if args.processus > 1:
+            debut = time.perf_counter()
+            parallele = classificateur.predire_lot(gros_corpus, processus=args.processus)
+            duree = time.perf_counter() - debut
+            print(f"{f'{args.processus} processus':<22}{len(gros_corpus) / duree:>14.0f}")
+            if parallele != sequentiel:
+                print("❌ predire_lot multi-processus diffère du séquentiel")
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    principale()
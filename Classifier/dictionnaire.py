@@ -0,0 +1,437 @@
+"""
+Dictionnaire des laboratoires, noms commerciaux et principes actifs (DCI).
+
+Conçu pour la nomenclature nationale complète (des milliers d'entrées):
+    - correspondances exactes: automate d'Aho-Corasick, un seul passage sur
+      le texte quel que soit le nombre de termes
+    - correspondances approchées: index de suppressions SymSpell (distance de
+      Levenshtein) pour les confusions OCR qui survivent au pliage
+      (ex: "SAIDAI", "BI0PHARN")
+
+Le texte et les termes sont d'abord "pliés" caractère par caractère
+(majuscules, sans accents, 0->O, 1->I, 5->S, 8->B, |->I), ce qui conserve les
+positions et absorbe les confusions OCR les plus fréquentes sans calcul de
+distance.
+
+Source CSV (en-tête obligatoire, `canonique` optionnel pour les synonymes):
+    terme,categorie,canonique
+    SAIDAL,entreprise,
+    DOLIPRANE,nom_medicament,
+    PARACETAMOL,principe_actif,Paracétamol
+
+Usage:
+    python dictionnaire.py construire nomenclature.csv -o nomenclature.idx
+    python dictionnaire.py chercher nomenclature.idx "VIGNETTE-5AIDAL D0LIPRANE 500mg"
+
+L'index est un pickle: ne charger que des index produits localement.
+"""
+import argparse
+import csv
+import pickle
+import sys
+import time
+import unicodedata
+from collections import deque
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+CATEGORIES = ('entreprise', 'nom_medicament', 'principe_actif')
+VERSION_INDEX = 1
+
+# Confusions OCR absorbées par le pliage (un caractère -> un caractère)
+CONFUSIONS_OCR = {'0': 'O', '1': 'I', '|': 'I', '5': 'S', '8': 'B'}
+
+# Longueur minimale d'un mot pour une recherche approchée, et distance tolérée
+LONGUEUR_MIN_APPROCHEE = 5
+
+
+def distance_max(longueur: int) -> int:
+    """Distance d'édition tolérée pour un mot plié de cette longueur"""
+    if longueur < LONGUEUR_MIN_APPROCHEE:
+        return 0
+    return 1 if longueur <= 8 else 2
+
+
+_cache_pliage: Dict[str, str] = {}
+
+
+def _plier_caractere(c: str) -> str:
+    plie = _cache_pliage.get(c)
+    if plie is None:
+        plie = CONFUSIONS_OCR.get(c)
+        if plie is None:
+            base = unicodedata.normalize('NFD', c)[0]
+            majuscule = base.upper()
+            # Garder la correspondance 1 pour 1 (ex: 'ß'.upper() == 'SS')
+            plie = majuscule if len(majuscule) == 1 else base
+        _cache_pliage[c] = plie
+    return plie
+
+
+def plier(texte: str) -> str:
+    """Majuscules, sans accents, confusions OCR ramenées à la lettre; même longueur que l'entrée"""
+    return ''.join(_plier_caractere(c) for c in texte)
+
+
+def levenshtein(a: str, b: str) -> int:
+    if len(a) < len(b):
+        a, b = b, a
+    precedente = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        courante = [i]
+        for j, cb in enumerate(b, 1):
+            courante.append(min(
+                precedente[j] + 1,
+                courante[j - 1] + 1,
+                precedente[j - 1] + (ca != cb)
+            ))
+        precedente = courante
+    return precedente[-1]
+
+
+class Correspondance(NamedTuple):
+    terme: str          # forme canonique
+    categorie: str
+    debut: int          # positions dans le texte analysé
+    fin: int
+    distance: int       # 0 = exacte (après pliage)
+
+
+# ==================================================
+# AHO-CORASICK
+# ==================================================
+class AhoCorasick:
+    """
+    Automate à tableaux plats (picklable sans récursion):
+        transitions[etat]  {caractère: état suivant}
+        echec[etat]        lien d'échec
+        sortie[etat]       id du motif qui se termine ici, -1 sinon
+        lien_sortie[etat]  état de sortie le plus proche sur la chaîne d'échec, -1 sinon
+    """
+
+    def __init__(self, motifs: List[str]):
+        self.longueurs = [len(m) for m in motifs]
+        self.transitions: List[Dict[str, int]] = [{}]
+        self.sortie = [-1]
+
+        for id_motif, motif in enumerate(motifs):
+            etat = 0
+            for c in motif:
+                suivant = self.transitions[etat].get(c)
+                if suivant is None:
+                    suivant = len(self.transitions)
+                    self.transitions[etat][c] = suivant
+                    self.transitions.append({})
+                    self.sortie.append(-1)
+                etat = suivant
+            self.sortie[etat] = id_motif
+
+        self.echec = [0] * len(self.transitions)
+        self.lien_sortie = [-1] * len(self.transitions)
+        file = deque(self.transitions[0].values())
+        while file:
+            etat = file.popleft()
+            for c, suivant in self.transitions[etat].items():
+                repli = self.echec[etat]
+                while repli and c not in self.transitions[repli]:
+                    repli = self.echec[repli]
+                cible = self.transitions[repli].get(c, 0)
+                self.echec[suivant] = cible if cible != suivant else 0
+                cible = self.echec[suivant]
+                self.lien_sortie[suivant] = cible if self.sortie[cible] >= 0 else self.lien_sortie[cible]
+                file.append(suivant)
+
+    def rechercher(self, texte: str) -> Iterator[Tuple[int, int, int]]:
+        """Toutes les occurrences (début, fin, id du motif), chevauchements compris"""
+        transitions, echec = self.transitions, self.echec
+        etat = 0
+        for position, c in enumerate(texte):
+            while etat and c not in transitions[etat]:
+                etat = echec[etat]
+            etat = transitions[etat].get(c, 0)
+
+            sortie = etat if self.sortie[etat] >= 0 else self.lien_sortie[etat]
+            while sortie > 0:
+                id_motif = self.sortie[sortie]
+                yield position + 1 - self.longueurs[id_motif], position + 1, id_motif
+                sortie = self.lien_sortie[sortie]
+
+
+# ==================================================
+# SYMSPELL
+# ==================================================
+def _suppressions(mot: str, distance: int) -> set:
+    """`mot` et toutes ses variantes à au plus `distance` suppressions"""
+    variantes = {mot}
+    niveau = {mot}
+    for _ in range(distance):
+        niveau = {v[:i] + v[i + 1:] for v in niveau if len(v) > 1 for i in range(len(v))}
+        variantes |= niveau
+    return variantes
+
+
+class IndexSymSpell:
+    """
+    Index par suppressions (SymSpell): chaque clé est indexée sous toutes ses
+    variantes à `distance_max(len(clé))` suppressions près. Une recherche ne
+    génère que les suppressions du mot cherché et vérifie les quelques clés
+    qui partagent une variante, au lieu de parcourir le vocabulaire.
+    """
+
+    def __init__(self, cles: List[str]):
+        self.cles = cles
+        variantes: Dict[str, List[int]] = {}
+        for id_cle, cle in enumerate(cles):
+            for variante in _suppressions(cle, distance_max(len(cle))):
+                variantes.setdefault(variante, []).append(id_cle)
+        # Presque toutes les variantes ne désignent qu'une clé: un int plutôt
+        # qu'une liste divise par ~4 le temps de chargement de l'index
+        self.variantes: Dict[str, Union[int, Tuple[int, ...]]] = {
+            variante: ids[0] if len(ids) == 1 else tuple(ids)
+            for variante, ids in variantes.items()
+        }
+
+    def rechercher(self, mot: str, distance: int) -> List[Tuple[int, str]]:
+        """Clés à au plus `distance` de `mot` (et dans leur propre tolérance), triées par distance"""
+        candidates = set()
+        for variante in _suppressions(mot, distance):
+            ids = self.variantes.get(variante)
+            if ids is None:
+                continue
+            if isinstance(ids, int):
+                candidates.add(ids)
+            else:
+                candidates.update(ids)
+        resultats = []
+        for id_cle in candidates:
+            cle = self.cles[id_cle]
+            tolerance = min(distance, distance_max(len(cle)))
+            if abs(len(cle) - len(mot)) > tolerance:
+                continue
+            d = levenshtein(mot, cle)
+            if d <= tolerance:
+                resultats.append((d, cle))
+        resultats.sort()
+        return resultats
+
+
+# ==================================================
+# DICTIONNAIRE
+# ==================================================
+class Dictionnaire:
+    """
+    Termes pliés -> (forme canonique, catégorie).
+
+    Usage:
+        dictionnaire = Dictionnaire.charger("nomenclature.csv")   # ou un index .idx
+        dictionnaire.trouver(texte)   # {catégorie: [Correspondance, ...]} dans l'ordre du texte
+    """
+
+    def __init__(self):
+        self.termes: Dict[str, List[Tuple[str, str]]] = {}
+        self._automate: Optional[AhoCorasick] = None
+        self._motifs: List[str] = []
+        self._approchees: Optional[IndexSymSpell] = None
+        self._tailles_ngrammes: Tuple[int, ...] = ()
+
+    def __len__(self) -> int:
+        return len(self.termes)
+
+    def ajouter(self, terme: str, categorie: str, canonique: Optional[str] = None):
+        if categorie not in CATEGORIES:
+            raise ValueError(f"Catégorie inconnue: {categorie} (attendu: {', '.join(CATEGORIES)})")
+        cle = ' '.join(plier(terme).split())
+        if not cle:
+            return
+        entree = (canonique or terme.strip(), categorie)
+        entrees = self.termes.setdefault(cle, [])
+        if entree not in entrees:
+            entrees.append(entree)
+        self._automate = None
+
+    def contient(self, mot: str, categorie: str) -> bool:
+        """Le mot (plié) est-il un terme exact de cette catégorie ?"""
+        return any(c == categorie for _, c in self.termes.get(' '.join(plier(mot).split()), ()))
+
+    def compiler(self):
+        """(Re)construire l'automate et l'index approché après des ajouts"""
+        self._motifs = list(self.termes)
+        self._automate = AhoCorasick(self._motifs)
+        approchables = [cle for cle in self._motifs if len(cle) >= LONGUEUR_MIN_APPROCHEE]
+        self._approchees = IndexSymSpell(approchables) if approchables else None
+        # Le texte n'est découpé qu'en n-grammes ayant le nombre de mots d'un terme
+        self._tailles_ngrammes = tuple(sorted({cle.count(' ') + 1 for cle in approchables}, reverse=True))
+
+    # ------------------------------------------------------------------
+    # Recherche
+    # ------------------------------------------------------------------
+    def trouver(self, texte: str, approchee: bool = True) -> Dict[str, List[Correspondance]]:
+        """
+        Termes présents dans le texte, par catégorie, dans l'ordre du texte.
+        Les correspondances exactes (sur mots entiers) passent en premier sur
+        leur étendue; les mots restants sont cherchés avec une distance d'édition.
+        """
+        if self._automate is None:
+            self.compiler()
+
+        texte_plie = plier(texte)
+        # occupe[i] = index dans `retenues` de l'étendue qui couvre le caractère i
+        occupe = [-1] * len(texte_plie)
+        retenues: List[Optional[List[Correspondance]]] = []
+
+        # Exactes: la plus longue d'abord, sans chevauchement
+        candidates = [
+            (debut, fin, id_motif)
+            for debut, fin, id_motif in self._automate.rechercher(texte_plie)
+            if _mot_entier(texte_plie, debut, fin)
+        ]
+        candidates.sort(key=lambda c: (c[0] - c[1], c[0]))
+        for debut, fin, id_motif in candidates:
+            if any(i >= 0 for i in occupe[debut:fin]):
+                continue
+            _retenir(retenues, occupe, debut, fin, [
+                Correspondance(terme, categorie, debut, fin, 0)
+                for terme, categorie in self.termes[self._motifs[id_motif]]
+            ])
+
+        if approchee and self._approchees is not None:
+            self._trouver_approchees(texte_plie, occupe, retenues)
+
+        resultat: Dict[str, List[Correspondance]] = {}
+        trouvees = [c for correspondances in retenues if correspondances for c in correspondances]
+        for correspondance in sorted(trouvees, key=lambda c: (c.debut, c.distance)):
+            resultat.setdefault(correspondance.categorie, []).append(correspondance)
+        return resultat
+
+    def _trouver_approchees(self, texte_plie: str, occupe: List[int],
+                            retenues: List[Optional[List[Correspondance]]]):
+        mots = _mots(texte_plie)
+        # n-grammes les plus longs d'abord pour les termes composés ("ACIDE FOLIQUE").
+        # Un terme composé approché remplace les termes exacts plus courts qu'il
+        # englobe entièrement ("Diclofenac sodlque" -> DICLOFENAC SODIQUE, pas DICLOFENAC)
+        for n in self._tailles_ngrammes:
+            for i in range(len(mots) - n + 1):
+                debut, fin = mots[i][0], mots[i + n - 1][1]
+                chevauchees = {j for j in occupe[debut:fin] if j >= 0}
+                if n == 1 and chevauchees:
+                    continue
+                if any(not _englobe(retenues[j], debut, fin) for j in chevauchees):
+                    continue
+                candidat = ' '.join(texte_plie[d:f] for d, f in mots[i:i + n])
+                tolerance = distance_max(len(candidat))
+                if tolerance == 0:
+                    continue
+                proches = self._approchees.rechercher(candidat, tolerance)
+                if not proches:
+                    continue
+                distance, cle = proches[0]
+                for j in chevauchees:
+                    retenues[j] = None
+                _retenir(retenues, occupe, debut, fin, [
+                    Correspondance(terme, categorie, debut, fin, distance)
+                    for terme, categorie in self.termes[cle]
+                ])
+
+    # ------------------------------------------------------------------
+    # Chargement / sauvegarde
+    # ------------------------------------------------------------------
+    @classmethod
+    def depuis_csv(cls, chemin: str) -> "Dictionnaire":
+        dictionnaire = cls()
+        with open(chemin, 'r', encoding='utf-8-sig', newline='') as f:
+            lecteur = csv.DictReader(f)
+            if not lecteur.fieldnames or not {'terme', 'categorie'} <= set(lecteur.fieldnames):
+                raise ValueError(f"{chemin}: colonnes 'terme' et 'categorie' requises")
+            for numero, ligne in enumerate(lecteur, 2):
+                try:
+                    dictionnaire.ajouter(ligne['terme'] or '', (ligne['categorie'] or '').strip(),
+                                         (ligne.get('canonique') or '').strip() or None)
+                except ValueError as e:
+                    raise ValueError(f"{chemin}:{numero}: {e}") from None
+        dictionnaire.compiler()
+        return dictionnaire
+
+    def enregistrer(self, chemin: str):
+        """Sauvegarder l'index compilé (automate + index approché) pour un démarrage rapide"""
+        if self._automate is None:
+            self.compiler()
+        with open(chemin, 'wb') as f:
+            pickle.dump({'version': VERSION_INDEX, 'dictionnaire': self}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def charger(cls, chemin: str) -> "Dictionnaire":
+        """Charger un CSV (compilé à la volée) ou un index produit par enregistrer()"""
+        if str(chemin).lower().endswith('.csv'):
+            return cls.depuis_csv(chemin)
+        with open(chemin, 'rb') as f:
+            contenu = pickle.load(f)
+        if not isinstance(contenu, dict) or contenu.get('version') != VERSION_INDEX:
+            raise ValueError(f"{chemin}: index incompatible, reconstruire avec 'dictionnaire.py construire'")
+        return contenu['dictionnaire']
+
+
+def _retenir(retenues, occupe, debut: int, fin: int, correspondances: List[Correspondance]):
+    occupe[debut:fin] = [len(retenues)] * (fin - debut)
+    retenues.append(correspondances)
+
+
+def _englobe(correspondances: Optional[List[Correspondance]], debut: int, fin: int) -> bool:
+    """L'étendue retenue est-elle strictement contenue dans [debut, fin) ?"""
+    c = correspondances[0]
+    return debut <= c.debut and c.fin <= fin and c.fin - c.debut < fin - debut
+
+
+def _mot_entier(texte: str, debut: int, fin: int) -> bool:
+    return ((debut == 0 or not texte[debut - 1].isalnum())
+            and (fin == len(texte) or not texte[fin].isalnum()))
+
+
+def _mots(texte: str) -> List[Tuple[int, int]]:
+    """Positions (début, fin) des suites alphanumériques"""
+    positions = []
+    debut = None
+    for i, c in enumerate(texte):
+        if c.isalnum():
+            if debut is None:
+                debut = i
+        elif debut is not None:
+            positions.append((debut, i))
+            debut = None
+    if debut is not None:
+        positions.append((debut, len(texte)))
+    return positions
+
+
+def principale():
+    parser = argparse.ArgumentParser(description="Index du dictionnaire de médicaments")
+    commandes = parser.add_subparsers(dest='commande', required=True)
+
+    construire = commandes.add_parser('construire', help="Compiler un CSV en index")
+    construire.add_argument('csv')
+    construire.add_argument('-o', '--sortie', required=True)
+
+    chercher = commandes.add_parser('chercher', help="Chercher les termes d'un texte")
+    chercher.add_argument('index', help="Index ou CSV")
+    chercher.add_argument('texte')
+
+    args = parser.parse_args()
+
+    if args.commande == 'construire':
+        debut = time.perf_counter()
+        dictionnaire = Dictionnaire.depuis_csv(args.csv)
+        dictionnaire.enregistrer(args.sortie)
+        print(f"✅ {len(dictionnaire)} termes indexés en {time.perf_counter() - debut:.2f}s -> {args.sortie}")
+    else:
+        debut = time.perf_counter()
+        dictionnaire = Dictionnaire.charger(args.index)
+        print(f"📚 {len(dictionnaire)} termes chargés en {(time.perf_counter() - debut) * 1000:.0f} ms")
+        trouves = dictionnaire.trouver(args.texte)
+        if not trouves:
+            print("❌ Aucun terme trouvé")
+            sys.exit(1)
+        for categorie, correspondances in trouves.items():
+            for c in correspondances:
+                print(f"   {categorie:<16} {c.terme:<25} [{c.debut}:{c.fin}] distance={c.distance}")
+
+
+if __name__ == "__main__":
+    principale()
@@ -0,0 +1,196 @@
+"""
+Export colonnaire (Parquet ou Arrow IPC) des résultats d'extraction.
+
+Lit les fichiers JSONL de résultats en flux et écrit un groupe de lignes
+toutes les `taille_groupe` entrées: la mémoire reste bornée quel que soit le
+nombre d'enregistrements. Schéma à plat, une colonne par champ:
+
+    horodatage             timestamp[ms]  (null si absent)
+    source                 string         image d'origine, ou nom de l'entrée
+    statut                 string         ok / no_label / error (batch_scan), ok sinon
+    confiance              float32        confiance de la détection (batch_scan)
+    nom_medicament ... numero_enregistrement
+                           string         les dix champs; plusieurs valeurs jointes par " | "
+    date_fabrication_iso   date32         dates normalisées (voir inventaire.py)
+    date_peremption_iso    date32
+
+Entrées acceptées (détectées ligne par ligne):
+    - results/resultats.jsonl (stockage.py): {"horodatage", "nom", "donnees", "source"?}
+    - sortie de batch_scan.py: {"image", "status", "confidence", "fields", ...}
+
+Usage:
+    python export_parquet.py results/resultats.jsonl scans.jsonl -o export.parquet
+    python export_parquet.py scans.jsonl -o export.arrow --format arrow
+
+Nécessite pyarrow (optionnel pour le reste du classificateur): pip install pyarrow
+"""
+import argparse
+import sys
+import time
+from datetime import date, datetime
+from typing import Iterable, Iterator, Optional
+
+from inventaire import normaliser_date
+from stockage import lire
+
+CHAMPS = (
+    'nom_medicament', 'principe_actif', 'dosage', 'forme_pharmaceutique',
+    'entreprise', 'numero_lot', 'date_fabrication', 'date_peremption',
+    'prix', 'numero_enregistrement'
+)
+SEPARATEUR = ' | '
+FORMATS = ('parquet', 'arrow')
+
+
+def _importer_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        import pyarrow.ipc
+    except ImportError:
+        raise ImportError("pyarrow est requis pour l'export colonnaire: pip install pyarrow") from None
+    return pyarrow
+
+
+def schema():
+    pa = _importer_pyarrow()
+    return pa.schema(
+        [
+            ('horodatage', pa.timestamp('ms')),
+            ('source', pa.string()),
+            ('statut', pa.string()),
+            ('confiance', pa.float32()),
+        ]
+        + [(champ, pa.string()) for champ in CHAMPS]
+        + [
+            ('date_fabrication_iso', pa.date32()),
+            ('date_peremption_iso', pa.date32()),
+        ]
+    )
+
+
+def _horodatage(valeur) -> Optional[datetime]:
+    if not valeur:
+        return None
+    try:
+        return datetime.fromisoformat(valeur)
+    except (TypeError, ValueError):
+        return None
+
+
+def _date(iso: Optional[str]) -> Optional[date]:
+    return date.fromisoformat(iso) if iso else None
+
+
+def ligne_plate(enregistrement: dict) -> Optional[dict]:
+    """Une ligne du schéma à partir d'un enregistrement stockage.py ou batch_scan.py (None si inconnu)"""
+    if 'donnees' in enregistrement:
+        entites = enregistrement['donnees'] or {}
+        source = enregistrement.get('source') or enregistrement.get('nom')
+        statut = 'ok'
+    elif 'image' in enregistrement:
+        entites = enregistrement.get('fields') or {}
+        source = enregistrement['image']
+        statut = enregistrement.get('status')
+    else:
+        return None
+
+    ligne = {
+        'horodatage': _horodatage(enregistrement.get('horodatage')),
+        'source': source,
+        'statut': statut,
+        'confiance': enregistrement.get('confidence'),
+    }
+    for champ in CHAMPS:
+        valeurs = entites.get(champ) or []
+        ligne[champ] = SEPARATEUR.join(valeurs) if valeurs else None
+
+    fabrication = entites.get('date_fabrication') or [None]
+    peremption = entites.get('date_peremption') or [None]
+    ligne['date_fabrication_iso'] = _date(normaliser_date(fabrication[0]))
+    ligne['date_peremption_iso'] = _date(normaliser_date(peremption[0], fin_de_mois=True))
+    return ligne
+
+
+def enregistrements(chemins: Iterable[str]) -> Iterator[dict]:
+    for chemin in chemins:
+        yield from lire(chemin)
+
+
+def exporter(source: Iterable[dict], sortie: str, format: str = 'parquet',
+             taille_groupe: int = 100000, compression: str = 'zstd') -> dict:
+    """
+    Écrire les enregistrements dans `sortie` par groupes de `taille_groupe` lignes.
+    Retourne {'lignes', 'ignores', 'groupes'}.
+    """
+    pa = _importer_pyarrow()
+    if format not in FORMATS:
+        raise ValueError(f"Format inconnu: {format} (attendu: {', '.join(FORMATS)})")
+
+    schema_export = schema()
+    noms = schema_export.names
+    bilan = {'lignes': 0, 'ignores': 0, 'groupes': 0}
+
+    if format == 'parquet':
+        ecrivain = pa.parquet.ParquetWriter(sortie, schema_export, compression=compression)
+    else:
+        ecrivain = pa.ipc.new_file(sortie, schema_export)
+
+    def ecrire(colonnes: dict):
+        lot = pa.RecordBatch.from_pydict(colonnes, schema=schema_export)
+        if format == 'parquet':
+            ecrivain.write_batch(lot, row_group_size=taille_groupe)
+        else:
+            ecrivain.write_batch(lot)
+        bilan['groupes'] += 1
+
+    try:
+        colonnes = {nom: [] for nom in noms}
+        en_cours = 0
+        for enregistrement in source:
+            ligne = ligne_plate(enregistrement)
+            if ligne is None:
+                bilan['ignores'] += 1
+                continue
+            for nom in noms:
+                colonnes[nom].append(ligne[nom])
+            en_cours += 1
+            bilan['lignes'] += 1
+            if en_cours >= taille_groupe:
+                ecrire(colonnes)
+                colonnes = {nom: [] for nom in noms}
+                en_cours = 0
+        if en_cours or bilan['groupes'] == 0:
+            ecrire(colonnes)
+    finally:
+        ecrivain.close()
+    return bilan
+
+
+def principale():
+    parser = argparse.ArgumentParser(description="Export Parquet / Arrow des résultats d'extraction")
+    parser.add_argument('entrees', nargs='+', help="Fichiers JSONL (stockage.py ou batch_scan.py)")
+    parser.add_argument('-o', '--sortie', required=True)
+    parser.add_argument('--format', choices=FORMATS, default=None,
+                        help="Par défaut d'après l'extension de --sortie (.arrow/.feather -> arrow)")
+    parser.add_argument('--taille-groupe', type=int, default=100000, help="Lignes par groupe (row group / batch)")
+    parser.add_argument('--compression', default='zstd', help="Compression Parquet (zstd, snappy, none)")
+    args = parser.parse_args()
+
+    format = args.format or ('arrow' if args.sortie.lower().endswith(('.arrow', '.feather')) else 'parquet')
+    debut = time.perf_counter()
+    try:
+        bilan = exporter(enregistrements(args.entrees), args.sortie, format,
+                         args.taille_groupe, None if args.compression == 'none' else args.compression)
+    except ImportError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    duree = time.perf_counter() - debut
+    print(f"✅ {bilan['lignes']} lignes -> {args.sortie} ({format}, {bilan['groupes']} groupes) "
+          f"en {duree:.1f}s ({bilan['lignes'] / duree:.0f} lignes/s)")
+    if bilan['ignores']:
+        print(f"   ⚠️  {bilan['ignores']} enregistrements de format inconnu ignorés")
+
+
+if __name__ == "__main__":
+    principale()
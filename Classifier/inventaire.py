@@ -0,0 +1,324 @@
+"""
+Inventaire SQLite des étiquettes extraites, interrogeable par date de
+péremption, numéro de lot, numéro d'enregistrement (D.E) et nom.
+
+Les dates FAB / EXP / PER capturées par les regex ("04-2026", "10-24",
+"10/2024", "12/26", "06.2027") sont normalisées en ISO: premier jour du mois
+pour la fabrication, dernier jour du mois pour la péremption (un médicament
+"EXP 11-25" est utilisable jusqu'au 30/11/2025). Chaque requête courante
+dispose de son index, ce qui la garde en millisecondes sur des millions de lignes.
+
+Usage:
+    python inventaire.py importer results/resultats.jsonl
+    python inventaire.py expire --dans 30
+    python inventaire.py expire --du 2026-11-01 --au 2026-11-30
+    python inventaire.py lot 605
+    python inventaire.py enregistrement "23/11"
+    python inventaire.py nom CLOF --prefixe
+    python inventaire.py generer 1000000        # lignes synthétiques pour mesurer
+"""
+import argparse
+import calendar
+import json
+import random
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from stockage import lire
+
+RE_DATE = re.compile(r'^\s*(\d{1,2})\s*[-/.]\s*(\d{2}|\d{4})\s*$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS etiquettes (
+    id                    INTEGER PRIMARY KEY,
+    horodatage            TEXT NOT NULL,
+    source                TEXT,
+    nom_medicament        TEXT COLLATE NOCASE,
+    principe_actif        TEXT,
+    dosage                TEXT,
+    forme_pharmaceutique  TEXT,
+    entreprise            TEXT,
+    numero_lot            TEXT,
+    numero_enregistrement TEXT,
+    prix                  TEXT,
+    date_fabrication      TEXT,
+    date_peremption       TEXT,
+    fabrication_brute     TEXT,
+    peremption_brute      TEXT,
+    donnees               TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_etiquettes_peremption ON etiquettes(date_peremption);
+CREATE INDEX IF NOT EXISTS idx_etiquettes_lot ON etiquettes(numero_lot);
+CREATE INDEX IF NOT EXISTS idx_etiquettes_enregistrement ON etiquettes(numero_enregistrement);
+CREATE INDEX IF NOT EXISTS idx_etiquettes_nom ON etiquettes(nom_medicament);
+"""
+
+COLONNES = (
+    'horodatage', 'source', 'nom_medicament', 'principe_actif', 'dosage',
+    'forme_pharmaceutique', 'entreprise', 'numero_lot', 'numero_enregistrement',
+    'prix', 'date_fabrication', 'date_peremption', 'fabrication_brute',
+    'peremption_brute', 'donnees'
+)
+COLONNES_RESULTAT = (
+    'id', 'horodatage', 'source', 'nom_medicament', 'entreprise', 'dosage',
+    'numero_lot', 'numero_enregistrement', 'date_fabrication', 'date_peremption'
+)
+
+
+def normaliser_date(texte: Optional[str], fin_de_mois: bool = False) -> Optional[str]:
+    """
+    "MM-AAAA", "MM-AA", "MM/AAAA", "MM/AA", "MM.AAAA" -> "AAAA-MM-JJ"
+    (jour 1, ou dernier jour du mois si fin_de_mois). None si illisible.
+    """
+    if not texte:
+        return None
+    correspondance = RE_DATE.match(texte)
+    if not correspondance:
+        return None
+    mois, annee = int(correspondance.group(1)), int(correspondance.group(2))
+    if not 1 <= mois <= 12:
+        return None
+    if annee < 100:
+        annee += 2000
+    jour = calendar.monthrange(annee, mois)[1] if fin_de_mois else 1
+    return f"{annee:04d}-{mois:02d}-{jour:02d}"
+
+
+def normaliser_lot(lot: Optional[str]) -> Optional[str]:
+    """Numéro de lot comparable: majuscules, sans espaces"""
+    if not lot:
+        return None
+    return re.sub(r'\s+', '', lot).upper() or None
+
+
+def _premier(entites: dict, cle: str) -> Optional[str]:
+    valeurs = entites.get(cle) or []
+    return valeurs[0] if valeurs else None
+
+
+def ligne_depuis_entites(entites: dict, source: Optional[str] = None,
+                         horodatage: Optional[str] = None) -> Tuple:
+    fabrication = _premier(entites, 'date_fabrication')
+    peremption = _premier(entites, 'date_peremption')
+    return (
+        horodatage or datetime.now().isoformat(),
+        source,
+        _premier(entites, 'nom_medicament'),
+        ', '.join(entites.get('principe_actif') or []) or None,
+        ', '.join(entites.get('dosage') or []) or None,
+        _premier(entites, 'forme_pharmaceutique'),
+        _premier(entites, 'entreprise'),
+        normaliser_lot(_premier(entites, 'numero_lot')),
+        _premier(entites, 'numero_enregistrement'),
+        _premier(entites, 'prix'),
+        normaliser_date(fabrication),
+        normaliser_date(peremption, fin_de_mois=True),
+        fabrication,
+        peremption,
+        json.dumps(entites, ensure_ascii=False),
+    )
+
+
+class Inventaire:
+    """
+    Base SQLite (WAL) des étiquettes.
+
+    Usage:
+        inventaire = Inventaire("results/inventaire.db")
+        inventaire.ajouter(entites, source="photo_12.jpg")
+        inventaire.expirant_dans(30)
+        inventaire.par_lot("605")
+    """
+
+    def __init__(self, chemin):
+        self.chemin = Path(chemin)
+        self.chemin.parent.mkdir(parents=True, exist_ok=True)
+        self._connexion = sqlite3.connect(str(self.chemin), check_same_thread=False)
+        self._connexion.row_factory = sqlite3.Row
+        self._verrou = threading.Lock()
+        with self._verrou:
+            # WAL: les lectures ne bloquent pas les ajouts; NORMAL: pas de fsync par commit
+            self._connexion.execute("PRAGMA journal_mode=WAL")
+            self._connexion.execute("PRAGMA synchronous=NORMAL")
+            self._connexion.executescript(SCHEMA)
+
+    # ------------------------------------------------------------------
+    # Écriture
+    # ------------------------------------------------------------------
+    def ajouter(self, entites: dict, source: Optional[str] = None, horodatage: Optional[str] = None) -> int:
+        with self._verrou, self._connexion:
+            curseur = self._connexion.execute(
+                f"INSERT INTO etiquettes ({', '.join(COLONNES)}) VALUES ({', '.join('?' * len(COLONNES))})",
+                ligne_depuis_entites(entites, source, horodatage)
+            )
+            return curseur.lastrowid
+
+    def ajouter_lignes(self, lignes: Iterable[Tuple], taille_transaction: int = 10000) -> int:
+        """Insertion en masse de tuples produits par ligne_depuis_entites()"""
+        requete = f"INSERT INTO etiquettes ({', '.join(COLONNES)}) VALUES ({', '.join('?' * len(COLONNES))})"
+        total = 0
+        paquet = []
+        for ligne in lignes:
+            paquet.append(ligne)
+            if len(paquet) >= taille_transaction:
+                total += self._inserer(requete, paquet)
+                paquet = []
+        if paquet:
+            total += self._inserer(requete, paquet)
+        return total
+
+    def _inserer(self, requete: str, paquet: List[Tuple]) -> int:
+        with self._verrou, self._connexion:
+            self._connexion.executemany(requete, paquet)
+        return len(paquet)
+
+    def ajouter_entrees(self, entrees: Iterable[dict]) -> int:
+        """Insérer des entrées au format de stockage.py ({horodatage, nom, donnees, source})"""
+        return self.ajouter_lignes(
+            ligne_depuis_entites(e['donnees'], e.get('source') or e.get('nom'), e.get('horodatage'))
+            for e in entrees if isinstance(e.get('donnees'), dict)
+        )
+
+    def importer_jsonl(self, chemin) -> int:
+        """Importer un fichier results/resultats.jsonl (voir stockage.py)"""
+        return self.ajouter_entrees(lire(chemin))
+
+    # ------------------------------------------------------------------
+    # Requêtes
+    # ------------------------------------------------------------------
+    def _requete(self, where: str, parametres: Tuple, ordre: str, limite: int) -> List[Dict]:
+        with self._verrou:
+            lignes = self._connexion.execute(
+                f"SELECT {', '.join(COLONNES_RESULTAT)} FROM etiquettes WHERE {where} ORDER BY {ordre} LIMIT ?",
+                (*parametres, limite)
+            ).fetchall()
+        return [dict(ligne) for ligne in lignes]
+
+    def expirant_entre(self, debut: str, fin: str, limite: int = 1000) -> List[Dict]:
+        """Étiquettes dont la péremption (ISO) est dans [debut, fin], les plus proches d'abord"""
+        return self._requete("date_peremption BETWEEN ? AND ?", (debut, fin), "date_peremption", limite)
+
+    def expirant_dans(self, jours: int, limite: int = 1000) -> List[Dict]:
+        aujourd_hui = date.today()
+        return self.expirant_entre(aujourd_hui.isoformat(), (aujourd_hui + timedelta(days=jours)).isoformat(), limite)
+
+    def perimes(self, limite: int = 1000) -> List[Dict]:
+        return self._requete("date_peremption < ?", (date.today().isoformat(),), "date_peremption DESC", limite)
+
+    def par_lot(self, numero_lot: str, limite: int = 1000) -> List[Dict]:
+        return self._requete("numero_lot = ?", (normaliser_lot(numero_lot),), "id", limite)
+
+    def par_enregistrement(self, numero: str, limite: int = 1000) -> List[Dict]:
+        return self._requete("numero_enregistrement = ?", (numero.strip(),), "id", limite)
+
+    def par_nom(self, nom: str, prefixe: bool = False, limite: int = 1000) -> List[Dict]:
+        if prefixe:
+            # Intervalle sur l'index NOCASE plutôt que LIKE (qui dépend de case_sensitive_like)
+            return self._requete("nom_medicament >= ? AND nom_medicament < ?",
+                                 (nom, nom + '\U0010ffff'), "nom_medicament", limite)
+        return self._requete("nom_medicament = ?", (nom,), "id", limite)
+
+    def compter(self) -> int:
+        with self._verrou:
+            return self._connexion.execute("SELECT COUNT(*) FROM etiquettes").fetchone()[0]
+
+    def fermer(self):
+        with self._verrou:
+            self._connexion.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fermer()
+
+
+def lignes_synthetiques(nombre: int, graine: int = 0) -> Iterable[Tuple]:
+    """Lignes aléatoires réalistes pour mesurer les requêtes à grande échelle"""
+    aleatoire = random.Random(graine)
+    noms = ['CLOFENAL', 'BIOFENAC', 'DOLIPRANE', 'PARALGAN', 'AMOXIL', 'CLAMOXYL', 'SULFAZINE']
+    for i in range(nombre):
+        entites = {
+            'nom_medicament': [f"{aleatoire.choice(noms)}{aleatoire.randrange(1000)}"],
+            'numero_lot': [f"{aleatoire.randrange(100000)}"],
+            'numero_enregistrement': [f"{aleatoire.randrange(100):02d}/{aleatoire.randrange(100):02d}/{aleatoire.randrange(1000):03d}"],
+            'date_fabrication': [f"{aleatoire.randint(1, 12):02d}-{aleatoire.randint(20, 26)}"],
+            'date_peremption': [f"{aleatoire.randint(1, 12):02d}-{aleatoire.randint(2024, 2030)}"],
+        }
+        yield ligne_depuis_entites(entites, source=f"synthetique_{i}")
+
+
+def afficher(resultats: List[Dict], duree_ms: float):
+    for ligne in resultats[:50]:
+        print(f"   {ligne['date_peremption'] or '?':<11} lot {ligne['numero_lot'] or '?':<10} "
+              f"{ligne['nom_medicament'] or '?':<25} {ligne['entreprise'] or ''}  [{ligne['source'] or ligne['id']}]")
+    if len(resultats) > 50:
+        print(f"   ... {len(resultats) - 50} de plus")
+    print(f"📊 {len(resultats)} résultat(s) en {duree_ms:.1f} ms")
+
+
+def principale():
+    parser = argparse.ArgumentParser(description="Inventaire SQLite des étiquettes extraites")
+    parser.add_argument('--db', default='results/inventaire.db', help="Base SQLite")
+    requete = argparse.ArgumentParser(add_help=False)
+    requete.add_argument('--limite', type=int, default=1000, help="Nombre maximum de résultats")
+    commandes = parser.add_subparsers(dest='commande', required=True)
+
+    commande = commandes.add_parser('importer', help="Importer un fichier JSONL de résultats")
+    commande.add_argument('jsonl')
+
+    commande = commandes.add_parser('expire', parents=[requete], help="Étiquettes qui expirent dans une fenêtre")
+    commande.add_argument('--dans', type=int, help="Dans les N prochains jours")
+    commande.add_argument('--du', help="Début ISO (AAAA-MM-JJ)")
+    commande.add_argument('--au', help="Fin ISO (AAAA-MM-JJ)")
+    commande.add_argument('--perimes', action='store_true', help="Déjà périmées")
+
+    commande = commandes.add_parser('lot', parents=[requete], help="Recherche par numéro de lot")
+    commande.add_argument('numero')
+
+    commande = commandes.add_parser('enregistrement', parents=[requete], help="Recherche par numéro D.E")
+    commande.add_argument('numero')
+
+    commande = commandes.add_parser('nom', parents=[requete], help="Recherche par nom de médicament")
+    commande.add_argument('nom')
+    commande.add_argument('--prefixe', action='store_true')
+
+    commande = commandes.add_parser('generer', help="Ajouter N lignes synthétiques")
+    commande.add_argument('nombre', type=int)
+
+    args = parser.parse_args()
+
+    with Inventaire(args.db) as inventaire:
+        debut = time.perf_counter()
+        if args.commande == 'importer':
+            total = inventaire.importer_jsonl(args.jsonl)
+            print(f"✅ {total} étiquettes importées en {time.perf_counter() - debut:.1f}s ({inventaire.compter()} au total)")
+        elif args.commande == 'generer':
+            total = inventaire.ajouter_lignes(lignes_synthetiques(args.nombre, graine=inventaire.compter()))
+            print(f"✅ {total} lignes ajoutées en {time.perf_counter() - debut:.1f}s ({inventaire.compter()} au total)")
+        else:
+            if args.commande == 'expire':
+                if args.perimes:
+                    resultats = inventaire.perimes(args.limite)
+                elif args.dans is not None:
+                    resultats = inventaire.expirant_dans(args.dans, args.limite)
+                elif args.du and args.au:
+                    resultats = inventaire.expirant_entre(args.du, args.au, args.limite)
+                else:
+                    parser.error("expire: --dans N, --du/--au ou --perimes requis")
+            elif args.commande == 'lot':
+                resultats = inventaire.par_lot(args.numero, args.limite)
+            elif args.commande == 'enregistrement':
+                resultats = inventaire.par_enregistrement(args.numero, args.limite)
+            else:
+                resultats = inventaire.par_nom(args.nom, args.prefixe, args.limite)
+            afficher(resultats, (time.perf_counter() - debut) * 1000)
+
+
+if __name__ == "__main__":
+    principale()
@@ -1,32 +1,371 @@
 import re
-import json
-from typing import Dict, List
+import time
+from functools import lru_cache
+from itertools import repeat
+from typing import Callable, Dict, List, Optional, Tuple
 from datetime import datetime
 import os
+import multiprocessing as mp
+from concurrent.futures import Executor, ProcessPoolExecutor
 from pathlib import Path
 
-class ClassificateurMedicamentsAlgerien:
-    """Classificateur robuste pour OCR pharmaceutique algérien - gère n'importe quel ordre de texte et formats multi-lignes"""
+from dictionnaire import Dictionnaire
+from inventaire import Inventaire
+from stockage import MagasinResultats
+
+# ==================================================
+# MODÈLES REGEX (compilés une seule fois au chargement)
+# ==================================================
+RE_ESPACES = re.compile(r'\s+')
+RE_ANNEE_FINALE = re.compile(r'\s+\d{4}$')
+
+# Mots en majuscules qui ne peuvent pas être un nom de médicament
+MOTS_EXCLUS_NOM = frozenset(['VIGNETTE', 'PRIX', 'LOT', 'FAB', 'EXP', 'PER'])
+
+RE_NOM_AVANT_DOSAGE = re.compile(r'\b([A-Z][A-Z]+(?:\s+[A-Z\.&LP]+)*)\s+\d+(?:\.\d+)?(?:mg|g|%)')
+RE_NOM_APRES_DOSAGE = re.compile(r'\d+(?:\.\d+)?\s*(?:mg|g|%|ml)\s+([A-Z][A-Z]+(?:\s+[A-Z\.&LP]+)*)')
+RE_NOM_FIN = re.compile(r'-\s+([A-Z]{3,}(?:\s+[A-Z\.&LP]+)*)\s*$')
+RE_MOTS_MAJUSCULES = re.compile(r'\b([A-Z]{3,}(?:\s+[A-Z\.&LP]+)*)\b')
+
+RE_PRINCIPE_ENTRE_TIRETS = re.compile(r'-\s+([A-Z][a-zéèêàç]+(?:\s+[A-Z]?[a-zéèêàç]+)*)\s+-')
+RE_PRINCIPE_APRES_DOSAGE = re.compile(r'\d+(?:\.\d+)?\s*(?:mg|g|%|ml)\s+([A-Z][A-Z]+)')
+RE_MOTS_CASSE_MIXTE = re.compile(r'\b([A-Z][a-zéèêàç]+(?:\s+[a-zéèêàç]+)?)\b')
+
+# Une alternative nommée par famille d'unités, dans l'ordre de sortie
+FAMILLES_DOSAGE = ('mg', 'g', 'ml', 'pourcent', 'mcg', 'microg')
+RE_DOSAGE = re.compile(
+    r'\b(?:'
+    r'(?P<mg>\d+(?:\.\d+)?\s*mg(?:/\d+(?:\.\d+)?mg)?)'
+    r'|(?P<g>\d+(?:\.\d+)?\s*g)'
+    r'|(?P<ml>\d+(?:\.\d+)?\s*ml)'
+    r'|(?P<pourcent>\d+(?:\.\d+)?\s*%)'
+    r'|(?P<mcg>\d+(?:\.\d+)?\s*mcg)'
+    r'|(?P<microg>\d+(?:\.\d+)?\s*µg)'
+    r')\b',
+    re.IGNORECASE
+)
+
+MODELES_FORME = [
+    (re.compile(r'([A-Za-zéèêàç]+)\s*/?\s*[BbEe]/?(\d+)', re.IGNORECASE), lambda m: f"{m.group(2)} {m.group(1).lower()}"),
+    (re.compile(r'[Bb]o[iî]te\s+de\s+(\d+)\s+([A-Za-zéèêàç]+)', re.IGNORECASE), lambda m: f"{m.group(1)} {m.group(2).lower()}"),
+    (re.compile(r'([A-Za-zéèêàç]+)\s+boîte\s+de\s+(\d+)', re.IGNORECASE), lambda m: f"{m.group(2)} {m.group(1).lower()}"),
+    (re.compile(r'[BbEe]/?(\d+)\s+([A-Za-zéèêàç]+)', re.IGNORECASE), lambda m: f"{m.group(1)} {m.group(2).lower()}"),
+]
+
+# Familles "premier modèle qui trouve gagne": l'ordre des listes est la priorité
+MODELES_LOT = [re.compile(m, re.IGNORECASE) for m in (
+    r'LOT\s*[n°:]*\s*:?\s*([A-Z0-9]+(?:\s*/?\s*\d+)?)',
+    r'N°?\s*LOT\s*:?\s*([A-Z0-9\s/]+?)(?:\s+-|\s+FAB|\s+PER|\s+EXP|$)',
+    r'Lot\s+n°?\s*:?\s*([A-Z0-9\s]+?)(?:\s+-|\s+FAB|$)',
+    r'LOT\s+([A-Z0-9]+)',
+)]
+MODELES_FAB = [re.compile(m, re.IGNORECASE) for m in (
+    r'FAB(?:RICATO?)?\s*[B:]?\s*:?\s*(\d{1,2}[-/]\d{2,4})',
+    r'Date\s+Fab(?:rication)?\s*:?\s*(\d{1,2}[-/]\d{2,4})',
+    r'Fab\s*:?\s*(\d{1,2}[-/]\d{2,4})',
+    r'FAB\s+(\d{2}-\d{4})',
+    r'FAB\s+(\d{2}-\d{2})',
+    r'\bFAB\s+(\d{2}/\d{4})',
+)]
+MODELES_EXP = [re.compile(m, re.IGNORECASE) for m in (
+    r'(?:PER(?:IOD[OI])?|EXP(?:IRATION)?)\s*:?\s*(\d{1,2}[-/]\d{2,4})',
+    r'Date\s+Exp(?:iration)?\s*:?\s*(\d{1,2}[-/]\d{2,4})',
+    r'Péremption\s*:?\s*(\d{1,2}[-/]\d{2,4})',
+    r'EXP\s+(\d{2}-\d{4})',
+    r'EXP:\s*(\d{2}-\d{2})',
+    r'\bEXP\s+(\d{2}/\d{4})',
+)]
+MODELES_PRIX = [re.compile(m, re.IGNORECASE) for m in (
+    r'TR\s*[=:]\s*(\d+(?:\.\d+)?)\s*DA',
+    r'T\.R\s*[=:]\s*(\d+(?:\.\d+)?)\s*DA',
+    r'Tarif\s+de\s+Réf?(?:érence)?\s*[=:]\s*(\d+(?:\.\d+)?)\s*DA',
+    r'PPA\s*[=:+]?\s*(\d+(?:\.\d+)?)\s*DA',
+    r'Prix\s*[+]?\s*SHP\s*[=:]\s*(\d+(?:\.\d+)?)',
+    r'PRIX\s*[=:]\s*(\d+(?:\.\d+)?)',
+    r'PRIX\s+(\d+(?:\.\d+)?)DA',
+    r'TR\s+(\d+(?:\.\d+)?)DA',
+    r'T\.R\s+(\d+(?:\.\d+)?)DA',
+)]
+MODELES_DE = [re.compile(m, re.IGNORECASE) for m in (
+    r'D\.?E\s*[n°]*\s*:?\s*([\d/A-Z\s]+?)(?:\s+-|\s+LOT|\s+FAB|\s+\d{4}/\d{4}|$)',
+    r'N°\s*D\.?E\s*:?\s*([\d/A-Z\s]+?)(?:\s+-|$)',
+)]
+
+
+# ==================================================
+# REGISTRE DES EXTRACTEURS DE CHAMPS
+# ==================================================
+class ContexteAnalyse:
+    """État partagé par les extracteurs pendant l'analyse d'un texte"""
+    
+    def __init__(self, extracteur: "ExtracteurMedicaments", texte: str):
+        # Normaliser le texte (gère l'entrée multi-ligne)
+        self.texte = extracteur.normaliser_texte(texte)
+        self.texte_maj = self.texte.upper()
+        self.entites: Dict[str, List[str]] = {}
+        self._extracteur = extracteur
+        self._trouves = None
+    
+    @property
+    def trouves(self) -> dict:
+        """Termes de la nomenclature (calculés à la première demande seulement)"""
+        if self._trouves is None:
+            dictionnaire = self._extracteur.dictionnaire
+            self._trouves = dictionnaire.trouver(self.texte) if dictionnaire is not None else {}
+        return self._trouves
+    
+    def premier(self, champ: str) -> Optional[str]:
+        valeurs = self.entites.get(champ)
+        return valeurs[0] if valeurs else None
+
+
+class Champ:
+    """
+    Extracteur d'un champ, sous l'une de deux formes:
+        - fonction(extracteur, contexte) -> liste de valeurs
+        - modeles: liste de regex compilées, le premier qui trouve gagne; post(correspondance)
+          donne la valeur (None = passer au modèle suivant), par défaut le groupe 1
+    dependances: champs à extraire avant celui-ci (lus via contexte.entites)
+    """
+    
+    def __init__(self, nom: str, fonction: Optional[Callable] = None, modeles=(),
+                 post: Optional[Callable] = None, dependances=()):
+        self.nom = nom
+        self.fonction = fonction
+        self.modeles = list(modeles)
+        self.post = post
+        self.dependances = tuple(dependances)
+    
+    def extraire(self, extracteur: "ExtracteurMedicaments", contexte: ContexteAnalyse) -> List[str]:
+        if self.fonction is not None:
+            return self.fonction(extracteur, contexte)
+        for modele in self.modeles:
+            correspondance = modele.search(contexte.texte)
+            if correspondance:
+                valeur = self.post(correspondance) if self.post else correspondance.group(1)
+                if valeur is not None:
+                    return [valeur]
+        return []
+
+
+# Ordre d'enregistrement = ordre des clés dans les entités retournées
+REGISTRE_CHAMPS: Dict[str, Champ] = {}
+
+
+def enregistrer_champ(champ: Champ) -> Champ:
+    """Ajouter (ou remplacer) un extracteur; à appeler au chargement du module qui le définit"""
+    REGISTRE_CHAMPS[champ.nom] = champ
+    _ordre_evaluation.cache_clear()
+    return champ
+
+
+def extracteur_champ(nom: str, dependances=()):
+    """Décorateur: enregistre fonction(extracteur, contexte) comme extracteur du champ `nom`"""
+    def decorer(fonction):
+        enregistrer_champ(Champ(nom, fonction=fonction, dependances=dependances))
+        return fonction
+    return decorer
+
+
+@lru_cache(maxsize=128)
+def _ordre_evaluation(champs: Tuple[str, ...]) -> Tuple[str, ...]:
+    """Champs demandés et leurs dépendances, dépendances d'abord"""
+    ordre = []
+    en_cours = set()
+    
+    def visiter(nom):
+        if nom in ordre:
+            return
+        if nom not in REGISTRE_CHAMPS:
+            raise ValueError(f"Champ inconnu: {nom} (connus: {', '.join(REGISTRE_CHAMPS)})")
+        if nom in en_cours:
+            raise ValueError(f"Dépendance circulaire sur le champ {nom}")
+        en_cours.add(nom)
+        for dependance in REGISTRE_CHAMPS[nom].dependances:
+            visiter(dependance)
+        en_cours.discard(nom)
+        ordre.append(nom)
+    
+    for nom in champs:
+        visiter(nom)
+    return tuple(ordre)
+
+
+def _nom_potentiel(extracteur, modele, texte: str, exclure_mots: bool = True) -> Optional[str]:
+    correspondance = modele.search(texte)
+    if correspondance:
+        nom_potentiel = correspondance.group(1).strip()
+        if not extracteur._est_entreprise(nom_potentiel) and (not exclure_mots or nom_potentiel.upper() not in MOTS_EXCLUS_NOM):
+            return nom_potentiel
+    return None
+
+
+@extracteur_champ('nom_medicament', dependances=('entreprise',))
+def _extraire_nom_medicament(extracteur, contexte):
+    texte = contexte.texte
+    entreprise_trouvee = contexte.premier('entreprise')
+    
+    # Stratégie 0: nom commercial de la nomenclature
+    if contexte.trouves.get('nom_medicament'):
+        return [contexte.trouves['nom_medicament'][0].terme]
+    
+    # Stratégie 1: modèle ENTREPRISE-MEDICAMENT
+    if entreprise_trouvee:
+        modele = extracteur._modele_nom_entreprise.get(entreprise_trouvee)
+        correspondance = modele.search(texte) if modele else None
+        if correspondance:
+            nom_medicament = correspondance.group(1).strip()
+            if nom_medicament:
+                return [nom_medicament]
+    
+    # Stratégie 2: chercher le mot en majuscules avant le dosage
+    # Stratégie 3: chercher le modèle "dosage MEDICAMENT"
+    # Stratégie 4: chercher un mot en majuscules à la FIN (format mélangé comme "... - CLAMOXYL")
+    for modele, exclure_mots in ((RE_NOM_AVANT_DOSAGE, False), (RE_NOM_APRES_DOSAGE, True), (RE_NOM_FIN, True)):
+        nom_medicament = _nom_potentiel(extracteur, modele, texte, exclure_mots)
+        if nom_medicament:
+            return [nom_medicament]
+    
+    # Stratégie 5: premier mot en majuscules qui n'est pas une entreprise
+    for correspondance in RE_MOTS_MAJUSCULES.findall(texte):
+        if not extracteur._est_entreprise(correspondance) and correspondance.upper() not in MOTS_EXCLUS_NOM:
+            return [correspondance]
+    return []
+
+
+@extracteur_champ('principe_actif', dependances=('nom_medicament',))
+def _extraire_principe_actif(extracteur, contexte):
+    texte = contexte.texte
+    nom_medicament = contexte.premier('nom_medicament')
+    
+    # DCI de la nomenclature, dans l'ordre du texte
+    principes = []
+    for correspondance in contexte.trouves.get('principe_actif', ()):
+        if correspondance.terme not in principes:
+            principes.append(correspondance.terme)
+    if principes:
+        return principes
+    
+    # Modèle 1: texte entre tirets
+    for principe in RE_PRINCIPE_ENTRE_TIRETS.findall(texte):
+        if nom_medicament and principe.upper() != nom_medicament.upper():
+            principes.append(principe.strip())
+    if principes:
+        return principes
+    
+    # Modèle 2: mots avec "mg" ou dosage contenant des mots-clés de principes
+    correspondance = extracteur._modele_principe_mots_cles.search(texte)
+    if correspondance:
+        return [correspondance.group(1).strip()]
+    
+    # Modèle 3: chercher le modèle "dosage PRINCIPE" (ex: "1g AMOXICILLINE")
+    correspondance = RE_PRINCIPE_APRES_DOSAGE.search(texte)
+    if correspondance:
+        principe_potentiel = correspondance.group(1).strip()
+        if not extracteur._est_entreprise(principe_potentiel) and (not nom_medicament or principe_potentiel != nom_medicament):
+            return [principe_potentiel]
+    
+    # Modèle 4: mots en casse mixte contenant des mots-clés de principes
+    for correspondance in RE_MOTS_CASSE_MIXTE.findall(texte):
+        correspondance_min = correspondance.lower()
+        if any(mot in correspondance_min for mot in extracteur.mots_cles_principes):
+            return [correspondance]
+    return []
+
+
+@extracteur_champ('dosage')
+def _extraire_dosage(extracteur, contexte):
+    # Un seul balayage; les unités étant distinctes, deux familles ne se
+    # chevauchent jamais. Résultats regroupés par famille (mg, g, ml, %, mcg, µg)
+    # dans l'ordre du texte, comme les anciens findall successifs
+    par_famille = {famille: [] for famille in FAMILLES_DOSAGE}
+    for correspondance in RE_DOSAGE.finditer(contexte.texte):
+        par_famille[correspondance.lastgroup].append(correspondance.group(correspondance.lastgroup))
+    dosages = []
+    for famille in FAMILLES_DOSAGE:
+        for correspondance in par_famille[famille]:
+            correspondance_normalisee = RE_ESPACES.sub('', correspondance)
+            if correspondance_normalisee not in dosages:
+                dosages.append(correspondance_normalisee)
+    return dosages
+
+
+@extracteur_champ('forme_pharmaceutique')
+def _extraire_forme_pharmaceutique(extracteur, contexte):
+    texte = contexte.texte
+    for modele, formateur in MODELES_FORME:
+        correspondance = modele.search(texte)
+        if correspondance:
+            mot_forme = correspondance.group(2) if len(correspondance.groups()) >= 2 else correspondance.group(1)
+            if any(f in mot_forme.lower() for f in extracteur.formes_pharmaceutiques):
+                return [formateur(correspondance)]
+    
+    # Modèle pour les formes autonomes (ex: "Comprimés" sur sa propre ligne)
+    premieres = {}
+    for correspondance in extracteur._modele_formes_autonomes.finditer(texte):
+        groupe = correspondance.lastgroup
+        if groupe not in premieres:
+            premieres[groupe] = correspondance.group(groupe)
+    if premieres:
+        # Forme prioritaire = première dans l'ordre de l'ensemble
+        groupe = min(premieres, key=lambda g: int(g[1:]))
+        return [premieres[groupe].lower()]
+    return []
+
+
+@extracteur_champ('entreprise')
+def _extraire_entreprise(extracteur, contexte):
+    if contexte.trouves.get('entreprise'):
+        return [contexte.trouves['entreprise'][0].terme]
+    
+    # Chaque modèle d'une entreprise contient son nom: les entreprises absentes
+    # du texte sont écartées par un simple test de sous-chaîne
+    texte_maj = contexte.texte_maj
+    for entreprise in extracteur._ordre_entreprises:
+        if entreprise not in texte_maj:
+            continue
+        if any(modele.search(texte_maj) for modele in extracteur._modeles_entreprise[entreprise]):
+            return [entreprise]
+    return []
+
+
+def _post_lot(correspondance):
+    return RE_ESPACES.sub(' ', correspondance.group(1).strip())
+
+
+def _post_prix(correspondance):
+    return correspondance.group(1) + ' DA'
+
+
+def _post_enregistrement(correspondance):
+    num_de = correspondance.group(1).strip()
+    num_de = RE_ESPACES.sub(' ', num_de)
+    num_de = RE_ANNEE_FINALE.sub('', num_de)
+    # Vide: essayer le modèle suivant
+    return num_de or None
+
+
+enregistrer_champ(Champ('numero_lot', modeles=MODELES_LOT, post=_post_lot))
+enregistrer_champ(Champ('date_fabrication', modeles=MODELES_FAB))
+enregistrer_champ(Champ('date_peremption', modeles=MODELES_EXP))
+enregistrer_champ(Champ('prix', modeles=MODELES_PRIX, post=_post_prix))
+enregistrer_champ(Champ('numero_enregistrement', modeles=MODELES_DE, post=_post_enregistrement))
+
+
+class ExtracteurMedicaments:
+    """
+    Extraction des entités d'une étiquette pharmaceutique algérienne - gère n'importe quel ordre de texte et formats multi-lignes.
+    
+    Aucune sortie console ni écriture disque: sûr à appeler des milliers de fois
+    par minute depuis un serveur, et picklable pour predire_lot() en multi-processus.
+    """
     
-    def __init__(self, results_dir: str = "results"):
+    def __init__(self, dictionnaire=None):
         """
-        Initialize the classifier with a results directory
-        
         Args:
-            results_dir: Directory where results will be saved (default: "results")
+            dictionnaire: Dictionnaire, or path to a nomenclature CSV / index built by
+                dictionnaire.py (default: $DICTIONNAIRE_MEDICAMENTS, else regex only)
         """
-        print("🇩🇿 Classificateur Algérien initialisé\n")
-        
-        # Create results directory
-        self.results_dir = Path(results_dir)
-        self.results_dir.mkdir(exist_ok=True)
-        
-        # Create subdirectories for different types of outputs
-        (self.results_dir / "json").mkdir(exist_ok=True)
-        (self.results_dir / "text").mkdir(exist_ok=True)
-        
-        print(f"📁 Dossier de résultats créé: {self.results_dir.absolute()}\n")
-        
         # Entreprises algériennes connues
         self.entreprises_algeriennes = {
             'SAIDAL', 'BIOCARE', 'BIOPHARM', 'HIKMA', 'PFIZER', 
@@ -48,258 +387,190 @@ class ClassificateurMedicamentsAlgerien:
             'sodique', 'chlorhydrate', 'sulfate', 'phosphate', 'base',
             'acide', 'sel', 'ester', 'sodium', 'potassium'
         }
+        
+        # Nomenclature (laboratoires, noms commerciaux, DCI) tolérante aux erreurs OCR
+        if dictionnaire is None:
+            dictionnaire = os.environ.get("DICTIONNAIRE_MEDICAMENTS") or None
+        if isinstance(dictionnaire, (str, Path)):
+            dictionnaire = Dictionnaire.charger(str(dictionnaire))
+        self.dictionnaire = dictionnaire
+        
+        self.compiler_modeles()
     
+    def compiler_modeles(self):
+        """
+        Compiler une seule fois tous les modèles regex de analyser_format_algerian.
+        À rappeler si entreprises_algeriennes, formes_pharmaceutiques ou
+        mots_cles_principes sont modifiés après la construction.
+        """
+        # Priorité entre entreprises / formes: ordre d'itération des ensembles,
+        # exactement comme les anciennes boucles `for ... in self.<ensemble>`
+        self._ordre_entreprises = tuple(self.entreprises_algeriennes)
+        self._modeles_entreprise = {
+            entreprise: [
+                re.compile(rf'\b{entreprise}\b'),
+                re.compile(rf'VIGNETTE[-\s]*{entreprise}'),
+                re.compile(rf'{entreprise}[-\s]*VIGNETTE'),
+                re.compile(rf'\b{entreprise}[-\s]+[A-Z]'),
+            ]
+            for entreprise in self._ordre_entreprises
+        }
+        self._modele_nom_entreprise = {
+            entreprise: re.compile(
+                rf'{entreprise}[-\s]+([A-Z][A-Z\s&\.]+?)(?:\s+\d+(?:\.\d+)?(?:mg|g|%)|(?:\s+-\s+)|(?:\s+L\.?P\.?))',
+                re.IGNORECASE
+            )
+            for entreprise in self._ordre_entreprises
+        }
+
+        # Formes autonomes: un seul balayage avec un groupe nommé par forme.
+        # Le lookahead teste chaque position; avec les \b, une seule forme
+        # peut correspondre à une position donnée.
+        self._ordre_formes = tuple(self.formes_pharmaceutiques)
+        self._modele_formes_autonomes = re.compile(
+            r'(?=\b(?:' + '|'.join(f'(?P<f{i}>{forme})' for i, forme in enumerate(self._ordre_formes)) + r')\b)',
+            re.IGNORECASE
+        )
+
+        self._modele_principe_mots_cles = re.compile(
+            r'\d+(?:\.\d+)?\s*(?:mg|g|%|ml)\s*[–-]\s*([a-zéèêàç\s]+(?:sodique|chlorhydrate|sulfate|phosphate|base|acide))',
+            re.IGNORECASE
+        )
+
     def normaliser_texte(self, texte: str) -> str:
         """Normaliser le texte multi-ligne en une seule ligne pour un meilleur parsing"""
         # Remplacer les espaces/sauts de ligne multiples par un espace simple
-        texte = re.sub(r'\s+', ' ', texte)
+        texte = RE_ESPACES.sub(' ', texte)
         return texte.strip()
     
-    def analyser_format_algerian(self, texte: str) -> Dict[str, List[str]]:
-        """Analyser l'étiquette pharmaceutique algérienne - robuste à n'importe quel ordre et format"""
-        
-        entites = {
-            'nom_medicament': [],
-            'principe_actif': [],
-            'dosage': [],
-            'forme_pharmaceutique': [],
-            'entreprise': [],
-            'numero_lot': [],
-            'date_fabrication': [],
-            'date_peremption': [],
-            'prix': [],
-            'numero_enregistrement': []
-        }
+    def _est_entreprise(self, mot: str) -> bool:
+        if mot.upper() in self.entreprises_algeriennes:
+            return True
+        return self.dictionnaire is not None and self.dictionnaire.contient(mot, 'entreprise')
+    
+    def analyser_format_algerian(self, texte: str, champs: Optional[List[str]] = None,
+                                 durees: Optional[Dict[str, float]] = None) -> Dict[str, List[str]]:
+        """
+        Analyser l'étiquette pharmaceutique algérienne - robuste à n'importe quel ordre et format
         
-        # Normaliser le texte (gère l'entrée multi-ligne)
-        texte_original = texte
-        texte = self.normaliser_texte(texte)
-        texte_maj = texte.upper()
-        
-        # ==================== ENTREPRISE ====================
-        entreprise_trouvee = None
-        for entreprise in self.entreprises_algeriennes:
-            modeles = [
-                rf'\b{entreprise}\b',
-                rf'VIGNETTE[-\s]*{entreprise}',
-                rf'{entreprise}[-\s]*VIGNETTE',
-                rf'\b{entreprise}[-\s]+[A-Z]',
-            ]
-            for modele in modeles:
-                if re.search(modele, texte_maj):
-                    entites['entreprise'].append(entreprise)
-                    entreprise_trouvee = entreprise
-                    break
-            if entreprise_trouvee:
-                break
+        Args:
+            texte: Texte OCR
+            champs: Champs à extraire (défaut: tous ceux de REGISTRE_CHAMPS). Leurs dépendances
+                sont évaluées aussi, mais seuls les champs demandés sont retournés
+            durees: Si fourni, secondes passées dans chaque extracteur, cumulées par champ
+        """
+        contexte = ContexteAnalyse(self, texte)
+        demandes = tuple(REGISTRE_CHAMPS) if champs is None else tuple(champs)
         
-        # ==================== NOM DU MÉDICAMENT ====================
-        nom_medicament = None
+        for nom in _ordre_evaluation(demandes):
+            champ = REGISTRE_CHAMPS[nom]
+            if durees is None:
+                contexte.entites[nom] = champ.extraire(self, contexte)
+            else:
+                debut = time.perf_counter()
+                contexte.entites[nom] = champ.extraire(self, contexte)
+                durees[nom] = durees.get(nom, 0.0) + time.perf_counter() - debut
         
-        # Stratégie 1: modèle ENTREPRISE-MEDICAMENT
-        if entreprise_trouvee:
-            modele = rf'{entreprise_trouvee}[-\s]+([A-Z][A-Z\s&\.]+?)(?:\s+\d+(?:\.\d+)?(?:mg|g|%)|(?:\s+-\s+)|(?:\s+L\.?P\.?))'
-            correspondance = re.search(modele, texte, re.IGNORECASE)
-            if correspondance:
-                nom_medicament = correspondance.group(1).strip()
+        return {nom: contexte.entites[nom] for nom in demandes}
+    
+    def predire_lot(self, textes: List[str], processus: int = 1, taille_paquet: int = 256,
+                    executeur: Optional[Executor] = None,
+                    champs: Optional[List[str]] = None) -> List[Dict[str, List[str]]]:
+        """
+        Extraire les entités d'une liste de textes, dans l'ordre.
         
-        # Stratégie 2: chercher le mot en majuscules avant le dosage
-        if not nom_medicament:
-            modele = r'\b([A-Z][A-Z]+(?:\s+[A-Z\.&LP]+)*)\s+\d+(?:\.\d+)?(?:mg|g|%)'
-            correspondance = re.search(modele, texte)
-            if correspondance:
-                nom_potentiel = correspondance.group(1).strip()
-                if nom_potentiel.upper() not in self.entreprises_algeriennes:
-                    nom_medicament = nom_potentiel
-        
-        # Stratégie 3: chercher le modèle "dosage MEDICAMENT" ou "dosage MEDICAMENT"
-        if not nom_medicament:
-            modele = r'\d+(?:\.\d+)?\s*(?:mg|g|%|ml)\s+([A-Z][A-Z]+(?:\s+[A-Z\.&LP]+)*)'
-            correspondance = re.search(modele, texte)
-            if correspondance:
-                nom_potentiel = correspondance.group(1).strip()
-                if nom_potentiel.upper() not in self.entreprises_algeriennes and nom_potentiel.upper() not in ['VIGNETTE', 'PRIX', 'LOT', 'FAB', 'EXP', 'PER']:
-                    nom_medicament = nom_potentiel
-        
-        # Stratégie 4: chercher un mot en majuscules à la FIN (format mélangé comme "... - CLAMOXYL")
-        if not nom_medicament:
-            modele = r'-\s+([A-Z]{3,}(?:\s+[A-Z\.&LP]+)*)\s*$'
-            correspondance = re.search(modele, texte)
-            if correspondance:
-                nom_potentiel = correspondance.group(1).strip()
-                if nom_potentiel.upper() not in self.entreprises_algeriennes and nom_potentiel.upper() not in ['VIGNETTE', 'PRIX', 'LOT', 'FAB', 'EXP', 'PER']:
-                    nom_medicament = nom_potentiel
-        
-        # Stratégie 5: premier mot en majuscules qui n'est pas une entreprise
-        if not nom_medicament:
-            modele = r'\b([A-Z]{3,}(?:\s+[A-Z\.&LP]+)*)\b'
-            correspondances = re.findall(modele, texte)
-            for correspondance in correspondances:
-                if correspondance.upper() not in self.entreprises_algeriennes and correspondance.upper() not in ['VIGNETTE', 'PRIX', 'LOT', 'FAB', 'EXP', 'PER']:
-                    nom_medicament = correspondance
-                    break
+        Args:
+            textes: Textes OCR
+            processus: Nombre de processus (1 = dans le processus courant)
+            taille_paquet: Textes envoyés à un processus à la fois (amortit le pickling)
+            executeur: ProcessPoolExecutor déjà ouvert, à réutiliser d'un appel à l'autre
+                (créé avec initializer=initialiser_processus, initargs=(extracteur,))
+            champs: Champs à extraire (voir analyser_format_algerian)
+        """
+        if executeur is None and processus <= 1:
+            return [self.analyser_format_algerian(texte, champs) for texte in textes]
         
-        if nom_medicament:
-            entites['nom_medicament'].append(nom_medicament)
-        
-        # ==================== PRINCIPE ACTIF ====================
-        modele_principe = r'-\s+([A-Z][a-zéèêàç]+(?:\s+[A-Z]?[a-zéèêàç]+)*)\s+-'
-        correspondances_principe = re.findall(modele_principe, texte)
-        for principe in correspondances_principe:
-            if nom_medicament and principe.upper() != nom_medicament.upper():
-                entites['principe_actif'].append(principe.strip())
-        
-        # Modèle 2: mots avec "mg" ou dosage contenant des mots-clés de principes
-        if not entites['principe_actif']:
-            modele = r'\d+(?:\.\d+)?\s*(?:mg|g|%|ml)\s*[–-]\s*([a-zéèêàç\s]+(?:sodique|chlorhydrate|sulfate|phosphate|base|acide))'
-            correspondance = re.search(modele, texte, re.IGNORECASE)
-            if correspondance:
-                entites['principe_actif'].append(correspondance.group(1).strip())
+        paquets = [textes[i:i + taille_paquet] for i in range(0, len(textes), taille_paquet)]
+        if executeur is not None:
+            resultats = executeur.map(_extraire_paquet, paquets, repeat(champs))
+            return [entites for paquet in resultats for entites in paquet]
         
-        # Modèle 3: chercher le modèle "dosage PRINCIPE" (ex: "1g AMOXICILLINE")
-        if not entites['principe_actif']:
-            modele = r'\d+(?:\.\d+)?\s*(?:mg|g|%|ml)\s+([A-Z][A-Z]+)'
-            correspondance = re.search(modele, texte)
-            if correspondance:
-                principe_potentiel = correspondance.group(1).strip()
-                if principe_potentiel.upper() not in self.entreprises_algeriennes and (not nom_medicament or principe_potentiel != nom_medicament):
-                    entites['principe_actif'].append(principe_potentiel)
-        
-        # Modèle 4: mots en casse mixte contenant des mots-clés de principes
-        if not entites['principe_actif']:
-            modele = r'\b([A-Z][a-zéèêàç]+(?:\s+[a-zéèêàç]+)?)\b'
-            correspondances = re.findall(modele, texte)
-            for correspondance in correspondances:
-                correspondance_min = correspondance.lower()
-                if any(mot in correspondance_min for mot in self.mots_cles_principes):
-                    entites['principe_actif'].append(correspondance)
-                    break
+        with ProcessPoolExecutor(max_workers=processus, mp_context=mp.get_context("spawn"),
+                                 initializer=initialiser_processus, initargs=(self,)) as pool:
+            return [entites for paquet in pool.map(_extraire_paquet, paquets, repeat(champs)) for entites in paquet]
+
+
+# Extracteur propre à chaque processus de predire_lot()
+_extracteur_processus: Optional[ExtracteurMedicaments] = None
+
+
+def initialiser_processus(extracteur: ExtracteurMedicaments):
+    global _extracteur_processus
+    _extracteur_processus = extracteur
+
+
+def _extraire_paquet(textes: List[str], champs: Optional[List[str]] = None) -> List[Dict[str, List[str]]]:
+    return [_extracteur_processus.analyser_format_algerian(texte, champs) for texte in textes]
+
+
+class ClassificateurMedicamentsAlgerien(ExtracteurMedicaments):
+    """Classificateur robuste pour OCR pharmaceutique algérien: ExtracteurMedicaments + console et sauvegarde dans results/"""
+    
+    def __init__(self, results_dir: str = "results", dictionnaire=None):
+        """
+        Initialize the classifier with a results directory
         
-        # ==================== DOSAGE ====================
-        modeles_dosage = [
-            r'\b(\d+(?:\.\d+)?\s*mg(?:/\d+(?:\.\d+)?mg)?)\b',
-            r'\b(\d+(?:\.\d+)?\s*g)\b',
-            r'\b(\d+(?:\.\d+)?\s*ml)\b',
-            r'\b(\d+(?:\.\d+)?\s*%)\b',
-            r'\b(\d+(?:\.\d+)?\s*mcg)\b',
-            r'\b(\d+(?:\.\d+)?\s*µg)\b',
-        ]
-        for modele in modeles_dosage:
-            correspondances = re.findall(modele, texte, re.IGNORECASE)
-            for correspondance in correspondances:
-                correspondance_normalisee = re.sub(r'\s+', '', correspondance)
-                if correspondance_normalisee not in entites['dosage']:
-                    entites['dosage'].append(correspondance_normalisee)
-        
-        # ==================== FORME PHARMACEUTIQUE ====================
-        modeles_forme = [
-            (r'([A-Za-zéèêàç]+)\s*/?\s*[BbEe]/?(\d+)', lambda m: f"{m.group(2)} {m.group(1).lower()}"),
-            (r'[Bb]o[iî]te\s+de\s+(\d+)\s+([A-Za-zéèêàç]+)', lambda m: f"{m.group(1)} {m.group(2).lower()}"),
-            (r'([A-Za-zéèêàç]+)\s+boîte\s+de\s+(\d+)', lambda m: f"{m.group(2)} {m.group(1).lower()}"),
-            (r'[BbEe]/?(\d+)\s+([A-Za-zéèêàç]+)', lambda m: f"{m.group(1)} {m.group(2).lower()}"),
-        ]
-        
-        for modele, formateur in modeles_forme:
-            correspondance = re.search(modele, texte, re.IGNORECASE)
-            if correspondance:
-                try:
-                    mot_forme = correspondance.group(2) if len(correspondance.groups()) >= 2 else correspondance.group(1)
-                except:
-                    continue
-                    
-                if any(f in mot_forme.lower() for f in self.formes_pharmaceutiques):
-                    entites['forme_pharmaceutique'].append(formateur(correspondance))
-                    break
+        Args:
+            results_dir: Directory where results will be saved (default: "results")
+            dictionnaire: see ExtracteurMedicaments
+        """
+        print("🇩🇿 Classificateur Algérien initialisé\n")
         
-        # Modèle pour les formes autonomes (ex: "Comprimés" sur sa propre ligne)
-        if not entites['forme_pharmaceutique']:
-            for forme in self.formes_pharmaceutiques:
-                modele = rf'\b({forme})\b'
-                correspondance = re.search(modele, texte, re.IGNORECASE)
-                if correspondance:
-                    entites['forme_pharmaceutique'].append(correspondance.group(1).lower())
-                    break
+        # Create results directory
+        self.results_dir = Path(results_dir)
+        self.results_dir.mkdir(exist_ok=True)
         
-        # ==================== NUMÉRO DE LOT ====================
-        modeles_lot = [
-            r'LOT\s*[n°:]*\s*:?\s*([A-Z0-9]+(?:\s*/?\s*\d+)?)',
-            r'N°?\s*LOT\s*:?\s*([A-Z0-9\s/]+?)(?:\s+-|\s+FAB|\s+PER|\s+EXP|$)',
-            r'Lot\s+n°?\s*:?\s*([A-Z0-9\s]+?)(?:\s+-|\s+FAB|$)',
-            r'LOT\s+([A-Z0-9]+)',
-        ]
-        for modele in modeles_lot:
-            correspondance = re.search(modele, texte, re.IGNORECASE)
-            if correspondance:
-                lot = correspondance.group(1).strip()
-                lot = re.sub(r'\s+', ' ', lot)
-                entites['numero_lot'].append(lot)
-                break
-        
-        # ==================== DATE DE FABRICATION ====================
-        modeles_fab = [
-            r'FAB(?:RICATO?)?\s*[B:]?\s*:?\s*(\d{1,2}[-/]\d{2,4})',
-            r'Date\s+Fab(?:rication)?\s*:?\s*(\d{1,2}[-/]\d{2,4})',
-            r'Fab\s*:?\s*(\d{1,2}[-/]\d{2,4})',
-            r'FAB\s+(\d{2}-\d{4})',
-            r'FAB\s+(\d{2}-\d{2})',
-            r'\bFAB\s+(\d{2}/\d{4})',
-        ]
-        for modele in modeles_fab:
-            correspondance = re.search(modele, texte, re.IGNORECASE)
-            if correspondance:
-                entites['date_fabrication'].append(correspondance.group(1))
-                break
-        
-        # ==================== DATE DE PÉREMPTION ====================
-        modeles_exp = [
-            r'(?:PER(?:IOD[OI])?|EXP(?:IRATION)?)\s*:?\s*(\d{1,2}[-/]\d{2,4})',
-            r'Date\s+Exp(?:iration)?\s*:?\s*(\d{1,2}[-/]\d{2,4})',
-            r'Péremption\s*:?\s*(\d{1,2}[-/]\d{2,4})',
-            r'EXP\s+(\d{2}-\d{4})',
-            r'EXP:\s*(\d{2}-\d{2})',
-            r'\bEXP\s+(\d{2}/\d{4})',
-        ]
-        for modele in modeles_exp:
-            correspondance = re.search(modele, texte, re.IGNORECASE)
-            if correspondance:
-                entites['date_peremption'].append(correspondance.group(1))
-                break
-        
-        # ==================== PRIX ====================
-        modeles_prix = [
-            r'TR\s*[=:]\s*(\d+(?:\.\d+)?)\s*DA',
-            r'T\.R\s*[=:]\s*(\d+(?:\.\d+)?)\s*DA',
-            r'Tarif\s+de\s+Réf?(?:érence)?\s*[=:]\s*(\d+(?:\.\d+)?)\s*DA',
-            r'PPA\s*[=:+]?\s*(\d+(?:\.\d+)?)\s*DA',
-            r'Prix\s*[+]?\s*SHP\s*[=:]\s*(\d+(?:\.\d+)?)',
-            r'PRIX\s*[=:]\s*(\d+(?:\.\d+)?)',
-            r'PRIX\s+(\d+(?:\.\d+)?)DA',
-            r'TR\s+(\d+(?:\.\d+)?)DA',
-            r'T\.R\s+(\d+(?:\.\d+)?)DA',
-        ]
-        for modele in modeles_prix:
-            correspondance = re.search(modele, texte, re.IGNORECASE)
-            if correspondance:
-                prix = correspondance.group(1)
-                entites['prix'].append(prix + ' DA')
-                break
-        
-        # ==================== NUMÉRO D'ENREGISTREMENT (D.E) ====================
-        modeles_de = [
-            r'D\.?E\s*[n°]*\s*:?\s*([\d/A-Z\s]+?)(?:\s+-|\s+LOT|\s+FAB|\s+\d{4}/\d{4}|$)',
-            r'N°\s*D\.?E\s*:?\s*([\d/A-Z\s]+?)(?:\s+-|$)',
-        ]
-        for modele in modeles_de:
-            correspondance = re.search(modele, texte, re.IGNORECASE)
-            if correspondance:
-                num_de = correspondance.group(1).strip()
-                num_de = re.sub(r'\s+', ' ', num_de)
-                num_de = re.sub(r'\s+\d{4}$', '', num_de)
-                if num_de:
-                    entites['numero_enregistrement'].append(num_de)
-                    break
+        print(f"📁 Dossier de résultats créé: {self.results_dir.absolute()}\n")
         
-        return entites
+        # Résultats en ajout seul dans results/resultats.jsonl (voir stockage.py)
+        # et inventaire interrogeable results/inventaire.db (voir inventaire.py),
+        # ouverts à la première sauvegarde; le thread d'écriture du JSONL
+        # alimente aussi l'inventaire
+        self._magasin = None
+        self._inventaire = None
+        
+        super().__init__(dictionnaire)
+        if self.dictionnaire is not None:
+            print(f"📚 Dictionnaire chargé: {len(self.dictionnaire)} termes\n")
+    
+    @property
+    def magasin(self) -> MagasinResultats:
+        if self._magasin is None:
+            self._magasin = MagasinResultats(self.results_dir / "resultats.jsonl",
+                                             indexeur=self.inventaire.ajouter_entrees)
+        return self._magasin
+    
+    @property
+    def inventaire(self) -> Inventaire:
+        if self._inventaire is None:
+            self._inventaire = Inventaire(self.results_dir / "inventaire.db")
+        return self._inventaire
+    
+    def __getstate__(self):
+        # Ni le thread d'écriture ni la connexion SQLite ne se picklent (predire_lot en multi-processus)
+        etat = self.__dict__.copy()
+        etat['_magasin'] = None
+        etat['_inventaire'] = None
+        return etat
+    
+    def fermer(self):
+        """Écrire les résultats encore en file et fermer les fichiers"""
+        if self._magasin is not None:
+            self._magasin.fermer()
+            self._magasin = None
+        if self._inventaire is not None:
+            self._inventaire.fermer()
+            self._inventaire = None
     
     def predire(self, texte: str):
         """Méthode de prédiction principale"""
@@ -347,91 +618,58 @@ class ClassificateurMedicamentsAlgerien:
         
         return sortie
     
-    def enregistrer_dans_fichier(self, entites: dict, nom_fichier: str = None, save_text: bool = True):
+    def enregistrer_dans_fichier(self, entites: dict, nom_fichier: str = None, save_text: bool = False):
         """
-        Enregistrer les entités dans un fichier JSON et/ou texte dans le dossier results
+        Ajouter les entités à results/resultats.jsonl et à l'inventaire SQLite (et
+        optionnellement un fichier texte). JSONL, inventaire et texte sont écrits par
+        le thread d'écriture du magasin: l'appel ne bloque ni sur le disque ni sur SQLite.
         
         Args:
             entites: Données extraites
-            nom_fichier: Nom de base du fichier (sans extension). Si None, utilise timestamp
-            save_text: Si True, sauvegarde également au format texte
+            nom_fichier: Nom de l'entrée (et du fichier texte). Si None, utilise nom + timestamp
+            save_text: Si True, écrit aussi results/text/<nom_fichier>.txt
         """
         
-        # Générer un nom de fichier basé sur le timestamp si non fourni
+        # Générer un nom basé sur le timestamp si non fourni
         if nom_fichier is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             nom_medicament = entites.get('nom_medicament', ['inconnu'])[0] if entites.get('nom_medicament') else 'inconnu'
             nom_medicament = re.sub(r'[^\w\s-]', '', nom_medicament).replace(' ', '_')
             nom_fichier = f"{nom_medicament}_{timestamp}"
         
-        # Ajouter un horodatage à l'entrée
-        entree = {
-            'horodatage': datetime.now().isoformat(),
-            'donnees': entites
-        }
-        
-        # ========== SAUVEGARDER JSON ==========
-        json_path = self.results_dir / "json" / f"{nom_fichier}.json"
-        
-        # Charger les données existantes si le fichier existe
-        donnees_existantes = []
-        if json_path.exists():
-            try:
-                with open(json_path, 'r', encoding='utf-8') as f:
-                    donnees_existantes = json.load(f)
-                    if not isinstance(donnees_existantes, list):
-                        donnees_existantes = [donnees_existantes]
-            except json.JSONDecodeError:
-                print(f"   ⚠️  Fichier JSON corrompu, création d'un nouveau")
-                donnees_existantes = []
-        
-        # Ajouter la nouvelle entrée
-        donnees_existantes.append(entree)
-        
-        # Enregistrer le fichier JSON
+        # ========== AJOUTER AU JSONL ==========
         try:
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(donnees_existantes, f, indent=2, ensure_ascii=False)
-            print(f"   ✅ JSON enregistré: {json_path}")
-            print(f"   📊 Nombre total d'entrées: {len(donnees_existantes)}")
+            self.magasin.ajouter(entites, nom=nom_fichier)
+            print(f"   ✅ Ajouté à: {self.magasin.chemin}")
         except Exception as e:
-            print(f"   ❌ Erreur JSON: {e}")
+            print(f"   ❌ Erreur JSONL: {e}")
             return False
         
         # ========== SAUVEGARDER TEXTE ==========
         if save_text:
             text_path = self.results_dir / "text" / f"{nom_fichier}.txt"
-            try:
-                with open(text_path, 'w', encoding='utf-8') as f:
-                    f.write(self.formater_sortie(entites))
-                print(f"   ✅ Texte enregistré: {text_path}")
-            except Exception as e:
-                print(f"   ❌ Erreur Texte: {e}")
+            self.magasin.ajouter_texte(text_path, self.formater_sortie(entites))
+            print(f"   ✅ Texte en cours d'écriture: {text_path}")
         
         print()
         return True
     
     def enregistrer_batch(self, liste_entites: List[dict], nom_fichier: str = "batch_results"):
         """
-        Enregistrer plusieurs résultats en un seul fichier
+        Ajouter plusieurs résultats au JSONL (et à l'inventaire) sous un même nom de lot
         
         Args:
             liste_entites: Liste de dictionnaires d'entités
-            nom_fichier: Nom du fichier de sortie
+            nom_fichier: Nom du lot (suffixé d'un timestamp)
         """
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        json_path = self.results_dir / "json" / f"{nom_fichier}_{timestamp}.json"
-        
-        batch_data = {
-            'horodatage': datetime.now().isoformat(),
-            'nombre_medicaments': len(liste_entites),
-            'medicaments': liste_entites
-        }
+        nom_lot = f"{nom_fichier}_{timestamp}"
         
         try:
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(batch_data, f, indent=2, ensure_ascii=False)
-            print(f"   ✅ Batch JSON enregistré: {json_path}")
+            # L'inventaire est alimenté par le thread d'écriture du magasin
+            for entites in liste_entites:
+                self.magasin.ajouter(entites, nom=nom_lot)
+            print(f"   ✅ Batch ajouté à: {self.magasin.chemin} ({nom_lot})")
             print(f"   📊 Nombre de médicaments: {len(liste_entites)}\n")
             return True
         except Exception as e:
@@ -439,6 +677,40 @@ class ClassificateurMedicamentsAlgerien:
             return False
 
 
+# Cas de test complets
+CAS_TESTS = [
+    {
+        "nom": "TEST 1: Format Multi-ligne - PARACETAMOL",
+        "texte": """LOT 77A  
+BIOCARE  
+500 mg PARACETAMOL  
+EXP 04-2026  
+Comprimés  
+FAB 02-2024  
+TR: 62.5DA"""
+    },
+    {
+        "nom": "TEST 2: Format Multi-ligne - CLOFENAL LP",
+        "texte": """75mg – diclofénac sodique  
+EXP:11-25  
+VIGNETTE SAIDAL  
+B/20 gélules LP  
+CLOFENAL LP  
+LOT 605  
+FAB 10-24  
+PPA 366.60DA"""
+    },
+    {
+        "nom": "TEST 3: Une seule ligne - BIOFENAC",
+        "texte": "Biopharm-BIOFENAC 100mg - Diclofénac Sodique - Suppositoires/B10 - TR=87.80DA - LOT: 77/23 - FAB: 12/26 - PER: 11/05/04"
+    },
+    {
+        "nom": "TEST 4: Une seule ligne - CLOFENAL L.P",
+        "texte": "VIGNETTE-SAIDAL CLOFENAL & L.P 75 mg - Diclofénac sodique - Boîte de 30 Gélules L.P - PRIX: 365.10 - LOT: 605 - FAB: 10/2024 - EXP: 11/2024"
+    },
+]
+
+
 def principale():
     """Fonction principale"""
     
@@ -463,6 +735,7 @@ def principale():
         choice = input("\n➤ Votre choix (1/2/3): ").strip()
         
         if choice == '3':
+            classificateur.fermer()
             print("\n👋 Au revoir!")
             break
         
@@ -472,42 +745,10 @@ def principale():
             print("🧪 TESTS AUTOMATIQUES")
             print("="*70)
             
-            # Cas de test complets
-            cas_tests = [
-                {
-                    "nom": "TEST 1: Format Multi-ligne - PARACETAMOL",
-                    "texte": """LOT 77A  
-BIOCARE  
-500 mg PARACETAMOL  
-EXP 04-2026  
-Comprimés  
-FAB 02-2024  
-TR: 62.5DA"""
-                },
-                {
-                    "nom": "TEST 2: Format Multi-ligne - CLOFENAL LP",
-                    "texte": """75mg – diclofénac sodique  
-EXP:11-25  
-VIGNETTE SAIDAL  
-B/20 gélules LP  
-CLOFENAL LP  
-LOT 605  
-FAB 10-24  
-PPA 366.60DA"""
-                },
-                {
-                    "nom": "TEST 3: Une seule ligne - BIOFENAC",
-                    "texte": "Biopharm-BIOFENAC 100mg - Diclofénac Sodique - Suppositoires/B10 - TR=87.80DA - LOT: 77/23 - FAB: 12/26 - PER: 11/05/04"
-                },
-                {
-                    "nom": "TEST 4: Une seule ligne - CLOFENAL L.P",
-                    "texte": "VIGNETTE-SAIDAL CLOFENAL & L.P 75 mg - Diclofénac sodique - Boîte de 30 Gélules L.P - PRIX: 365.10 - LOT: 605 - FAB: 10/2024 - EXP: 11/2024"
-                },
-            ]
             
             resultats_batch = []
             
-            for i, test in enumerate(cas_tests, 1):
+            for i, test in enumerate(CAS_TESTS, 1):
                 print(f"\n{'─'*70}")
                 print(f"{test['nom']}")
                 print('─'*70)
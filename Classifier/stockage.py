@@ -0,0 +1,284 @@
+"""
+Stockage des résultats d'extraction en JSON Lines, en ajout seul.
+
+Remplace la relecture / réécriture complète de results/json/<nom>.json à
+chaque prédiction (O(n) par sauvegarde, O(n²) au total): chaque résultat est
+une ligne ajoutée à results/resultats.jsonl par un thread d'écriture, avec un
+fsync groupé. Les prédictions ne font que déposer l'entrée dans une file.
+
+Format d'une ligne:
+    {"horodatage": "...", "nom": "...", "donnees": {<entités>}, "source": "..."}
+
+Migration des anciens fichiers:
+    python stockage.py migrer results/json -o results/resultats.jsonl
+    python stockage.py compter results/resultats.jsonl
+"""
+import argparse
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional
+
+
+def reparer_fin(chemin: Path) -> int:
+    """
+    Couper une dernière ligne incomplète (arrêt pendant une écriture) pour que
+    les ajouts suivants commencent sur une ligne propre. Retourne les octets retirés.
+    """
+    if not chemin.exists():
+        return 0
+    with open(chemin, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        taille = f.tell()
+        # Remonter par blocs jusqu'au dernier saut de ligne
+        position = taille
+        while position > 0:
+            debut = max(0, position - 65536)
+            f.seek(debut)
+            bloc = f.read(position - debut)
+            index = bloc.rfind(b'\n')
+            if index >= 0:
+                position = debut + index + 1
+                break
+            position = debut
+    if position < taille:
+        with open(chemin, 'r+b') as f:
+            f.truncate(position)
+    return taille - position
+
+
+def lire(chemin) -> Iterator[dict]:
+    """Enregistrements d'un fichier JSONL (lignes illisibles ignorées)"""
+    with open(chemin, 'r', encoding='utf-8') as f:
+        for ligne in f:
+            try:
+                yield json.loads(ligne)
+            except ValueError:
+                continue
+
+
+class MagasinResultats:
+    """
+    Fichier JSONL alimenté par un thread d'écriture en arrière-plan.
+
+    Usage:
+        magasin = MagasinResultats("results/resultats.jsonl")
+        magasin.ajouter(entites, nom="DOLIPRANE")   # ne bloque pas sur le disque
+        magasin.fermer()                            # vide la file + fsync (aussi fait à la sortie)
+
+    fsync_tous / fsync_delai: un fsync toutes les N lignes ou toutes les T secondes,
+    au premier des deux atteint. Si la file est pleine, ajouter() attend
+    (contre-pression) plutôt que de perdre des résultats.
+
+    indexeur: appelé par le thread d'écriture avec chaque groupe d'entrées écrites
+    (ex: Inventaire.ajouter_entrees), pour indexer sans bloquer l'appelant.
+    """
+
+    def __init__(self, chemin, fsync_tous: int = 64, fsync_delai: float = 1.0, taille_file: int = 10000,
+                 indexeur: Optional[Callable[[List[dict]], object]] = None):
+        self.chemin = Path(chemin)
+        self.indexeur = indexeur
+        self.chemin.parent.mkdir(parents=True, exist_ok=True)
+        self.fsync_tous = fsync_tous
+        self.fsync_delai = fsync_delai
+
+        retires = reparer_fin(self.chemin)
+        if retires:
+            print(f"⚠️  Dernier enregistrement incomplet retiré ({retires} octets): {self.chemin}")
+
+        self.ecrits = 0
+        self.erreurs = 0
+        self._file = queue.Queue(taille_file)
+        self._ferme = False
+        self._thread = threading.Thread(target=self._ecrire, name="magasin-resultats", daemon=True)
+        self._thread.start()
+        atexit.register(self.fermer)
+
+    def ajouter(self, entites: dict, nom: Optional[str] = None, **meta):
+        """Mettre un résultat en file d'écriture (champs supplémentaires: source, image, ...)"""
+        if self._ferme:
+            raise RuntimeError(f"Magasin fermé: {self.chemin}")
+        entree = {'horodatage': meta.pop('horodatage', None) or datetime.now().isoformat(), 'nom': nom,
+                  'donnees': entites, **meta}
+        self._file.put(('ligne', (json.dumps(entree, ensure_ascii=False) + '\n', entree)))
+
+    def ajouter_texte(self, chemin, contenu: str):
+        """Écrire un fichier texte complet depuis le thread d'écriture"""
+        if self._ferme:
+            raise RuntimeError(f"Magasin fermé: {self.chemin}")
+        self._file.put(('texte', (Path(chemin), contenu)))
+
+    def en_attente(self) -> int:
+        return self._file.qsize()
+
+    def vider(self):
+        """Attendre que tout ce qui est en file soit écrit (et fsync)"""
+        if self._ferme:
+            return
+        self._file.put(('fsync', None))
+        self._file.join()
+
+    def fermer(self):
+        if self._ferme:
+            return
+        self._ferme = True
+        self._file.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fermer()
+
+    def _ecrire(self):
+        with open(self.chemin, 'a', encoding='utf-8') as f:
+            non_synchronises = 0
+            dernier_fsync = time.monotonic()
+            termine = False
+            while not termine:
+                try:
+                    elements = [self._file.get(timeout=self.fsync_delai)]
+                except queue.Empty:
+                    elements = []
+
+                # Regrouper tout ce qui attend déjà en une seule écriture
+                while elements and elements[-1] is not None:
+                    try:
+                        elements.append(self._file.get_nowait())
+                    except queue.Empty:
+                        break
+
+                lignes = []
+                entrees = []
+                force = False
+                for element in elements:
+                    if element is None:
+                        termine = force = True
+                    elif element[0] == 'ligne':
+                        lignes.append(element[1][0])
+                        entrees.append(element[1][1])
+                    elif element[0] == 'fsync':
+                        force = True
+                    else:
+                        self._ecrire_texte(*element[1])
+
+                # Une erreur disque ne doit pas tuer le thread: vider()/fermer() attendent la file
+                try:
+                    if lignes:
+                        f.write(''.join(lignes))
+                        f.flush()
+                        non_synchronises += len(lignes)
+                        self.ecrits += len(lignes)
+
+                    if non_synchronises and (force or non_synchronises >= self.fsync_tous
+                                             or time.monotonic() - dernier_fsync >= self.fsync_delai):
+                        os.fsync(f.fileno())
+                        non_synchronises = 0
+                        dernier_fsync = time.monotonic()
+                except OSError as e:
+                    self.erreurs += len(lignes)
+                    print(f"   ❌ Erreur JSONL: {e}")
+
+                if self.indexeur is not None and entrees:
+                    try:
+                        self.indexeur(entrees)
+                    except Exception as e:
+                        self.erreurs += len(entrees)
+                        print(f"   ❌ Erreur Index: {e}")
+
+                for _ in elements:
+                    self._file.task_done()
+
+    def _ecrire_texte(self, chemin: Path, contenu: str):
+        try:
+            chemin.parent.mkdir(parents=True, exist_ok=True)
+            chemin.write_text(contenu, encoding='utf-8')
+        except OSError as e:
+            self.erreurs += 1
+            print(f"   ❌ Erreur Texte: {e}")
+
+
+# ==================================================
+# MIGRATION DES ANCIENS FICHIERS results/json/*.json
+# ==================================================
+def entrees_fichier_json(chemin: Path) -> Iterator[dict]:
+    """
+    Entrées d'un ancien fichier: liste d'entrées {horodatage, donnees}
+    (enregistrer_dans_fichier) ou lot {horodatage, medicaments} (enregistrer_batch)
+    """
+    with open(chemin, 'r', encoding='utf-8') as f:
+        contenu = json.load(f)
+
+    if isinstance(contenu, dict) and 'medicaments' in contenu:
+        for entites in contenu['medicaments']:
+            yield {'horodatage': contenu.get('horodatage'), 'donnees': entites}
+        return
+
+    for entree in contenu if isinstance(contenu, list) else [contenu]:
+        if isinstance(entree, dict) and 'donnees' in entree:
+            yield entree
+
+
+def migrer(dossier_json, sortie) -> dict:
+    """
+    Ajouter toutes les entrées de dossier_json/*.json à `sortie`, en ordre
+    chronologique de fichier. Les fichiers déjà migrés (même `source`) sont
+    ignorés, ce qui rend la migration relançable.
+    """
+    sortie = Path(sortie)
+    deja_migres = {e.get('source') for e in lire(sortie)} if sortie.exists() else set()
+
+    bilan = {'fichiers': 0, 'entrees': 0, 'ignores': 0, 'illisibles': 0}
+    with MagasinResultats(sortie, fsync_tous=1000) as magasin:
+        for chemin in sorted(Path(dossier_json).glob('*.json'), key=lambda p: p.stat().st_mtime):
+            if chemin.name in deja_migres:
+                bilan['ignores'] += 1
+                continue
+            try:
+                entrees = list(entrees_fichier_json(chemin))
+            except (OSError, ValueError) as e:
+                print(f"   ⚠️  {chemin.name} illisible: {e}")
+                bilan['illisibles'] += 1
+                continue
+            for entree in entrees:
+                magasin.ajouter(entree['donnees'], nom=chemin.stem, source=chemin.name,
+                                horodatage=entree.get('horodatage'))
+            bilan['fichiers'] += 1
+            bilan['entrees'] += len(entrees)
+    return bilan
+
+
+def principale():
+    parser = argparse.ArgumentParser(description="Stockage JSONL des résultats d'extraction")
+    commandes = parser.add_subparsers(dest='commande', required=True)
+
+    commande_migrer = commandes.add_parser('migrer', help="Convertir results/json/*.json en JSONL")
+    commande_migrer.add_argument('dossier', help="Dossier des anciens fichiers JSON (ex: results/json)")
+    commande_migrer.add_argument('-o', '--sortie', default='results/resultats.jsonl')
+
+    commande_compter = commandes.add_parser('compter', help="Nombre d'enregistrements d'un fichier JSONL")
+    commande_compter.add_argument('fichier')
+
+    args = parser.parse_args()
+
+    if args.commande == 'migrer':
+        debut = time.perf_counter()
+        bilan = migrer(args.dossier, args.sortie)
+        print(f"✅ {bilan['entrees']} entrées de {bilan['fichiers']} fichiers -> {args.sortie} "
+              f"({time.perf_counter() - debut:.1f}s)")
+        if bilan['ignores']:
+            print(f"   ⏭️  {bilan['ignores']} fichiers déjà migrés")
+        if bilan['illisibles']:
+            print(f"   ⚠️  {bilan['illisibles']} fichiers illisibles")
+    else:
+        print(sum(1 for _ in lire(args.fichier)))
+
+
+if __name__ == "__main__":
+    principale()
@@ -0,0 +1,418 @@
+"""
+Batch scan of a photo archive: the backend /scan pipeline over a whole
+directory tree (or a manifest), with one JSON line of results per image.
+
+    python batch_scan.py --input H:/archive/shelf_photos --out scans.jsonl
+    python batch_scan.py --manifest photos.txt --out scans.jsonl --ocr-workers 6
+
+Stages run in separate process pools connected by bounded queues, so the
+model, the OCR denoising and Tesseract all stay busy while memory stays flat:
+
+    feeder -> [detect + rectify] -> [OCR enhancement] -> [Tesseract + fields] -> writer
+
+Only the rectified label crop travels between stages, never the full photo.
+
+Each finished image (label found, no label, or failed) is appended to --out
+and flushed immediately. Running the same command again skips every image
+already in the file, so an interrupted run resumes where it stopped;
+--retry-errors also redoes the images that failed.
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import queue
+import sys
+import threading
+import time
+
+import cv2
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "mobile_app", "medicine_label_backend"))
+sys.path.insert(0, os.path.join(ROOT, "text_extraction"))
+sys.path.insert(0, os.path.join(ROOT, "Classifier"))
+
+from label_pipeline import (  # noqa: E402
+    load_model,
+    letterbox_image,
+    best_detection,
+    refine_box_edges,
+    refine_box_edges_rotated,
+    rectify_label,
+)
+
+DETECT_MODEL = os.path.join(ROOT, "runs", "detect", "runs", "detect",
+                            "medicine_label_lowdata2", "weights", "best.pt")
+CONF_THRESHOLD = 0.15
+IOU_THRESHOLD = 0.45
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+# Denoising and Tesseract both cost ~1-2 s per label, so the CPU cores
+# (minus one for the detect stage) are split between them by default
+CPU_WORKERS = max(1, ((os.cpu_count() or 4) - 1) // 2)
+
+
+# ==================================================
+# INPUT / RESUME
+# ==================================================
+def list_images(input_dir=None, manifest=None):
+    """Absolute image paths from a directory tree and/or a manifest (one path per line)"""
+    paths = []
+    if input_dir:
+        for dirpath, dirnames, filenames in os.walk(input_dir):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.lower().endswith(IMAGE_EXTS):
+                    paths.append(os.path.abspath(os.path.join(dirpath, filename)))
+    if manifest:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    paths.append(os.path.abspath(os.path.join(base, line)))
+
+    # Same photo listed twice (manifest + directory) is scanned once
+    return list(dict.fromkeys(paths))
+
+
+def load_completed(out_path, retry_errors=False):
+    """
+    Images already recorded in the output file. A truncated last line (crash
+    mid-write) is cut off so new records start on a clean line.
+    """
+    completed = set()
+    if not os.path.exists(out_path):
+        return completed
+
+    with open(out_path, "rb") as f:
+        data = f.read()
+
+    end = data.rfind(b"\n") + 1
+    if end < len(data):
+        print(f"⚠️  Dropping incomplete last record ({len(data) - end} bytes)")
+        with open(out_path, "r+b") as f:
+            f.truncate(end)
+
+    for line in data[:end].splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if not isinstance(record, dict) or not record.get("image"):
+            continue  # not a scan record (classifier output, hand-written line)
+        if retry_errors and record.get("status") == "error":
+            continue
+        completed.add(record["image"])
+    return completed
+
+
+def artifact_name(path):
+    """Unique file stem for crops saved from `path` (archives reuse filenames)"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return f"{stem}_{hashlib.sha1(path.encode('utf-8')).hexdigest()[:8]}"
+
+
+def error_record(path, stage, error, timings):
+    return {"image": path, "status": "error", "stage": stage,
+            "error": f"{type(error).__name__}: {error}", "timings_ms": timings}
+
+
+# ==================================================
+# STAGE WORKERS (one process each)
+# ==================================================
+def detect_worker(model_path, imgsz, device, save_dir, in_q, out_q, result_q):
+    """photo path -> (path, geometry, rectified label crop)"""
+    if device == "auto":
+        import torch
+        device = 0 if torch.cuda.is_available() else "cpu"
+    model = load_model(model_path)
+
+    while True:
+        path = in_q.get()
+        if path is None:
+            break
+
+        timings = {}
+        start = time.perf_counter()
+        try:
+            img = cv2.imread(path)
+            if img is None:
+                raise ValueError("unreadable image")
+            timings["decode"] = (time.perf_counter() - start) * 1000
+
+            stage_start = time.perf_counter()
+            img_letterboxed, scale, padding = letterbox_image(img, target_size=imgsz)
+            results = model(img_letterboxed, conf=CONF_THRESHOLD, iou=IOU_THRESHOLD,
+                            device=device, verbose=False, imgsz=imgsz)[0]
+            detection = best_detection(results, scale, padding, img.shape)
+            timings["detect"] = (time.perf_counter() - stage_start) * 1000
+
+            if detection is None:
+                result_q.put({"image": path, "status": "no_label", "timings_ms": timings})
+                continue
+
+            stage_start = time.perf_counter()
+            if detection["obb_points"] is not None:
+                rotated_box, box, source = detection["obb_points"], detection["yolo_box"], "obb"
+            else:
+                rotated_box = refine_box_edges_rotated(img, detection["yolo_box"])
+                box = refine_box_edges(img, detection["yolo_box"])
+                source = "contour" if rotated_box is not None else "axis_aligned_fallback"
+
+            if rotated_box is not None:
+                label = rectify_label(img, rotated_box)
+            else:
+                x1, y1, x2, y2 = box
+                label = img[y1:y2, x1:x2]
+            timings["rectify"] = (time.perf_counter() - stage_start) * 1000
+
+            if save_dir:
+                cv2.imwrite(os.path.join(save_dir, "cropped", artifact_name(path) + ".jpg"), label)
+
+            geometry = {
+                "confidence": detection["confidence"],
+                "box": list(box),
+                "rotated_box": rotated_box,
+                "rotation_source": source,
+                "image_size": [img.shape[1], img.shape[0]],
+            }
+            out_q.put((path, geometry, label, timings))
+
+        except Exception as e:
+            result_q.put(error_record(path, "detect", e, timings))
+
+
+def enhance_worker(save_dir, in_q, out_q, result_q):
+    """rectified crop -> binarized image for Tesseract (upscale + NLM + threshold)"""
+    from ocr_test import preprocess_image
+
+    while True:
+        item = in_q.get()
+        if item is None:
+            break
+
+        path, geometry, label, timings = item
+        try:
+            start = time.perf_counter()
+            processed = preprocess_image(label)
+            timings["enhance"] = (time.perf_counter() - start) * 1000
+
+            if save_dir:
+                cv2.imwrite(os.path.join(save_dir, "enhanced", artifact_name(path) + ".png"), processed)
+
+            out_q.put((path, geometry, processed, timings))
+        except Exception as e:
+            result_q.put(error_record(path, "enhance", e, timings))
+
+
+def ocr_worker(angles, in_q, result_q):
+    """binarized image -> OCR text -> extracted fields"""
+    from ocr_test import extract_text_all_angles, clean_combined_text
+    from reberta_med_classification import ExtracteurMedicaments
+
+    classifier = ExtracteurMedicaments()
+
+    while True:
+        item = in_q.get()
+        if item is None:
+            break
+
+        path, geometry, processed, timings = item
+        try:
+            start = time.perf_counter()
+            text = clean_combined_text(extract_text_all_angles(processed, angles))
+            timings["ocr"] = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            fields = classifier.analyser_format_algerian(text)
+            timings["classify"] = (time.perf_counter() - start) * 1000
+
+            result_q.put({
+                "image": path,
+                "status": "ok",
+                **geometry,
+                "fields": fields,
+                "text": text,
+                "timings_ms": timings,
+            })
+        except Exception as e:
+            result_q.put(error_record(path, "ocr", e, timings))
+
+
+# ==================================================
+# STAGE SUPERVISION
+# ==================================================
+class StageDied(RuntimeError):
+    """Every worker of a stage exited: queues feeding it would block forever"""
+
+
+def check_stages(stages):
+    for name, _, workers in stages:
+        if not any(worker.is_alive() for worker in workers):
+            codes = ", ".join(str(worker.exitcode) for worker in workers)
+            raise StageDied(f"all {name} workers exited (exit codes: {codes})")
+
+
+def put_checked(stage_q, item, stages, poll=1.0):
+    """stage_q.put(item), raising StageDied instead of blocking if a stage downstream is gone"""
+    while True:
+        try:
+            stage_q.put(item, timeout=poll)
+            return
+        except queue.Full:
+            check_stages(stages)
+
+
+def join_checked(workers, stages, poll=1.0):
+    """Join a stage's workers, raising StageDied if a later stage they feed is gone"""
+    for worker in workers:
+        while worker.is_alive():
+            worker.join(poll)
+            if worker.is_alive():
+                check_stages(stages)
+
+
+# ==================================================
+# WRITER (thread in the main process)
+# ==================================================
+def write_results(result_q, out_path, total, fsync_every, summary):
+    start = time.perf_counter()
+    written = 0
+    with open(out_path, "a", encoding="utf-8") as f:
+        while True:
+            record = result_q.get()
+            if record is None:
+                break
+
+            record["timings_ms"] = {k: round(v, 1) for k, v in record.get("timings_ms", {}).items()}
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            written += 1
+            summary[record["status"]] = summary.get(record["status"], 0) + 1
+
+            if written % fsync_every == 0:
+                os.fsync(f.fileno())
+                elapsed = time.perf_counter() - start
+                rate = written / elapsed
+                eta = (total - written) / rate if rate > 0 else 0
+                print(f"   {written}/{total} images  {rate:.2f} img/s  ETA {eta / 60:.1f} min  {summary}")
+
+        os.fsync(f.fileno())
+
+
+# ==================================================
+# MAIN
+# ==================================================
+def main():
+    parser = argparse.ArgumentParser(description="Detect, OCR and classify every label photo of an archive")
+    parser.add_argument("--input", help="Directory scanned recursively for images")
+    parser.add_argument("--manifest", help="Text file with one image path per line")
+    parser.add_argument("--out", default="batch_scan.jsonl", help="JSONL output (also the resume state)")
+    parser.add_argument("--model", default=DETECT_MODEL, help="Detect or OBB checkpoint")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--device", default="auto", help="auto, cpu, or a CUDA index")
+    parser.add_argument("--detect-workers", type=int, default=1,
+                        help="Processes holding a model copy (1 per GPU is usually enough)")
+    parser.add_argument("--enhance-workers", type=int, default=CPU_WORKERS)
+    parser.add_argument("--ocr-workers", type=int, default=CPU_WORKERS)
+    parser.add_argument("--ocr-angles", default="0_deg,90_deg,180_deg,270_deg")
+    parser.add_argument("--queue-size", type=int, default=16, help="Bound of each inter-stage queue")
+    parser.add_argument("--save-crops", help="Also write cropped/ and enhanced/ images here")
+    parser.add_argument("--retry-errors", action="store_true", help="Redo images recorded as errors")
+    parser.add_argument("--fsync-every", type=int, default=50)
+    args = parser.parse_args()
+
+    if not args.input and not args.manifest:
+        parser.error("give --input and/or --manifest")
+    if args.imgsz % 32 != 0:
+        parser.error(f"--imgsz must be a multiple of 32 (YOLO stride): {args.imgsz}")
+    if not os.path.exists(args.model):
+        parser.error(f"model not found: {args.model}")
+
+    paths = list_images(args.input, args.manifest)
+    completed = load_completed(args.out, args.retry_errors)
+    pending = [p for p in paths if p not in completed]
+    print(f"📂 {len(paths)} images, {len(paths) - len(pending)} already done, {len(pending)} to scan")
+    if not pending:
+        return
+
+    if args.save_crops:
+        os.makedirs(os.path.join(args.save_crops, "cropped"), exist_ok=True)
+        os.makedirs(os.path.join(args.save_crops, "enhanced"), exist_ok=True)
+
+    # spawn: CUDA cannot be used in forked children
+    ctx = mp.get_context("spawn")
+    detect_q = ctx.Queue(args.queue_size)
+    enhance_q = ctx.Queue(args.queue_size)
+    ocr_q = ctx.Queue(args.queue_size)
+    result_q = ctx.Queue()
+
+    stages = [
+        ("detect", detect_q, [
+            ctx.Process(target=detect_worker, daemon=True,
+                        args=(args.model, args.imgsz, args.device, args.save_crops,
+                              detect_q, enhance_q, result_q))
+            for _ in range(args.detect_workers)
+        ]),
+        ("enhance", enhance_q, [
+            ctx.Process(target=enhance_worker, daemon=True,
+                        args=(args.save_crops, enhance_q, ocr_q, result_q))
+            for _ in range(args.enhance_workers)
+        ]),
+        ("ocr", ocr_q, [
+            ctx.Process(target=ocr_worker, daemon=True,
+                        args=(args.ocr_angles.split(","), ocr_q, result_q))
+            for _ in range(args.ocr_workers)
+        ]),
+    ]
+    for _, _, workers in stages:
+        for worker in workers:
+            worker.start()
+
+    summary = {}
+    writer = threading.Thread(target=write_results,
+                              args=(result_q, args.out, len(pending), args.fsync_every, summary))
+    writer.start()
+
+    start = time.perf_counter()
+    failed = None
+    try:
+        # Blocks whenever the detect stage is behind (bounded queue)
+        for path in pending:
+            put_checked(detect_q, path, stages)
+
+        # Drain stage by stage: a stage is finished once all its workers exited
+        for i, (name, stage_q, workers) in enumerate(stages):
+            for _ in workers:
+                put_checked(stage_q, None, stages[i:])
+            join_checked(workers, stages[i + 1:])
+            for worker in workers:
+                if worker.exitcode != 0:
+                    print(f"⚠️  A {name} worker exited with code {worker.exitcode}; "
+                          f"its in-flight images will be redone on the next run")
+    except StageDied as e:
+        failed = e
+        for _, stage_q, workers in stages:
+            stage_q.cancel_join_thread()
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+    finally:
+        result_q.put(None)
+        writer.join()
+
+    if failed is not None:
+        print(f"\n❌ Aborted: {failed}. {sum(summary.values())} images recorded; "
+              f"the same command resumes after fixing the cause")
+        sys.exit(1)
+
+    elapsed = time.perf_counter() - start
+    print(f"\n✅ {sum(summary.values())} images in {elapsed:.1f}s "
+          f"({sum(summary.values()) / elapsed:.2f} img/s): {summary}")
+    print(f"💾 Results: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
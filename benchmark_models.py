@@ -0,0 +1,226 @@
+"""
+Model zoo benchmark: checkpoints x export formats x input sizes x CPU threads.
+
+For every model (checkpoints found by glob, e.g. the save_period epochN.pt
+files, and already exported .onnx / OpenVINO / TorchScript models) and every
+input size:
+    - accuracy on medicine_dataset val/test with Ultralytics' validator
+      (eval_input_sizes.evaluate_accuracy)
+    - CPU latency through the backend preprocessing path
+      (eval_input_sizes.measure_latency), single image and batched, for each
+      --threads value. Each thread count runs in its own process, pinned to
+      that many cores with torch/OpenMP threads limited, so runtimes that size
+      their pool at load time (ONNX Runtime, OpenVINO) are limited too.
+
+--export converts every .pt to the given formats first (one file per input
+size, reused while newer than the checkpoint). The table is written to CSV;
+rows that no other row beats on both latency and val mAP50-95 (same threads
+and batch) are marked Pareto-optimal, and the fastest model within
+--tolerance of the best val mAP50-95 is suggested for production.
+
+    python benchmark_models.py --sizes 416 640
+    python benchmark_models.py --models "runs/detect/**/weights/*.pt" best.onnx:640 \\
+        --export onnx openvino --threads 1 2 4 --batches 1 4
+"""
+import argparse
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
+
+from eval_input_sizes import (
+    DATA_YAML,
+    evaluate_accuracy,
+    load_model,
+    load_split_images,
+    measure_latency,
+    pareto_front,
+    parse_model_specs,
+    print_table,
+    write_csv,
+)
+from sweep_yolo import limit_resources
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODELS = [os.path.join(ROOT, "runs", "**", "weights", "*.pt")]
+EXPORT_SUFFIX = {"onnx": ".onnx", "openvino": "_openvino_model", "torchscript": ".torchscript"}
+
+
+# ==================================================
+# MODELS
+# ==================================================
+def model_format(path):
+    if path.endswith("_openvino_model") or path.endswith("_openvino_model" + os.sep):
+        return "openvino"
+    return {".pt": "pytorch", ".onnx": "onnx", ".torchscript": "torchscript",
+            ".engine": "tensorrt", ".tflite": "tflite"}.get(os.path.splitext(path)[1].lower(), "other")
+
+
+def expand_models(specs, sizes):
+    """(path, imgsz) pairs: globs expanded, `path:size` pins the size (see parse_model_specs)"""
+    pairs = []
+    for path, imgsz in parse_model_specs(specs, sizes):
+        matches = sorted(glob.glob(path, recursive=True)) if glob.has_magic(path) else [path]
+        if not glob.has_magic(path) and not os.path.exists(path):
+            print(f"⚠️  Model not found, skipped: {path}")
+        pairs.extend((match, imgsz) for match in matches if os.path.exists(match))
+    # drop repeats (same file through two globs), keep order
+    return list(dict.fromkeys(pairs))
+
+
+def export_model(checkpoint, fmt, imgsz):
+    """<stem>_<imgsz><suffix> next to the checkpoint, exported once"""
+    stem = os.path.splitext(checkpoint)[0]
+    target = f"{stem}_{imgsz}{EXPORT_SUFFIX[fmt]}"
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(checkpoint):
+        return target
+    print(f"📤 Exporting {checkpoint} -> {fmt} @ {imgsz}")
+    # dynamic batch for ONNX so batched latency can be measured
+    exported = load_model(checkpoint).export(format=fmt, imgsz=imgsz, dynamic=(fmt == "onnx"))
+    if os.path.exists(target):
+        import shutil
+        shutil.rmtree(target) if os.path.isdir(target) else os.remove(target)
+    os.replace(exported, target)
+    return target
+
+
+# ==================================================
+# LATENCY (one process per thread count)
+# ==================================================
+def init_worker(threads):
+    cores = sorted(os.sched_getaffinity(0))[:threads] if hasattr(os, "sched_getaffinity") else None
+    limit_resources(cores, threads, None)
+    import torch
+    torch.set_num_threads(threads)
+
+
+def time_model(path, imgsz, batches, images_split, data, repeats):
+    """{batch: (mean ms, p95 ms) or None if the model cannot run that batch}"""
+    model = load_model(path)
+    images = load_split_images(data, images_split)
+    timings = {}
+    for batch in batches:
+        try:
+            timings[batch] = measure_latency(model, images, imgsz, "cpu", repeats, batch=batch)
+        except Exception as e:
+            print(f"⚠️  {os.path.basename(path)} @ {imgsz} batch {batch}: {e}")
+            timings[batch] = None
+    return timings
+
+
+def measure_all(models, threads_list, batches, images_split, data, repeats):
+    """{(path, imgsz, threads): timings}; thread counts run one after the other, never concurrently"""
+    results = {}
+    ctx = mp.get_context("spawn")
+    for threads in threads_list:
+        print(f"\n⏱️  Latency with {threads} thread(s)")
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx,
+                                 initializer=init_worker, initargs=(threads,)) as pool:
+            for path, imgsz in models:
+                results[(path, imgsz, threads)] = pool.submit(
+                    time_model, path, imgsz, batches, images_split, data, repeats).result()
+    return results
+
+
+# ==================================================
+# TABLE
+# ==================================================
+def build_rows(models, accuracy, timings, threads_list, batches, splits):
+    rows = []
+    for path, imgsz in models:
+        for threads in threads_list:
+            for batch in batches:
+                timing = timings[(path, imgsz, threads)].get(batch)
+                row = {
+                    "model": os.path.relpath(path, ROOT) if os.path.isabs(path) else path,
+                    "format": model_format(path),
+                    "imgsz": imgsz,
+                }
+                for split in splits:
+                    map50, map5095 = accuracy[(path, imgsz)].get(split, (None, None))
+                    row[f"{split}_mAP50"] = None if map50 is None else round(map50, 4)
+                    row[f"{split}_mAP50-95"] = None if map5095 is None else round(map5095, 4)
+                row.update({
+                    "threads": threads,
+                    "batch": batch,
+                    "latency_ms": None if timing is None else round(timing[0], 2),
+                    "latency_p95_ms": None if timing is None else round(timing[1], 2),
+                    "img_per_s": None if timing is None else round(1000 / timing[0], 1),
+                })
+                rows.append(row)
+    return rows
+
+
+def recommend(rows, gain_key, tolerance):
+    """Fastest single-image row (most threads) within `tolerance` of the best accuracy"""
+    threads = max(r["threads"] for r in rows)
+    candidates = [r for r in rows if r["batch"] == 1 and r["threads"] == threads
+                  and r[gain_key] is not None and r["latency_ms"] is not None]
+    if not candidates:
+        return None
+    best = max(r[gain_key] for r in candidates)
+    return min((r for r in candidates if r[gain_key] >= best - tolerance), key=lambda r: r["latency_ms"])
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare checkpoints / formats / input sizes (accuracy + CPU latency)")
+    parser.add_argument("--models", nargs="+", default=DEFAULT_MODELS,
+                        help="checkpoint[:imgsz], exported models or glob patterns")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[640])
+    parser.add_argument("--export", nargs="*", default=[], choices=sorted(EXPORT_SUFFIX),
+                        help="Also benchmark these exports of every .pt")
+    parser.add_argument("--data", default=DATA_YAML)
+    parser.add_argument("--splits", nargs="+", default=["val", "test"])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="mAP50-95 the suggested model may lose against the best one")
+    parser.add_argument("--csv", default="model_zoo.csv")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    models = expand_models(args.models, args.sizes)
+    for path, imgsz in list(models):
+        if model_format(path) == "pytorch":
+            for fmt in args.export:
+                models.append((export_model(path, fmt, imgsz), imgsz))
+    if not models:
+        print(f"❌ No model found for: {' '.join(args.models)}")
+        sys.exit(1)
+    threads_list = sorted(set(args.threads))
+    print(f"📚 {len(models)} model/size combinations, threads {threads_list}, batches {args.batches}")
+
+    accuracy = {}
+    for path, imgsz in models:
+        model = load_model(path)
+        accuracy[(path, imgsz)] = {split: evaluate_accuracy(model, args.data, split, imgsz, "cpu")
+                                   for split in args.splits}
+        print(f"✅ {path} @ {imgsz}: " + ", ".join(
+            f"{split} mAP50-95={value[1]}" for split, value in accuracy[(path, imgsz)].items()))
+
+    timings = measure_all(models, threads_list, args.batches, args.splits[0], args.data, args.repeats)
+    rows = build_rows(models, accuracy, timings, threads_list, args.batches, args.splits)
+
+    gain_key = f"{args.splits[0]}_mAP50-95"
+    for threads in threads_list:
+        for batch in args.batches:
+            pareto_front([r for r in rows if r["threads"] == threads and r["batch"] == batch
+                          and r["latency_ms"] is not None], "latency_ms", gain_key)
+    for row in rows:
+        row.setdefault("pareto", "")
+
+    print_table(rows)
+    write_csv(rows, args.csv)
+
+    choice = recommend(rows, gain_key, args.tolerance)
+    if choice:
+        print(f"\n👉 Production pick: {choice['model']} ({choice['format']}, imgsz {choice['imgsz']}) — "
+              f"{gain_key} {choice[gain_key]}, {choice['latency_ms']} ms/image with {choice['threads']} threads")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Benchmark: YOLO + find_label_contour() vs. oriented-box (OBB) model.
+
+Both pipelines run exactly as the backend runs them (label_pipeline helpers):
+    contour: letterbox -> detect model -> refine_box_edges_rotated + refine_box_edges
+    obb:     letterbox -> OBB model -> rotated corners from the network
+
+Ground truth is the OBB label set of medicine_dataset_obb/labels/<split>,
+corrected or checked by hand. Labels still exactly as convert_obb_labels.py
+derived them come from find_label_contour() itself, which would score the
+contour pipeline against its own output, so they are refused unless
+--allow-derived-gt is given (and the table then says so). Reported per pipeline:
+    - end-to-end latency (mean / p50 / p95, ms)
+    - detection rate
+    - mean corner error (px and % of the ground-truth diagonal)
+    - mean polygon IoU with the ground truth
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "mobile_app", "medicine_label_backend"))
+
+from convert_obb_labels import is_derived, load_manifest  # noqa: E402
+from label_pipeline import (  # noqa: E402
+    load_model,
+    letterbox_image,
+    best_detection,
+    refine_box_edges,
+    refine_box_edges_rotated,
+)
+
+DETECT_MODEL = os.path.join(ROOT, "runs", "detect", "runs", "detect",
+                            "medicine_label_lowdata2", "weights", "best.pt")
+OBB_MODEL = os.path.join(ROOT, "runs", "obb", "runs", "obb",
+                         "medicine_label_obb", "weights", "best.pt")
+CONF_THRESHOLD = 0.15
+IOU_THRESHOLD = 0.45
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+# ==================================================
+# PIPELINES
+# ==================================================
+def run_contour_pipeline(model, img, imgsz, device):
+    img_letterboxed, scale, padding = letterbox_image(img, target_size=imgsz)
+    results = model(img_letterboxed, conf=CONF_THRESHOLD, iou=IOU_THRESHOLD,
+                    device=device, verbose=False, imgsz=imgsz)[0]
+    detection = best_detection(results, scale, padding, img.shape)
+    if detection is None:
+        return None
+
+    rotated_box = refine_box_edges_rotated(img, detection["yolo_box"])
+    # The server also computes the axis-aligned crop box (second contour pass)
+    rx1, ry1, rx2, ry2 = refine_box_edges(img, detection["yolo_box"])
+
+    if rotated_box is None:
+        rotated_box = [[rx1, ry1], [rx2, ry1], [rx2, ry2], [rx1, ry2]]
+    return np.array(rotated_box, dtype=np.float32)
+
+
+def run_obb_pipeline(model, img, imgsz, device):
+    img_letterboxed, scale, padding = letterbox_image(img, target_size=imgsz)
+    results = model(img_letterboxed, conf=CONF_THRESHOLD, iou=IOU_THRESHOLD,
+                    device=device, verbose=False, imgsz=imgsz)[0]
+    detection = best_detection(results, scale, padding, img.shape)
+    if detection is None or detection["obb_points"] is None:
+        return None
+    return np.array(detection["obb_points"], dtype=np.float32)
+
+
+# ==================================================
+# ACCURACY METRICS
+# ==================================================
+def corner_error(pred, gt):
+    """Mean corner distance, minimized over corner ordering (start + direction)"""
+    best = float("inf")
+    for candidate in (pred, pred[::-1]):
+        for shift in range(4):
+            rolled = np.roll(candidate, shift, axis=0)
+            best = min(best, float(np.linalg.norm(rolled - gt, axis=1).mean()))
+    return best
+
+
+def polygon_iou(pred, gt):
+    pred_hull = cv2.convexHull(pred.astype(np.float32))
+    gt_hull = cv2.convexHull(gt.astype(np.float32))
+    inter, _ = cv2.intersectConvexConvex(pred_hull, gt_hull)
+    union = cv2.contourArea(pred_hull) + cv2.contourArea(gt_hull) - inter
+    return float(inter / union) if union > 0 else 0.0
+
+
+def load_ground_truth(label_path, w, h):
+    """First OBB row of a label file, in pixel coordinates"""
+    with open(label_path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 9:
+                pts = np.array(list(map(float, parts[1:])), dtype=np.float32).reshape(4, 2)
+                return pts * np.array([w, h], dtype=np.float32)
+    return None
+
+
+# ==================================================
+# BENCHMARK
+# ==================================================
+def benchmark(name, fn, model, samples, imgsz, device, repeats, warmup, derived_gt):
+    # Warm up (first calls include lazy init / graph setup)
+    for img, _ in samples[:warmup]:
+        fn(model, img, imgsz, device)
+
+    latencies, errors, rel_errors, ious = [], [], [], []
+    detected = 0
+
+    for img, gt in samples:
+        pred = None
+        for _ in range(repeats):
+            start = time.perf_counter()
+            pred = fn(model, img, imgsz, device)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        if pred is None:
+            continue
+
+        detected += 1
+        err = corner_error(pred, gt)
+        diag = float(np.linalg.norm(gt.max(axis=0) - gt.min(axis=0)))
+        errors.append(err)
+        rel_errors.append(100 * err / diag if diag > 0 else 0.0)
+        ious.append(polygon_iou(pred, gt))
+
+    lat = np.array(latencies)
+    return {
+        "pipeline": name,
+        "images": len(samples),
+        "detected": detected,
+        "latency_mean_ms": round(float(lat.mean()), 2),
+        "latency_p50_ms": round(float(np.percentile(lat, 50)), 2),
+        "latency_p95_ms": round(float(np.percentile(lat, 95)), 2),
+        "corner_err_px": round(float(np.mean(errors)), 2) if errors else None,
+        "corner_err_pct_diag": round(float(np.mean(rel_errors)), 2) if rel_errors else None,
+        "mean_iou": round(float(np.mean(ious)), 4) if ious else None,
+        "gt_contour_derived": derived_gt,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare contour vs OBB label localization")
+    parser.add_argument("--dataset", default=os.path.join(ROOT, "medicine_dataset_obb"))
+    parser.add_argument("--split", default="val")
+    parser.add_argument("--detect-model", default=DETECT_MODEL)
+    parser.add_argument("--obb-model", default=OBB_MODEL)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--allow-derived-gt", action="store_true",
+                        help="Accept labels still as convert_obb_labels.py derived them (biased to yolo+contour)")
+    parser.add_argument("--csv", help="Optional CSV output path")
+    args = parser.parse_args()
+
+    images_dir = os.path.join(args.dataset, "images", args.split)
+    labels_dir = os.path.join(args.dataset, "labels", args.split)
+
+    manifest = load_manifest(args.dataset)
+    samples = []
+    derived_gt = 0
+    for filename in sorted(os.listdir(images_dir)):
+        if not filename.lower().endswith(IMAGE_EXTS):
+            continue
+        label_path = os.path.join(labels_dir, os.path.splitext(filename)[0] + ".txt")
+        if not os.path.exists(label_path):
+            continue
+        img = cv2.imread(os.path.join(images_dir, filename))
+        if img is None:
+            continue
+        gt = load_ground_truth(label_path, img.shape[1], img.shape[0])
+        if gt is not None:
+            samples.append((img, gt))
+            derived_gt += is_derived(args.dataset, manifest, label_path)
+
+    if not samples:
+        print(f"❌ No labelled images in {images_dir} (run convert_obb_labels.py first)")
+        sys.exit(1)
+
+    if derived_gt and not args.allow_derived_gt:
+        print(f"❌ {derived_gt}/{len(samples)} ground-truth files in {labels_dir} are contour-derived "
+              f"(unchanged convert_obb_labels.py output): the yolo+contour pipeline would be scored "
+              f"against itself.")
+        print("👉 Correct them by hand, or after checking: python convert_obb_labels.py --mark-reviewed "
+              f"{args.split} (--allow-derived-gt to run anyway)")
+        sys.exit(1)
+
+    print(f"📊 {len(samples)} labelled images from {args.split}, imgsz={args.imgsz}, device={args.device}")
+
+    rows = [
+        benchmark("yolo+contour", run_contour_pipeline, load_model(args.detect_model),
+                  samples, args.imgsz, args.device, args.repeats, args.warmup, derived_gt),
+        benchmark("obb", run_obb_pipeline, load_model(args.obb_model),
+                  samples, args.imgsz, args.device, args.repeats, args.warmup, derived_gt),
+    ]
+
+    header = list(rows[0].keys())
+    print("\n| " + " | ".join(header) + " |")
+    print("|" + "---|" * len(header))
+    for row in rows:
+        print("| " + " | ".join(str(row[k]) for k in header) + " |")
+
+    if derived_gt:
+        print(f"\n⚠️  {derived_gt}/{len(samples)} ground-truth labels are contour-derived: corner error and "
+              f"IoU are biased toward yolo+contour (and the OBB model was trained to imitate them)")
+
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=header)
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"\n💾 Saved: {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
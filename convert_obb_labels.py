@@ -0,0 +1,251 @@
+"""
+Derive oriented (OBB) annotations from the axis-aligned YOLO labels.
+
+For every labelled image in medicine_dataset, the axis-aligned box is refined
+with the same edge geometry the backend uses (find_label_contour + minAreaRect)
+and written in the Ultralytics OBB format:
+
+    class x1 y1 x2 y2 x3 y3 x4 y4   (normalized corners)
+
+The output is a sibling dataset (medicine_dataset_obb) with its own data.yaml,
+ready for `python train_yolo.py --task obb`. Existing OBB label files are kept
+unless --overwrite is given, so hand-corrected annotations survive re-runs.
+
+Derived labels are the contour pipeline's own output, so they cannot serve as
+ground truth for benchmark_obb.py. Every generated file is recorded with its
+hash in <dst>/derived_labels.json; a file edited by hand no longer matches and
+counts as independent. After checking a split and finding it correct as is:
+
+    python convert_obb_labels.py --mark-reviewed val test
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "mobile_app", "medicine_label_backend"))
+
+from label_pipeline import find_label_contour  # noqa: E402
+
+SPLITS = ["train", "val", "test"]
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+DERIVED_MANIFEST = "derived_labels.json"
+
+
+# ==================================================
+# DERIVED LABEL MANIFEST
+# ==================================================
+def file_sha1(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def load_manifest(dst_root):
+    """{"labels/<split>/<stem>.txt": sha1 of the generated content}"""
+    try:
+        with open(os.path.join(dst_root, DERIVED_MANIFEST), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(dst_root, manifest):
+    with open(os.path.join(dst_root, DERIVED_MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def is_derived(dst_root, manifest, label_path):
+    """True if label_path is still exactly what this script generated"""
+    key = os.path.relpath(label_path, dst_root).replace(os.sep, "/")
+    return key in manifest and os.path.exists(label_path) and file_sha1(label_path) == manifest[key]
+
+
+def read_yolo_labels(label_path):
+    """Read `class cx cy w h` rows (normalized)"""
+    rows = []
+    with open(label_path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) != 5:
+                continue
+            rows.append((int(parts[0]), *map(float, parts[1:])))
+    return rows
+
+
+def axis_aligned_corners(box):
+    x1, y1, x2, y2 = box
+    return np.array([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], dtype=np.float32)
+
+
+def derive_oriented_box(img, box):
+    """
+    Rotated rectangle for one axis-aligned box.
+
+    Returns (corners, refined) where refined is False when the edge geometry
+    failed or disagreed too much with the annotation (axis-aligned fallback).
+    """
+    contour = find_label_contour(img, box)
+    if contour is None:
+        return axis_aligned_corners(box), False
+
+    rect = cv2.minAreaRect(contour)
+    corners = cv2.boxPoints(rect)
+
+    # Same sanity window as refine_box_edges(): reject implausible fits
+    box_area = (box[2] - box[0]) * (box[3] - box[1])
+    rect_area = rect[1][0] * rect[1][1]
+    cx, cy = rect[0]
+    inside = box[0] <= cx <= box[2] and box[1] <= cy <= box[3]
+
+    if not inside or rect_area < box_area * 0.15 or rect_area > box_area * 1.8:
+        return axis_aligned_corners(box), False
+
+    return corners, True
+
+
+def convert_split(src_root, dst_root, split, overwrite, copy_images, manifest):
+    src_images = os.path.join(src_root, "images", split)
+    src_labels = os.path.join(src_root, "labels", split)
+    dst_images = os.path.join(dst_root, "images", split)
+    dst_labels = os.path.join(dst_root, "labels", split)
+
+    if not os.path.isdir(src_images):
+        return None
+
+    os.makedirs(dst_images, exist_ok=True)
+    os.makedirs(dst_labels, exist_ok=True)
+
+    stats = {"images": 0, "boxes": 0, "refined": 0, "fallback": 0, "kept": 0}
+
+    for filename in sorted(os.listdir(src_images)):
+        if not filename.lower().endswith(IMAGE_EXTS):
+            continue
+
+        stem = os.path.splitext(filename)[0]
+        src_img_path = os.path.join(src_images, filename)
+        dst_img_path = os.path.join(dst_images, filename)
+
+        # Mirror the image (symlink when possible, copy otherwise)
+        if not os.path.exists(dst_img_path):
+            if copy_images:
+                shutil.copy2(src_img_path, dst_img_path)
+            else:
+                try:
+                    os.symlink(os.path.abspath(src_img_path), dst_img_path)
+                except OSError:
+                    shutil.copy2(src_img_path, dst_img_path)
+
+        stats["images"] += 1
+
+        src_label_path = os.path.join(src_labels, stem + ".txt")
+        dst_label_path = os.path.join(dst_labels, stem + ".txt")
+
+        if not os.path.exists(src_label_path):
+            continue  # background image, no label on either side
+
+        if os.path.exists(dst_label_path) and not overwrite:
+            stats["kept"] += 1
+            continue
+
+        img = cv2.imread(src_img_path)
+        if img is None:
+            print(f"⚠️  Failed to read {src_img_path}, skipped")
+            continue
+
+        h, w = img.shape[:2]
+        lines = []
+
+        for cls, cx, cy, bw, bh in read_yolo_labels(src_label_path):
+            box = (
+                int(max(0, (cx - bw / 2) * w)),
+                int(max(0, (cy - bh / 2) * h)),
+                int(min(w, (cx + bw / 2) * w)),
+                int(min(h, (cy + bh / 2) * h))
+            )
+
+            corners, refined = derive_oriented_box(img, box)
+            stats["boxes"] += 1
+            stats["refined" if refined else "fallback"] += 1
+
+            norm = corners / np.array([w, h], dtype=np.float32)
+            norm = np.clip(norm, 0.0, 1.0)
+            coords = " ".join(f"{v:.6f}" for v in norm.flatten())
+            lines.append(f"{cls} {coords}")
+
+        with open(dst_label_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        manifest[f"labels/{split}/{stem}.txt"] = file_sha1(dst_label_path)
+
+    return stats
+
+
+def write_data_yaml(src_root, dst_root, splits):
+    names = '["label"]'
+    src_yaml = os.path.join(src_root, "data.yaml")
+    if os.path.exists(src_yaml):
+        with open(src_yaml, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("names:"):
+                    names = line.split(":", 1)[1].strip()
+
+    lines = [f"path: {os.path.abspath(dst_root).replace(os.sep, '/')}", ""]
+    for split in splits:
+        lines.append(f"{split}: images/{split}")
+    lines += ["", "nc: 1", f"names: {names}", ""]
+
+    with open(os.path.join(dst_root, "data.yaml"), "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert axis-aligned labels to OBB labels")
+    parser.add_argument("--src", default=os.path.join(ROOT, "medicine_dataset"),
+                        help="Source YOLO dataset root")
+    parser.add_argument("--dst", default=os.path.join(ROOT, "medicine_dataset_obb"),
+                        help="Output OBB dataset root")
+    parser.add_argument("--overwrite", action="store_true",
+                        help="Regenerate label files that already exist in --dst")
+    parser.add_argument("--copy-images", action="store_true",
+                        help="Copy images instead of symlinking them")
+    parser.add_argument("--mark-reviewed", nargs="+", choices=SPLITS, metavar="SPLIT",
+                        help="Only record that these splits were checked by hand (no conversion)")
+    args = parser.parse_args()
+
+    manifest = load_manifest(args.dst)
+    if args.mark_reviewed:
+        prefixes = tuple(f"labels/{split}/" for split in args.mark_reviewed)
+        reviewed = [key for key in manifest if key.startswith(prefixes)]
+        for key in reviewed:
+            del manifest[key]
+        save_manifest(args.dst, manifest)
+        print(f"✅ {len(reviewed)} label files marked as reviewed ({', '.join(args.mark_reviewed)})")
+        return
+
+    converted = []
+    for split in SPLITS:
+        stats = convert_split(args.src, args.dst, split, args.overwrite, args.copy_images, manifest)
+        if stats is None:
+            continue
+        converted.append(split)
+        print(f"✅ {split}: {stats['images']} images, {stats['boxes']} boxes "
+              f"({stats['refined']} refined, {stats['fallback']} axis-aligned fallback, "
+              f"{stats['kept']} label files kept)")
+
+    if not converted:
+        print(f"❌ No images/<split> folders found under {args.src}")
+        sys.exit(1)
+
+    write_data_yaml(args.src, args.dst, converted)
+    save_manifest(args.dst, manifest)
+    print(f"📦 OBB dataset written to: {args.dst}")
+    print("👉 Correct val/test by hand (or --mark-reviewed them) before benchmark_obb.py uses them as ground truth")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+Perceptual-hash index of the dataset images: exact / near duplicates and
+train-val-test leakage.
+
+Every image under the scanned folders (default: the data.yaml splits and
+assets/) gets a content hash (exact copies) and a 64-bit DCT perceptual hash
+(re-encoded, resized or slightly re-exposed copies). Hashes are stored in a
+SQLite index keyed by path, size and mtime, so later runs only hash new or
+changed files. Hashing runs on a thread pool: JPEG decoding releases the GIL
+and images are decoded at 1/4 scale, which is plenty for a 32x32 DCT.
+
+Near duplicates are found with multi-index hashing: the 64 bits are split
+into threshold + 1 bands, two hashes within the Hamming threshold share at
+least one band exactly, so only bucket-mates are compared.
+
+    python dataset_index.py update
+    python dataset_index.py report --threshold 6 --csv duplicates.csv
+    python dataset_index.py dedup --out medicine_dataset_dedup
+
+`dedup` writes train/val/test image lists and a data.yaml that keep one image
+per cluster. A cluster spanning several splits is kept in the evaluation
+split (test, then val) and removed from train, so validation stays unseen.
+"""
+import argparse
+import csv
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from dataset_pack import DATA_YAML, list_images, split_dir
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+INDEX_PATH = os.path.join(ROOT, "medicine_dataset", "image_index.sqlite")
+SPLITS = ["train", "val", "test"]
+# kept first when a duplicate cluster spans several splits
+SPLIT_PRIORITY = {"test": 0, "val": 1, "train": 2}
+
+
+# ==================================================
+# HASHING
+# ==================================================
+def phash(gray):
+    """64-bit DCT perceptual hash of a grayscale image"""
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    # median without the DC term, which only carries the mean brightness
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def hash_file(path):
+    """(sha1 of the bytes, perceptual hash), None if the image cannot be decoded"""
+    with open(path, "rb") as f:
+        data = f.read()
+    gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if gray is None:
+        return None
+    return hashlib.sha1(data).hexdigest(), phash(gray)
+
+
+def popcount(x):
+    """Bits set in each uint64 of x"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x)
+    return np.unpackbits(x.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+# ==================================================
+# INDEX
+# ==================================================
+class ImageIndex:
+    """SQLite table of image hashes, updated incrementally"""
+
+    def __init__(self, path=INDEX_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS images ("
+            " path TEXT PRIMARY KEY, root TEXT NOT NULL, split TEXT NOT NULL,"
+            " size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+            " sha1 TEXT NOT NULL, phash TEXT NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS images_sha1 ON images (sha1)")
+        self.db.commit()
+
+    def update(self, sources, workers=None):
+        """
+        Hash new or changed images of `sources` [(root, split, [paths])],
+        drop rows of files that disappeared from those roots.
+        Returns {'hashed', 'unchanged', 'removed', 'unreadable'}.
+        """
+        known = {row[0]: (row[1], row[2]) for row in self.db.execute("SELECT path, size, mtime_ns FROM images")}
+        todo, seen = [], set()
+        stats = {"hashed": 0, "unchanged": 0, "removed": 0, "unreadable": 0}
+
+        for root, split, paths in sources:
+            for path in paths:
+                key = stored_path(path)
+                seen.add(key)
+                st = os.stat(path)
+                if known.get(key) == (st.st_size, st.st_mtime_ns):
+                    stats["unchanged"] += 1
+                else:
+                    todo.append((path, key, root, split, st.st_size, st.st_mtime_ns))
+
+        with ThreadPoolExecutor(max_workers=workers or min(16, (os.cpu_count() or 1) * 2)) as pool:
+            hashes = pool.map(lambda item: hash_file(item[0]), todo)
+            rows = []
+            for (path, key, root, split, size, mtime_ns), result in zip(todo, hashes):
+                if result is None:
+                    print(f"⚠️  Unreadable image skipped: {path}")
+                    stats["unreadable"] += 1
+                    continue
+                sha1, ph = result
+                rows.append((key, root, split, size, mtime_ns, sha1, f"{ph:016x}"))
+        self.db.executemany("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        stats["hashed"] = len(rows)
+
+        roots = {root for root, _, _ in sources}
+        gone = [(p,) for p, root in self.db.execute("SELECT path, root FROM images")
+                if p not in seen and root in roots]
+        self.db.executemany("DELETE FROM images WHERE path = ?", gone)
+        stats["removed"] = len(gone)
+        self.db.commit()
+        return stats
+
+    def rows(self):
+        """[{path, root, split, sha1, phash(int)}] sorted by path"""
+        cursor = self.db.execute("SELECT path, root, split, sha1, phash FROM images ORDER BY path")
+        return [{"path": p, "root": r, "split": s, "sha1": h, "phash": int(ph, 16)}
+                for p, r, s, h, ph in cursor]
+
+    def close(self):
+        self.db.close()
+
+
+def stored_path(path):
+    """Path relative to the repo when inside it (portable between machines), else absolute"""
+    path = os.path.abspath(path)
+    try:
+        relative = os.path.relpath(path, ROOT)
+    except ValueError:
+        return path.replace(os.sep, "/")
+    return path.replace(os.sep, "/") if relative.startswith("..") else relative.replace(os.sep, "/")
+
+
+def absolute_path(stored):
+    return stored if os.path.isabs(stored) else os.path.join(ROOT, stored)
+
+
+def default_sources(data_yaml, extra_dirs):
+    """Dataset splits of data.yaml, then extra folders (split = folder name)"""
+    sources = []
+    for split in SPLITS:
+        folder = split_dir(data_yaml, split)
+        if os.path.isdir(folder):
+            sources.append(("dataset", split, list_images(folder)))
+    for folder in extra_dirs:
+        if os.path.isdir(folder):
+            name = os.path.basename(os.path.normpath(folder))
+            sources.append((name, name, list_images(folder)))
+    return sources
+
+
+# ==================================================
+# CLUSTERS
+# ==================================================
+def find_clusters(rows, threshold):
+    """
+    Groups of duplicate images (size >= 2): same bytes, or perceptual hashes
+    within `threshold` bits. Returns [(kind, [row indices])], kind = exact / near.
+    """
+    parent = list(range(len(rows)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+
+    by_sha = {}
+    for i, row in enumerate(rows):
+        if row["sha1"] in by_sha:
+            union(by_sha[row["sha1"]], i)
+        else:
+            by_sha[row["sha1"]] = i
+
+    if threshold > 0 and len(rows) > 1:
+        hashes = np.array([row["phash"] for row in rows], dtype=np.uint64)
+        # threshold + 1 bands: within `threshold` bits => at least one identical band
+        bands = threshold + 1
+        edges = np.linspace(0, 64, bands + 1).astype(int)
+        for lo, hi in zip(edges[:-1], edges[1:]):
+            keys = (hashes >> np.uint64(lo)) & np.uint64((1 << (hi - lo)) - 1)
+            order = np.argsort(keys, kind="stable")
+            sorted_keys = keys[order]
+            starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+            ends = np.r_[starts[1:], len(order)]
+            for start, end in zip(starts, ends):
+                if end - start < 2:
+                    continue
+                members = order[start:end]
+                for k, i in enumerate(members[:-1]):
+                    others = members[k + 1:]
+                    close = others[popcount(hashes[others] ^ hashes[i]) <= threshold]
+                    for j in close:
+                        union(int(i), int(j))
+
+    groups = {}
+    for i in range(len(rows)):
+        groups.setdefault(find(i), []).append(i)
+    clusters = []
+    for members in groups.values():
+        if len(members) > 1:
+            kind = "exact" if len({rows[i]["sha1"] for i in members}) == 1 else "near"
+            clusters.append((kind, members))
+    return clusters
+
+
+def report(rows, clusters, csv_path=None):
+    leaks = 0
+    print(f"\n🔎 {len(rows)} images, {len(clusters)} duplicate clusters")
+    for n, (kind, members) in enumerate(clusters, 1):
+        splits = sorted({rows[i]["split"] for i in members})
+        dataset_splits = {rows[i]["split"] for i in members if rows[i]["root"] == "dataset"}
+        leak = len(dataset_splits) > 1
+        leaks += leak
+        flag = "  ⚠️ LEAK " + "/".join(sorted(dataset_splits)) if leak else ""
+        print(f"\n#{n} {kind} ({len(members)} images, {', '.join(splits)}){flag}")
+        for i in members:
+            print(f"   [{rows[i]['split']}] {rows[i]['path']}")
+
+    exact = sum(1 for kind, _ in clusters if kind == "exact")
+    redundant = sum(len(members) - 1 for _, members in clusters)
+    print(f"\n📊 exact clusters: {exact}, near clusters: {len(clusters) - exact}, "
+          f"redundant images: {redundant}, clusters leaking across dataset splits: {leaks}")
+
+    if csv_path:
+        with open(csv_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["cluster", "kind", "split", "path", "sha1", "phash"])
+            for n, (kind, members) in enumerate(clusters, 1):
+                for i in members:
+                    writer.writerow([n, kind, rows[i]["split"], rows[i]["path"], rows[i]["sha1"], f"{rows[i]['phash']:016x}"])
+        print(f"💾 Saved: {csv_path}")
+
+
+def write_dedup_dataset(rows, clusters, data_yaml, out_dir):
+    """train/val/test lists with one image per cluster + data.yaml pointing at them"""
+    import yaml
+
+    dropped = set()
+    for _, members in clusters:
+        in_dataset = [i for i in members if rows[i]["root"] == "dataset"]
+        if len(in_dataset) < 2:
+            continue
+        keep = min(in_dataset, key=lambda i: (SPLIT_PRIORITY.get(rows[i]["split"], 3), rows[i]["path"]))
+        dropped.update(i for i in in_dataset if i != keep)
+
+    os.makedirs(out_dir, exist_ok=True)
+    counts = {}
+    for split in SPLITS:
+        kept = [absolute_path(rows[i]["path"]) for i in range(len(rows))
+                if rows[i]["root"] == "dataset" and rows[i]["split"] == split and i not in dropped]
+        counts[split] = kept
+        with open(os.path.join(out_dir, f"{split}.txt"), "w", encoding="utf-8") as f:
+            f.write("".join(path.replace(os.sep, "/") + "\n" for path in kept))
+
+    with open(data_yaml, "r", encoding="utf-8") as f:
+        source = yaml.safe_load(f)
+    dedup_yaml = os.path.join(out_dir, "data.yaml")
+    with open(dedup_yaml, "w", encoding="utf-8") as f:
+        # labels are found from the image paths (images/ -> labels/), nothing to copy
+        f.write(f"path: {os.path.abspath(out_dir).replace(os.sep, '/')}\n\n")
+        for split in SPLITS:
+            f.write(f"{split}: {split}.txt\n")
+        f.write(f"\nnc: {source['nc']}\nnames: {list(source['names'])}\n".replace("'", '"'))
+
+    print(f"\n✅ Deduplicated dataset: " + ", ".join(f"{s} {len(p)}" for s, p in counts.items())
+          + f" ({len(dropped)} dropped) -> {dedup_yaml}")
+    return dedup_yaml
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Perceptual-hash index and deduplication of the dataset")
+    parser.add_argument("command", choices=["update", "report", "dedup"])
+    parser.add_argument("--data", default=DATA_YAML)
+    parser.add_argument("--extra", nargs="*", default=[os.path.join(ROOT, "assets")],
+                        help="Other image folders to index (default: assets/)")
+    parser.add_argument("--index", default=INDEX_PATH)
+    parser.add_argument("--workers", type=int, help="Hashing threads")
+    parser.add_argument("--threshold", type=int, default=6,
+                        help="Max differing pHash bits for a near duplicate (0 = exact only)")
+    parser.add_argument("--csv", help="report: also write the clusters to this CSV")
+    parser.add_argument("--out", default=os.path.join(ROOT, "medicine_dataset_dedup"),
+                        help="dedup: output folder for the image lists and data.yaml")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not 0 <= args.threshold < 64:
+        print("❌ --threshold must be in [0, 63]")
+        sys.exit(1)
+
+    index = ImageIndex(args.index)
+    start = time.perf_counter()
+    stats = index.update(default_sources(args.data, args.extra), args.workers)
+    print(f"🗂️  Index {args.index}: {stats['hashed']} hashed, {stats['unchanged']} unchanged, "
+          f"{stats['removed']} removed ({time.perf_counter() - start:.2f}s)")
+
+    if args.command != "update":
+        rows = index.rows()
+        clusters = find_clusters(rows, args.threshold)
+        if args.command == "report":
+            report(rows, clusters, args.csv)
+        else:
+            write_dedup_dataset(rows, clusters, args.data, args.out)
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
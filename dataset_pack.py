@@ -0,0 +1,291 @@
+"""
+Pack a dataset split into one memory-mapped uint8 file for training.
+
+With cache=False, Ultralytics decodes and resizes every JPEG again at every
+epoch. The packer does that work once:
+
+    medicine_dataset/packed/train_640/
+        images.u8    every image resized exactly like Ultralytics' load_image
+                     (long side = imgsz, INTER_LINEAR), BGR, stored back to back
+        index.json   per image: path, size/mtime of image and label file,
+                     original and resized shape, byte offset, label rows
+
+The training loader (train_yolo.py --pack) maps images.u8 read-only: reading
+an image is a memcpy from the page cache, shared by every dataloader worker
+process. A pack whose images or labels changed on disk is detected and
+ignored (rebuild it with --force).
+
+    python dataset_pack.py build --imgsz 640
+    python dataset_pack.py bench --imgsz 640 --epochs 5
+
+`bench` only times image loading (imread + resize vs reading the pack), so
+its speedup is an upper bound on what --pack saves per epoch, not an epoch
+time: augmentation, forward/backward and validation are unchanged. The only
+number measured so far is that loading bound (medicine_dataset train, 14
+images, imgsz 640: 0.217 s vs 0.001 s per epoch); real epoch times come from
+the per-epoch times train_yolo.py prints, with and without --pack.
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DATA_YAML = os.path.join(ROOT, "medicine_dataset", "data.yaml")
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+PACK_VERSION = 1
+
+
+# ==================================================
+# PATHS
+# ==================================================
+def split_dir(data_yaml, split):
+    """Image folder of a split; falls back to the data.yaml folder when `path` is not on this machine"""
+    import yaml
+
+    with open(data_yaml, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+    dataset_root = data.get("path") or ""
+    if not os.path.isdir(dataset_root):
+        dataset_root = os.path.dirname(os.path.abspath(data_yaml))
+    return os.path.join(dataset_root, data.get(split) or os.path.join("images", split))
+
+
+def default_pack_dir(data_yaml, split, imgsz):
+    return os.path.join(os.path.dirname(os.path.abspath(data_yaml)), "packed", f"{split}_{imgsz}")
+
+
+def list_images(images_dir):
+    """Image files under images_dir, recursively and sorted (same set as Ultralytics)"""
+    files = glob.glob(os.path.join(images_dir, "**", "*.*"), recursive=True)
+    return sorted(os.path.abspath(f) for f in files if f.lower().endswith(IMAGE_EXTS))
+
+
+def label_path(image_path):
+    """Ultralytics convention: .../images/... -> .../labels/....txt"""
+    sa, sb = f"{os.sep}images{os.sep}", f"{os.sep}labels{os.sep}"
+    return sb.join(image_path.rsplit(sa, 1)).rsplit(".", 1)[0] + ".txt"
+
+
+def file_key(path):
+    """(size, mtime_ns) used to detect a changed file, None if missing"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def read_label_rows(path):
+    """Label rows as float lists (class + box or polygon), empty if no label file"""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [[float(v) for v in line.split()] for line in f if line.strip()]
+
+
+def resize_like_ultralytics(img, imgsz):
+    """Long side to imgsz, aspect kept (BaseDataset.load_image with rect_mode=True)"""
+    h0, w0 = img.shape[:2]
+    r = imgsz / max(h0, w0)
+    if r != 1:
+        w, h = (min(math.ceil(w0 * r), imgsz), min(math.ceil(h0 * r), imgsz))
+        img = cv2.resize(img, (w, h), interpolation=cv2.INTER_LINEAR)
+    return img
+
+
+# ==================================================
+# BUILD
+# ==================================================
+def build_pack(data_yaml, split="train", imgsz=640, pack_dir=None, force=False):
+    """
+    Decode + resize every image of the split once into pack_dir.
+    Returns the pack directory (reused as is when it is still up to date).
+    """
+    pack_dir = pack_dir or default_pack_dir(data_yaml, split, imgsz)
+    images = list_images(split_dir(data_yaml, split))
+    if not images:
+        raise FileNotFoundError(f"No images in {split_dir(data_yaml, split)}")
+
+    if not force:
+        try:
+            pack = PackedImages(pack_dir)
+            if pack.imgsz == imgsz and pack.is_current(images):
+                print(f"✅ Pack up to date: {pack_dir} ({len(pack)} images)")
+                return pack_dir
+        except (OSError, ValueError, KeyError):
+            pass
+
+    os.makedirs(pack_dir, exist_ok=True)
+    index_file = os.path.join(pack_dir, "index.json")
+    if os.path.exists(index_file):
+        os.remove(index_file)
+    data_tmp = os.path.join(pack_dir, "images.u8.tmp")
+    index_tmp = os.path.join(pack_dir, "index.json.tmp")
+
+    entries = []
+    offset = 0
+    start = time.perf_counter()
+    with open(data_tmp, "wb") as f:
+        for path in images:
+            img = cv2.imread(path)
+            if img is None:
+                print(f"⚠️  Unreadable image skipped: {path}")
+                continue
+            h0, w0 = img.shape[:2]
+            img = np.ascontiguousarray(resize_like_ultralytics(img, imgsz))
+            f.write(img.tobytes())
+            lbl = label_path(path)
+            entries.append({
+                "image": path,
+                "image_key": file_key(path),
+                "label_key": file_key(lbl),
+                "hw0": [h0, w0],
+                "hw": list(img.shape[:2]),
+                "offset": offset,
+                "labels": read_label_rows(lbl),
+            })
+            offset += img.nbytes
+
+    with open(index_tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": PACK_VERSION, "imgsz": imgsz, "split": split,
+                   "nbytes": offset, "images": entries}, f)
+
+    # index.json last: a pack without it is incomplete and never used
+    os.replace(data_tmp, os.path.join(pack_dir, "images.u8"))
+    os.replace(index_tmp, index_file)
+
+    print(f"📦 Packed {len(entries)} images ({offset / 1e6:.1f} MB) in "
+          f"{time.perf_counter() - start:.1f}s -> {pack_dir}")
+    return pack_dir
+
+
+# ==================================================
+# READ
+# ==================================================
+class PackedImages:
+    """
+    Read side of a pack. The memory map is opened lazily in each process and
+    never pickled, so the object can be handed to dataloader workers (spawn
+    on Windows) without copying the images.
+    """
+
+    def __init__(self, pack_dir):
+        self.pack_dir = pack_dir
+        with open(os.path.join(pack_dir, "index.json"), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") != PACK_VERSION:
+            raise ValueError(f"Unsupported pack version in {pack_dir}")
+        self.imgsz = index["imgsz"]
+        self.entries = index["images"]
+        self.slots = {os.path.normcase(e["image"]): i for i, e in enumerate(self.entries)}
+        self._data = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_data"] = None
+        return state
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = np.memmap(os.path.join(self.pack_dir, "images.u8"), dtype=np.uint8, mode="r")
+        return self._data
+
+    def slot(self, image_path):
+        """Index of an image in the pack, None if it was not packed"""
+        return self.slots.get(os.path.normcase(os.path.abspath(image_path)))
+
+    def is_current(self, image_paths):
+        """True if the pack holds exactly these images, unchanged since packing (labels included)"""
+        if len(image_paths) != len(self.entries):
+            return False
+        for path in image_paths:
+            i = self.slot(path)
+            if i is None:
+                return False
+            entry = self.entries[i]
+            if file_key(path) != entry["image_key"] or file_key(label_path(path)) != entry["label_key"]:
+                return False
+        return True
+
+    def image(self, i):
+        """Resized BGR image i, as a writable copy (augmentations modify images in place)"""
+        entry = self.entries[i]
+        h, w = entry["hw"]
+        start = entry["offset"]
+        return np.array(self.data[start:start + h * w * 3]).reshape(h, w, 3)
+
+    def labels(self, i):
+        """Label rows of image i as a float32 array (n, 5) or (n, 1 + 2k)"""
+        rows = self.entries[i]["labels"]
+        return np.array(rows, dtype=np.float32) if rows else np.zeros((0, 5), dtype=np.float32)
+
+
+# ==================================================
+# BENCHMARK
+# ==================================================
+def bench(data_yaml, split, imgsz, epochs, pack_dir=None):
+    """Image loading time per epoch: decode + resize every epoch vs reading the pack"""
+    pack_dir = build_pack(data_yaml, split, imgsz, pack_dir)
+    images = list_images(split_dir(data_yaml, split))
+    pack = PackedImages(pack_dir)
+    slots = [pack.slot(path) for path in images]
+
+    def decode_epoch():
+        for path in images:
+            resize_like_ultralytics(cv2.imread(path), imgsz)
+
+    def pack_epoch():
+        for i in slots:
+            pack.image(i)
+
+    print(f"\n{'loader':<22}{'s/epoch':>10}{'img/s':>10}")
+    results = {}
+    for name, epoch in (("decode (cache=False)", decode_epoch), ("packed memmap", pack_epoch)):
+        times = []
+        for _ in range(epochs):
+            start = time.perf_counter()
+            epoch()
+            times.append(time.perf_counter() - start)
+        best = min(times)
+        results[name] = best
+        print(f"{name:<22}{best:>10.3f}{len(images) / best:>10.0f}")
+    speedup = results["decode (cache=False)"] / results["packed memmap"]
+    print(f"\n⚡ Image loading x{speedup:.1f} faster per epoch ({len(images)} images, imgsz {imgsz})")
+    saved = results["decode (cache=False)"] - results["packed memmap"]
+    print(f"   Loading only: a training epoch gets at most {saved:.3f}s shorter "
+          f"(compare train_yolo.py epoch times with / without --pack)")
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Memory-mapped dataset pack for training")
+    parser.add_argument("command", choices=["build", "bench"])
+    parser.add_argument("--data", default=DATA_YAML, help="data.yaml of the dataset")
+    parser.add_argument("--split", default="train")
+    parser.add_argument("--imgsz", type=int, default=640, help="Training input size (must match train_yolo.py)")
+    parser.add_argument("--out", help="Pack directory (default: <dataset>/packed/<split>_<imgsz>)")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the pack is up to date")
+    parser.add_argument("--epochs", type=int, default=5, help="Epochs timed by bench (best kept)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.command == "build":
+        build_pack(args.data, args.split, args.imgsz, args.out, args.force)
+    else:
+        bench(args.data, args.split, args.imgsz, args.epochs, args.out)
+
+
+if __name__ == "__main__":
+    main()
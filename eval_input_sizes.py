@@ -0,0 +1,168 @@
+"""
+Latency-vs-mAP Pareto table for detector checkpoints at several input sizes.
+
+Each model is evaluated on medicine_dataset val/test with Ultralytics'
+validator (mAP50, mAP50-95) and timed on the same images through the
+backend preprocessing path (letterbox_image -> model). Rows that no other
+row beats on both latency and mAP50-95 are marked as Pareto-optimal.
+
+    python eval_input_sizes.py --models runs/.../best.pt --sizes 320 416 512 640
+    python eval_input_sizes.py --models student320.pt:320 student416.pt:416 teacher.pt:640
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "mobile_app", "medicine_label_backend"))
+
+from dataset_pack import list_images, split_dir  # noqa: E402
+from label_pipeline import load_model, letterbox_image  # noqa: E402
+
+DATA_YAML = os.path.join(ROOT, "medicine_dataset", "data.yaml")
+
+
+# ==================================================
+# MEASUREMENTS
+# ==================================================
+def evaluate_accuracy(model, data, split, imgsz, device):
+    """mAP50 / mAP50-95 on one split (None if the split has no labels)"""
+    try:
+        metrics = model.val(data=data, split=split, imgsz=imgsz, batch=1,
+                            device=device, plots=False, verbose=False)
+    except Exception as e:
+        print(f"⚠️  Validation failed on {split}: {e}")
+        return None, None
+    return float(metrics.box.map50), float(metrics.box.map)
+
+
+def load_split_images(data_yaml, split):
+    """Decode every image of a split (folder resolved like Ultralytics); [] if the split has none"""
+    images_dir = split_dir(data_yaml, split)
+    if not os.path.isdir(images_dir):
+        return []
+    images = []
+    for path in list_images(images_dir):
+        img = cv2.imread(path)
+        if img is not None:
+            images.append(img)
+    return images
+
+
+def measure_latency(model, images, imgsz, device, repeats=3, warmup=3, batch=1):
+    """
+    Per-image latency (ms) of letterbox + inference, as served by the backend.
+    With batch > 1 the images are sent together and the batch time is divided
+    by the batch size.
+    """
+    for img in images[:warmup]:
+        model(letterbox_image(img, target_size=imgsz)[0], imgsz=imgsz, device=device, verbose=False)
+
+    samples = []
+    for _ in range(repeats):
+        for i in range(0, len(images), batch):
+            chunk = images[i:i + batch]
+            start = time.perf_counter()
+            frames = [letterbox_image(img, target_size=imgsz)[0] for img in chunk]
+            model(frames if batch > 1 else frames[0], imgsz=imgsz, device=device, verbose=False)
+            samples.append((time.perf_counter() - start) * 1000 / len(chunk))
+
+    samples = np.array(samples)
+    return float(np.mean(samples)), float(np.percentile(samples, 95))
+
+
+def pareto_front(rows, cost_key, gain_key):
+    """Mark rows not dominated on (lower cost, higher gain)"""
+    for row in rows:
+        row["pareto"] = "★" if row[gain_key] is not None and not any(
+            other is not row
+            and other[gain_key] is not None
+            and other[cost_key] <= row[cost_key]
+            and other[gain_key] >= row[gain_key]
+            and (other[cost_key] < row[cost_key] or other[gain_key] > row[gain_key])
+            for other in rows
+        ) else ""
+    return rows
+
+
+def print_table(rows):
+    header = list(rows[0].keys())
+    print("\n| " + " | ".join(header) + " |")
+    print("|" + "---|" * len(header))
+    for row in rows:
+        print("| " + " | ".join("" if row[k] is None else str(row[k]) for k in header) + " |")
+
+
+def write_csv(rows, path):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"\n💾 Saved: {path}")
+
+
+def parse_model_specs(specs, sizes):
+    """`path` -> one entry per --sizes value, `path:size` -> that size only"""
+    pairs = []
+    for spec in specs:
+        path, sep, size = spec.rpartition(":")
+        if sep and size.isdigit():
+            pairs.append((path, int(size)))
+        else:
+            pairs.extend((spec, s) for s in sizes)
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency vs mAP across input sizes")
+    parser.add_argument("--models", nargs="+", required=True, help="checkpoint[:imgsz] ...")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[320, 416, 512, 640])
+    parser.add_argument("--data", default=DATA_YAML)
+    parser.add_argument("--splits", nargs="+", default=["val", "test"])
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--csv", default="input_size_pareto.csv")
+    args = parser.parse_args()
+
+    rows = []
+    for split in args.splits:
+        images = load_split_images(args.data, split)
+        if not images:
+            print(f"⚠️  No images for split {split}, skipped")
+            continue
+
+        for path, imgsz in parse_model_specs(args.models, args.sizes):
+            model = load_model(path)
+            map50, map5095 = evaluate_accuracy(model, args.data, split, imgsz, args.device)
+            lat_mean, lat_p95 = measure_latency(model, images, imgsz, args.device, args.repeats)
+
+            rows.append({
+                "split": split,
+                "model": os.path.relpath(path, ROOT) if os.path.isabs(path) else path,
+                "imgsz": imgsz,
+                "mAP50": None if map50 is None else round(map50, 4),
+                "mAP50-95": None if map5095 is None else round(map5095, 4),
+                "latency_ms": round(lat_mean, 2),
+                "latency_p95_ms": round(lat_p95, 2),
+            })
+            print(f"✅ {split} {path} @ {imgsz}: mAP50-95={map5095} latency={lat_mean:.1f} ms")
+
+    if not rows:
+        print("❌ Nothing evaluated")
+        sys.exit(1)
+
+    # Pareto front computed per split
+    for split in args.splits:
+        pareto_front([r for r in rows if r["split"] == split], "latency_ms", "mAP50-95")
+
+    print_table(rows)
+    write_csv(rows, args.csv)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,8 @@
-from ultralytics import YOLO
-import torch
 import cv2
 import os
 
+from runtime import load_runtime
+
 def main():
     # ============================
     # CONFIG
@@ -14,20 +14,9 @@ def main():
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
     # ============================
-    # GPU CHECK
-    # ============================
-    if not torch.cuda.is_available():
-        raise RuntimeError("❌ CUDA not available. GPU is required.")
-
-    print("✅ Using GPU:", torch.cuda.get_device_name(0))
-
-    if not os.path.exists(MODEL_PATH):
-        raise FileNotFoundError(f"❌ Model not found: {MODEL_PATH}")
-
-    # ============================
-    # LOAD MODEL
+    # LOAD MODEL (GPU if available, else CPU)
     # ============================
-    model = YOLO(MODEL_PATH)
+    runtime = load_runtime(MODEL_PATH)
 
     # ============================
     # ASK USER FOR IMAGE
@@ -44,12 +33,11 @@ def main():
     # ============================
     # RUN INFERENCE
     # ============================
-    results = model(
+    results = runtime.predict(
         image,
-        device=0,
-        conf=CONF_THRESHOLD,
-        verbose=False
+        conf=CONF_THRESHOLD
     )[0]
+    runtime.report()
 
     if results.boxes is None or len(results.boxes) == 0:
         print("❌ No label detected")
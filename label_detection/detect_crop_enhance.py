@@ -1,9 +1,9 @@
-from ultralytics import YOLO
-import torch
 import cv2
 import numpy as np
 import os
 
+from runtime import load_runtime
+
 
 # ==================================================
 # TEXT ENHANCEMENT (OCR-FRIENDLY)
@@ -72,12 +72,8 @@ def main():
     for d in [DETECTED_DIR, CROPPED_DIR, ENHANCED_DIR]:
         os.makedirs(d, exist_ok=True)
 
-    if not torch.cuda.is_available():
-        raise RuntimeError("❌ CUDA not available")
-
-    print("✅ Using GPU:", torch.cuda.get_device_name(0))
-
-    model = YOLO(MODEL_PATH)
+    # GPU if available, else CPU (exported model preferred there)
+    runtime = load_runtime(MODEL_PATH, imgsz=1024)
 
     img_path = input("Enter image path: ").strip().strip('"')
     image = cv2.imread(img_path)
@@ -93,12 +89,9 @@ def main():
     for angle in [0, 90, 180, 270]:
         rotated = rotate_image(image, angle)
 
-        results = model(
+        results = runtime.predict(
             rotated,
-            device=0,
-            conf=CONF_THRESHOLD,
-            imgsz=1024,
-            verbose=False
+            conf=CONF_THRESHOLD
         )[0]
 
         if results.boxes is None:
@@ -113,6 +106,8 @@ def main():
                 best = mapped
                 best_score = score
 
+    runtime.report(per_image=4)
+
     if best is None:
         print("❌ No label detected (even with rotation)")
         return
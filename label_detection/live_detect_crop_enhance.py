@@ -1,9 +1,12 @@
-from ultralytics import YOLO
-import torch
 import cv2
 import numpy as np
 import os
+import queue
+import threading
 import time
+from collections import deque
+
+from runtime import load_runtime
 
 # ==================================================
 # TEXT ENHANCEMENT (OCR-FRIENDLY, NO BINARIZATION)
@@ -31,6 +34,167 @@ def enhance_label_text(img):
     return enhanced
 
 
+# ==================================================
+# PIPELINE STAGES
+# ==================================================
+# capture thread  -> LatestFrame  (older frames are overwritten, never queued)
+# inference thread:  newest frame only -> latest detection
+# main thread:       draw newest frame + latest detection, never waits on the model
+# writer thread:     enhance + imwrite of captures, off the display loop
+class RateCounter:
+    """Events per second over the last `window` seconds"""
+
+    def __init__(self, window=1.0):
+        self.window = window
+        self.times = deque()
+        self.lock = threading.Lock()
+
+    def tick(self):
+        now = time.perf_counter()
+        with self.lock:
+            self.times.append(now)
+            while self.times and now - self.times[0] > self.window:
+                self.times.popleft()
+
+    def rate(self):
+        now = time.perf_counter()
+        with self.lock:
+            while self.times and now - self.times[0] > self.window:
+                self.times.popleft()
+            return len(self.times) / self.window
+
+
+class LatestFrame:
+    """Single-slot frame buffer: put() replaces the frame, wait_newer() blocks until a newer one exists"""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.frame = None
+        self.seq = 0
+        self.closed = False
+
+    def put(self, frame):
+        with self.cond:
+            self.frame = frame
+            self.seq += 1
+            self.cond.notify_all()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def wait_newer(self, seq, timeout=None):
+        """(seq, frame) newer than `seq`, or (seq, None) on timeout / close"""
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq > seq or self.closed, timeout)
+            if self.seq > seq:
+                return self.seq, self.frame
+            return seq, None
+
+
+def capture_loop(cap, slot, stop, counter):
+    """Camera thread: read as fast as the camera delivers, keep only the newest frame"""
+    while not stop.is_set():
+        ret, frame = cap.read()
+        if not ret:
+            print("❌ Camera stream ended")
+            break
+        slot.put(frame)
+        counter.tick()
+    stop.set()
+    slot.close()
+
+
+class Detector(threading.Thread):
+    """Inference thread: always runs on the newest frame, skipping the ones that arrived meanwhile"""
+
+    def __init__(self, runtime, slot, stop, conf):
+        super().__init__(name="inference", daemon=True)
+        self.runtime = runtime
+        self.slot = slot
+        self.stop_event = stop
+        self.conf = conf
+        self.counter = RateCounter()
+        self.lock = threading.Lock()
+        self.box = None
+        self.last_seen = 0.0
+
+    def run(self):
+        seq = 0
+        while not self.stop_event.is_set():
+            seq, frame = self.slot.wait_newer(seq, timeout=0.5)
+            if frame is None:
+                continue
+
+            results = self.runtime.predict(
+                frame,
+                conf=self.conf
+            )[0]
+            self.counter.tick()
+
+            if results.boxes is not None and len(results.boxes) > 0:
+                boxes = results.boxes.xyxy.cpu().numpy()
+                scores = results.boxes.conf.cpu().numpy()
+
+                best = scores.argmax()
+                with self.lock:
+                    self.box = tuple(map(int, boxes[best]))
+                    self.last_seen = time.time()
+
+    def latest(self, max_age):
+        """Last detected box, or None if nothing was seen for max_age seconds"""
+        with self.lock:
+            if self.box is None or time.time() - self.last_seen > max_age:
+                return None
+            return self.box
+
+
+class CaptureWriter(threading.Thread):
+    """Saves detected / cropped / enhanced images from a bounded queue"""
+
+    def __init__(self, detected_dir, cropped_dir, enhanced_dir, max_pending=8):
+        super().__init__(name="writer", daemon=True)
+        self.dirs = (detected_dir, cropped_dir, enhanced_dir)
+        self.jobs = queue.Queue(maxsize=max_pending)
+
+    def submit(self, ts, display, crop):
+        """Queue a capture; returns False (capture dropped) if the disk cannot keep up"""
+        try:
+            self.jobs.put_nowait((ts, display, crop))
+            return True
+        except queue.Full:
+            return False
+
+    def close(self):
+        """Write everything still queued, then stop"""
+        self.jobs.put(None)
+        self.join()
+
+    def run(self):
+        detected_dir, cropped_dir, enhanced_dir = self.dirs
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            ts, display, crop = job
+
+            detected_path = os.path.join(detected_dir, f"{ts}_detected.jpg")
+            cropped_path = os.path.join(cropped_dir, f"{ts}_cropped.jpg")
+            enhanced_path = os.path.join(enhanced_dir, f"{ts}_enhanced.jpg")
+
+            enhanced = enhance_label_text(crop)
+
+            cv2.imwrite(detected_path, display)
+            cv2.imwrite(cropped_path, crop)
+            cv2.imwrite(enhanced_path, enhanced)
+
+            print("✅ Saved:")
+            print(" -", detected_path)
+            print(" -", cropped_path)
+            print(" -", enhanced_path)
+
+
 # ==================================================
 # MAIN LIVE CAMERA LOOP
 # ==================================================
@@ -41,6 +205,7 @@ def main():
     MODEL_PATH = r"C:/Users/oukse/runs/detect/runs/detect/medicine_label_mx3503/weights/best.pt"
     CONF_THRESHOLD = 0.35
     CAMERA_ID = 0
+    BOX_HOLD_S = 1.0  # keep showing the last box this long after the label is lost
 
     BASE_OUTPUT = "outputs"
     DETECTED_DIR = os.path.join(BASE_OUTPUT, "detected")
@@ -51,17 +216,9 @@ def main():
         os.makedirs(d, exist_ok=True)
 
     # ============================
-    # GPU CHECK
+    # LOAD MODEL (GPU if available, else CPU)
     # ============================
-    if not torch.cuda.is_available():
-        raise RuntimeError("❌ CUDA not available")
-
-    print("✅ Using GPU:", torch.cuda.get_device_name(0))
-
-    # ============================
-    # LOAD MODEL
-    # ============================
-    model = YOLO(MODEL_PATH)
+    runtime = load_runtime(MODEL_PATH)
 
     # ============================
     # OPEN CAMERA
@@ -70,107 +227,111 @@ def main():
     if not cap.isOpened():
         raise RuntimeError("❌ Failed to open camera")
 
+    # ============================
+    # START PIPELINE
+    # ============================
+    stop = threading.Event()
+    slot = LatestFrame()
+    camera_rate = RateCounter()
+    display_rate = RateCounter()
+
+    capture_thread = threading.Thread(target=capture_loop, args=(cap, slot, stop, camera_rate),
+                                      name="capture", daemon=True)
+    detector = Detector(runtime, slot, stop, CONF_THRESHOLD)
+    writer = CaptureWriter(DETECTED_DIR, CROPPED_DIR, ENHANCED_DIR)
+    capture_thread.start()
+    detector.start()
+    writer.start()
+
     print("🎥 Camera started")
     print("👉 Press C to capture | Press Q to quit")
 
-    tracking_box = None
-    last_seen = 0
-
     # ============================
-    # LIVE LOOP
+    # LIVE LOOP (display only)
     # ============================
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        display = frame.copy()
-        crop = None
-
-        # ----------------------------------
-        # DETECT (refresh if lost)
-        # ----------------------------------
-        if tracking_box is None or time.time() - last_seen > 1.0:
-            results = model(
-                frame,
-                conf=CONF_THRESHOLD,
-                device=0,
-                verbose=False
-            )[0]
-
-            if results.boxes is not None and len(results.boxes) > 0:
-                boxes = results.boxes.xyxy.cpu().numpy()
-                scores = results.boxes.conf.cpu().numpy()
-
-                best = scores.argmax()
-                x1, y1, x2, y2 = map(int, boxes[best])
-
-                tracking_box = (x1, y1, x2, y2)
-                last_seen = time.time()
-
-        # ----------------------------------
-        # TRACK + ZOOM
-        # ----------------------------------
-        if tracking_box is not None:
-            x1, y1, x2, y2 = tracking_box
-            h, w, _ = frame.shape
-            pad = 30
-
-            x1 = max(0, x1 - pad)
-            y1 = max(0, y1 - pad)
-            x2 = min(w, x2 + pad)
-            y2 = min(h, y2 + pad)
-
-            crop = frame[y1:y2, x1:x2]
-
-            cv2.rectangle(display, (x1, y1), (x2, y2), (0, 255, 0), 2)
+    seq = 0
+    try:
+        while not stop.is_set():
+            seq, frame = slot.wait_newer(seq, timeout=0.5)
+            if frame is None:
+                continue
+
+            display = frame.copy()
+            crop = None
+
+            # ----------------------------------
+            # LATEST DETECTION + ZOOM
+            # ----------------------------------
+            tracking_box = detector.latest(BOX_HOLD_S)
+            if tracking_box is not None:
+                x1, y1, x2, y2 = tracking_box
+                h, w, _ = frame.shape
+                pad = 30
+
+                x1 = max(0, x1 - pad)
+                y1 = max(0, y1 - pad)
+                x2 = min(w, x2 + pad)
+                y2 = min(h, y2 + pad)
+
+                crop = frame[y1:y2, x1:x2]
+
+                cv2.rectangle(display, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                cv2.putText(
+                    display,
+                    "LABEL DETECTED - Press C",
+                    (20, 40),
+                    cv2.FONT_HERSHEY_SIMPLEX,
+                    1,
+                    (0, 255, 0),
+                    2
+                )
+
+            # ----------------------------------
+            # COUNTERS (on-screen only, not in saved captures)
+            # ----------------------------------
+            display_rate.tick()
+            shown = display.copy()
             cv2.putText(
-                display,
-                "LABEL DETECTED - Press C",
-                (20, 40),
+                shown,
+                f"Display {display_rate.rate():.0f} FPS | Camera {camera_rate.rate():.0f} FPS"
+                f" | Inference {detector.counter.rate():.1f}/s",
+                (20, shown.shape[0] - 20),
                 cv2.FONT_HERSHEY_SIMPLEX,
-                1,
-                (0, 255, 0),
+                0.6,
+                (0, 255, 255),
                 2
             )
 
-        # ----------------------------------
-        # SHOW
-        # ----------------------------------
-        cv2.imshow("PharmaLense - Live Detection", display)
-
-        key = cv2.waitKey(1) & 0xFF
-
-        # ----------------------------------
-        # CAPTURE ALL OUTPUTS
-        # ----------------------------------
-        if key == ord('c') and crop is not None:
-            ts = time.strftime("%Y%m%d_%H%M%S")
-
-            detected_path = os.path.join(DETECTED_DIR, f"{ts}_detected.jpg")
-            cropped_path = os.path.join(CROPPED_DIR, f"{ts}_cropped.jpg")
-            enhanced_path = os.path.join(ENHANCED_DIR, f"{ts}_enhanced.jpg")
-
-            enhanced = enhance_label_text(crop)
-
-            cv2.imwrite(detected_path, display)
-            cv2.imwrite(cropped_path, crop)
-            cv2.imwrite(enhanced_path, enhanced)
-
-            print("✅ Saved:")
-            print(" -", detected_path)
-            print(" -", cropped_path)
-            print(" -", enhanced_path)
-
-        # ----------------------------------
-        # QUIT
-        # ----------------------------------
-        if key == ord('q'):
-            break
-
-    cap.release()
-    cv2.destroyAllWindows()
-    print("👋 Camera closed")
+            # ----------------------------------
+            # SHOW
+            # ----------------------------------
+            cv2.imshow("PharmaLense - Live Detection", shown)
+
+            key = cv2.waitKey(1) & 0xFF
+
+            # ----------------------------------
+            # CAPTURE ALL OUTPUTS (written by the writer thread)
+            # ----------------------------------
+            if key == ord('c') and crop is not None:
+                ts = time.strftime("%Y%m%d_%H%M%S")
+                if not writer.submit(ts, display, crop.copy()):
+                    print("⚠️ Capture dropped: writer queue full")
+
+            # ----------------------------------
+            # QUIT
+            # ----------------------------------
+            if key == ord('q'):
+                break
+    finally:
+        stop.set()
+        slot.close()
+        capture_thread.join(timeout=2)
+        detector.join(timeout=5)
+        writer.close()
+        cap.release()
+        cv2.destroyAllWindows()
+        runtime.report()
+        print("👋 Camera closed")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,189 @@
+"""
+Device / runtime selection shared by the desktop detection scripts
+(detect_and_crop.py, detect_crop_enhance.py, live_detect_crop_enhance.py).
+
+    runtime = load_runtime(MODEL_PATH, imgsz=640)
+    results = runtime.predict(image, conf=0.4)[0]
+    runtime.report()
+
+- GPU when CUDA is available, otherwise CPU instead of refusing to run.
+- On CPU: torch / OpenCV / OpenMP thread pools sized to the physical cores
+  this process may use (container CPU sets included), and an exported model
+  next to the checkpoint is preferred when one matches the input size:
+      <stem>_int8_openvino_model/   (yolo export format=openvino int8=True)
+      <stem>_openvino_model/
+      <stem>.onnx                   (needs onnxruntime)
+- Every predict() call is timed; report() prints per-image latency.
+
+Environment overrides:
+    DEVICE        auto (default) | cpu | 0, 1, ... (CUDA device index)
+    CPU_THREADS   thread count on CPU (default: usable physical cores)
+    USE_EXPORTED  0 to always run the .pt checkpoint
+"""
+import ast
+import os
+import time
+
+import numpy as np
+
+
+# ==================================================
+# DEVICE + THREADS
+# ==================================================
+def select_device(requested=None):
+    """0, 1, ... for CUDA or "cpu"; "auto" falls back to CPU when CUDA is missing"""
+    import torch
+
+    requested = str(requested or os.environ.get("DEVICE", "auto")).lower()
+    if requested == "cpu":
+        return "cpu"
+    if torch.cuda.is_available():
+        return 0 if requested == "auto" else int(requested)
+    if requested != "auto":
+        raise RuntimeError(f"❌ CUDA device {requested} requested but CUDA is not available")
+    return "cpu"
+
+
+def usable_cores():
+    """Physical cores this process may run on (affinity / container CPU set aware)"""
+    logical = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    try:
+        import psutil
+        physical = psutil.cpu_count(logical=False) or logical
+    except ImportError:
+        physical = logical
+    return max(1, min(logical, physical))
+
+
+def configure_cpu_threads(threads=None):
+    """
+    Size every CPU thread pool to `threads` (default CPU_THREADS or usable
+    physical cores). ONNX Runtime and OpenVINO size their own pools from
+    the cores they can see, so with fewer threads than cores the process is
+    also pinned to `threads` cores (Linux).
+    """
+    import cv2
+    import torch
+
+    threads = int(threads or os.environ.get("CPU_THREADS", 0) or usable_cores())
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(threads)
+
+    if hasattr(os, "sched_setaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+        if threads < len(cores):
+            os.sched_setaffinity(0, cores[:threads])
+    return threads
+
+
+# ==================================================
+# EXPORTED MODELS (CPU)
+# ==================================================
+def exported_imgsz(path):
+    """Input size an exported model was built for, None if unknown or not loadable here"""
+    try:
+        if path.endswith("_openvino_model"):
+            import yaml
+            with open(os.path.join(path, "metadata.yaml"), "r", encoding="utf-8") as f:
+                imgsz = yaml.safe_load(f)["imgsz"]
+        else:
+            import onnxruntime
+            meta = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"]) \
+                .get_modelmeta().custom_metadata_map
+            imgsz = ast.literal_eval(meta["imgsz"])
+    except Exception:
+        return None
+    return imgsz[0] if isinstance(imgsz, (list, tuple)) else imgsz
+
+
+def find_exported_model(model_path, imgsz):
+    """Fastest CPU export of model_path built for imgsz and newer than the checkpoint, else None"""
+    stem = os.path.splitext(model_path)[0]
+    for candidate in (f"{stem}_int8_openvino_model", f"{stem}_openvino_model", f"{stem}.onnx"):
+        if not os.path.exists(candidate):
+            continue
+        if os.path.exists(model_path) and os.path.getmtime(candidate) < os.path.getmtime(model_path):
+            print(f"⚠️ Ignoring stale export (older than the checkpoint): {candidate}")
+            continue
+        if exported_imgsz(candidate) == imgsz:
+            return candidate
+    return None
+
+
+# ==================================================
+# RUNTIME
+# ==================================================
+class Runtime:
+    """A loaded model bound to its device, with per-call latency bookkeeping"""
+
+    def __init__(self, model, model_path, device, imgsz, threads=None):
+        self.model = model
+        self.model_path = model_path
+        self.device = device
+        self.imgsz = imgsz
+        self.threads = threads
+        self.latencies_ms = []
+
+    @property
+    def on_cpu(self):
+        return self.device == "cpu"
+
+    def predict(self, image, **kwargs):
+        """model(image) on the selected device and input size, timed"""
+        kwargs.setdefault("imgsz", self.imgsz)
+        kwargs.setdefault("verbose", False)
+        start = time.perf_counter()
+        results = self.model(image, device=self.device, **kwargs)
+        self.latencies_ms.append((time.perf_counter() - start) * 1000)
+        return results
+
+    def warmup(self):
+        """One untimed inference: the first call also builds the predictor"""
+        self.model(np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8), device=self.device,
+                   imgsz=self.imgsz, verbose=False)
+
+    def describe(self):
+        where = f"CPU, {self.threads} threads" if self.on_cpu else f"GPU {self.device}"
+        return f"{os.path.basename(self.model_path.rstrip(os.sep))} @ {self.imgsz} ({where})"
+
+    def report(self, per_image=1):
+        """Print latency stats; per_image = predict() calls that make up one image"""
+        if not self.latencies_ms:
+            return
+        per = np.array(self.latencies_ms)
+        if per_image > 1 and len(per) >= per_image:
+            per = per[:len(per) // per_image * per_image].reshape(-1, per_image).sum(axis=1)
+        print(f"⏱️ {self.describe()}")
+        print(f"   {len(per)} image(s): mean {per.mean():.1f} ms, p50 {np.percentile(per, 50):.1f} ms, "
+              f"p95 {np.percentile(per, 95):.1f} ms"
+              + (f" ({per_image} inferences per image)" if per_image > 1 else ""))
+
+
+def load_runtime(model_path, imgsz=640, device=None, threads=None, prefer_exported=None):
+    """Select the device, size CPU threads, pick the model file and load it"""
+    from ultralytics import YOLO
+
+    device = select_device(device)
+    if device == "cpu":
+        threads = configure_cpu_threads(threads)
+        print(f"🖥️ Using CPU ({threads} threads)")
+        if prefer_exported is None:
+            prefer_exported = os.environ.get("USE_EXPORTED", "1") != "0"
+        exported = find_exported_model(model_path, imgsz) if prefer_exported else None
+        if exported:
+            print(f"📦 Using exported model: {exported}")
+            model_path = exported
+    else:
+        import torch
+        print("✅ Using GPU:", torch.cuda.get_device_name(device))
+
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"❌ Model not found: {model_path}")
+
+    # Exported models need their task; the project only trains detectors here
+    model = YOLO(model_path, task="detect") if not model_path.endswith(".pt") else YOLO(model_path)
+    runtime = Runtime(model, model_path, device, imgsz, threads)
+    runtime.warmup()
+    return runtime
@@ -337,6 +337,7 @@ class CameraService extends ChangeNotifier {
     _scanTimer = null;
     
     await _stopImageStream();
+    await _yoloService.closeLiveStream();
     
     _isScanning = false;
     _labelDetected = false;
@@ -485,6 +486,7 @@ class CameraService extends ChangeNotifier {
   void dispose() {
     _scanTimer?.cancel();
     _stopImageStream();
+    _yoloService.closeLiveStream();
     _cameraController?.dispose();
     _ocrService.dispose();
     super.dispose();
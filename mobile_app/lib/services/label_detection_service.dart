@@ -5,6 +5,7 @@ import 'package:flutter/foundation.dart';
 import 'package:http/http.dart' as http;
 import 'package:camera/camera.dart';
 import 'package:image/image.dart' as img;
+import 'live_detection_socket.dart';
 
 /// Service for automatic medicine label detection using YOLO backend
 class YoloLabelDetectionService {
@@ -12,9 +13,28 @@ class YoloLabelDetectionService {
   // Find it using: ipconfig (Windows) or ifconfig (Mac/Linux)
   static const String baseUrl = "http://192.168.1.7:8000";
   
+  // Identifies this device to the backend so a newer live frame can
+  // replace one that is still queued (latest-frame-wins), and for the
+  // per-device fair queueing / rate limits
+  static final String _clientId =
+      'phone-${DateTime.now().microsecondsSinceEpoch}';
+
+  final LiveDetectionSocket _liveSocket = LiveDetectionSocket(
+    url: '${baseUrl.replaceFirst('http', 'ws')}/ws/live',
+    clientId: _clientId,
+  );
+
+  // Last crop received, reused while the server reports crop_unchanged
+  Uint8List? _lastCropBytes;
+
   bool _isProcessing = false;
 
   /// Detect label in camera frame (lightweight for real-time)
+  ///
+  /// Frames go over the persistent /ws/live socket; if it can't be used
+  /// (older backend, network change) the frame falls back to /detect-live.
+  /// A frame whose reply is late is dropped instead: the server is busy, and
+  /// posting it again would only double its work.
   Future<DetectionResult?> detectLive(CameraImage cameraImage) async {
     if (_isProcessing) return null;
 
@@ -28,68 +48,64 @@ class YoloLabelDetectionService {
       final jpegBytes = await _convertCameraImageToJpeg(cameraImage);
       if (jpegBytes == null) return null;
 
-      // Send to backend
-      final request = http.MultipartRequest(
-        'POST',
-        Uri.parse('$baseUrl/detect-live'),
-      );
-
-      request.files.add(
-        http.MultipartFile.fromBytes(
-          'file',
-          jpegBytes,
-          filename: 'frame.jpg',
-        ),
-      );
+      Map<String, dynamic>? data;
+      try {
+        data = await _liveSocket.send(jpegBytes);
+      } on TimeoutException {
+        if (kDebugMode) {
+          debugPrint('⏱️ Live socket reply late, frame dropped');
+        }
+        return null;
+      } on SocketException catch (e) {
+        if (kDebugMode) {
+          debugPrint('⚠️ Live socket unavailable, using HTTP: $e');
+        }
+        data = await _postLiveFrame(jpegBytes);
+      } on WebSocketException catch (e) {
+        if (kDebugMode) {
+          debugPrint('⚠️ Live socket unavailable, using HTTP: $e');
+        }
+        data = await _postLiveFrame(jpegBytes);
+      }
 
-      // Set timeout for real-time performance (increased for CPU backend)
-      final response = await request.send().timeout(
-        const Duration(milliseconds: 2000), // Increased from 500ms for CPU processing
-        onTimeout: () {
-          if (kDebugMode) {
-            debugPrint('⏱️ Detection timeout after 2000ms');
-          }
-          throw TimeoutException('Detection timeout');
-        },
-      );
+      if (data != null && data["detected"] == true && data["box"] != null) {
+        final box = List<int>.from(data["box"]);
 
-      if (response.statusCode == 200) {
-        final body = await response.stream.bytesToString();
-        final data = json.decode(body);
+        // CRITICAL: Extract cropped image from response
+        // This contains ONLY pixels within the detection bounding box.
+        // The socket omits it while the label hasn't moved (crop_unchanged).
+        if (data["cropped_image"] != null) {
+          _lastCropBytes = base64.decode(data["cropped_image"]);
+        } else if (data["crop_unchanged"] != true) {
+          _lastCropBytes = null;
+        }
 
-        if (data["detected"] == true && data["box"] != null) {
-          final box = List<int>.from(data["box"]);
-
-          // CRITICAL: Extract cropped image from response
-          // This contains ONLY pixels within the detection bounding box
-          File? croppedFile;
-          if (data["cropped_image"] != null) {
-            try {
-              final croppedBytes = base64.decode(data["cropped_image"]);
-              final tempDir = Directory.systemTemp;
-              final timestamp = DateTime.now().millisecondsSinceEpoch;
-              croppedFile = File('${tempDir.path}/cropped_label_$timestamp.jpg');
-              await croppedFile.writeAsBytes(croppedBytes);
-            } catch (e) {
-              if (kDebugMode) {
-                debugPrint('Error saving cropped image: $e');
-              }
+        File? croppedFile;
+        if (_lastCropBytes != null) {
+          try {
+            final tempDir = Directory.systemTemp;
+            final timestamp = DateTime.now().millisecondsSinceEpoch;
+            croppedFile = File('${tempDir.path}/cropped_label_$timestamp.jpg');
+            await croppedFile.writeAsBytes(_lastCropBytes!);
+          } catch (e) {
+            if (kDebugMode) {
+              debugPrint('Error saving cropped image: $e');
             }
           }
-
-          return DetectionResult(
-            box: BoundingBox(
-              x1: box[0],
-              y1: box[1],
-              x2: box[2],
-              y2: box[3],
-            ),
-            confidence: (data["confidence"] ?? 0.0).toDouble(),
-            croppedImageFile: croppedFile,
-            imageWidth: imageWidth,
-            imageHeight: imageHeight,
-          );
         }
+
+        return DetectionResult(
+          box: BoundingBox(
+            x1: box[0],
+            y1: box[1],
+            x2: box[2],
+            y2: box[3],
+          ),
+          confidence: (data["confidence"] ?? 0.0).toDouble(),
+          croppedImageFile: croppedFile,
+          imageWidth: imageWidth,
+          imageHeight: imageHeight,
+        );
       }
 
       return null;
@@ -104,6 +120,42 @@ class YoloLabelDetectionService {
     }
   }
 
+  /// One frame through the multipart /detect-live endpoint
+  Future<Map<String, dynamic>?> _postLiveFrame(Uint8List jpegBytes) async {
+    final request = http.MultipartRequest(
+      'POST',
+      Uri.parse('$baseUrl/detect-live'),
+    );
+    request.headers['X-Client-Id'] = _clientId;
+
+    request.files.add(
+      http.MultipartFile.fromBytes(
+        'file',
+        jpegBytes,
+        filename: 'frame.jpg',
+      ),
+    );
+
+    // Set timeout for real-time performance (increased for CPU backend)
+    final response = await request.send().timeout(
+      const Duration(milliseconds: 2000), // Increased from 500ms for CPU processing
+      onTimeout: () {
+        if (kDebugMode) {
+          debugPrint('⏱️ Detection timeout after 2000ms');
+        }
+        throw TimeoutException('Detection timeout');
+      },
+    );
+
+    if (response.statusCode != 200) return null;
+
+    final body = await response.stream.bytesToString();
+    return json.decode(body);
+  }
+
+  /// Close the live socket (when scanning stops)
+  Future<void> closeLiveStream() => _liveSocket.close();
+
   /// Detect and crop label from image file (for final capture)
   Future<CroppedLabelResult?> detectAndCrop(File imageFile) async {
     try {
@@ -111,6 +163,7 @@ class YoloLabelDetectionService {
         'POST',
         Uri.parse('$baseUrl/detect-and-crop'),
       );
+      request.headers['X-Client-Id'] = _clientId;
 
       request.files.add(
         await http.MultipartFile.fromPath('file', imageFile.path),
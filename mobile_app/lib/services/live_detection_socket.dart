@@ -0,0 +1,106 @@
+import 'dart:async';
+import 'dart:convert';
+import 'dart:io';
+import 'dart:typed_data';
+
+/// Persistent WebSocket to the backend /ws/live endpoint.
+///
+/// Each frame is sent as one binary message:
+///   [4 bytes header length, big-endian][JSON header][JPEG bytes]
+/// and answered by a JSON text message carrying the same `seq`.
+/// This avoids a new multipart HTTP request for every scan tick.
+class LiveDetectionSocket {
+  final String url;
+  final String clientId;
+
+  WebSocket? _socket;
+  Future<void>? _connecting;
+  int _seq = 0;
+  final Map<int, Completer<Map<String, dynamic>>> _pending = {};
+
+  LiveDetectionSocket({required this.url, required this.clientId});
+
+  bool get isConnected =>
+      _socket != null && _socket!.readyState == WebSocket.open;
+
+  Future<void> connect() {
+    if (isConnected) return Future.value();
+    return _connecting ??= _open().whenComplete(() => _connecting = null);
+  }
+
+  Future<void> _open() async {
+    final socket = await WebSocket.connect(
+      url,
+      headers: {'X-Client-Id': clientId},
+    ).timeout(
+      const Duration(seconds: 3),
+      // A connect timeout is a connection failure, unlike a slow reply in send()
+      onTimeout: () => throw const SocketException('Live stream connect timeout'),
+    );
+
+    socket.listen(
+      _onMessage,
+      onDone: _onClosed,
+      onError: (_) => _onClosed(),
+      cancelOnError: true,
+    );
+    _socket = socket;
+  }
+
+  /// Send one JPEG frame and wait for its detection result
+  ///
+  /// Throws SocketException / WebSocketException when the socket can't be
+  /// opened or closes, TimeoutException when the reply is late (the socket
+  /// stays open; a late reply for the frame is ignored).
+  Future<Map<String, dynamic>> send(
+    Uint8List jpegBytes, {
+    Map<String, dynamic> settings = const {},
+    Duration timeout = const Duration(milliseconds: 2000),
+  }) async {
+    await connect();
+
+    final seq = _seq++;
+    final header = utf8.encode(json.encode({'seq': seq, ...settings}));
+    final length = ByteData(4)..setUint32(0, header.length);
+    final message = BytesBuilder(copy: false)
+      ..add(length.buffer.asUint8List())
+      ..add(header)
+      ..add(jpegBytes);
+
+    final completer = Completer<Map<String, dynamic>>();
+    _pending[seq] = completer;
+    _socket!.add(message.takeBytes());
+
+    try {
+      return await completer.future.timeout(timeout);
+    } finally {
+      _pending.remove(seq);
+    }
+  }
+
+  void _onMessage(dynamic message) {
+    if (message is! String) return;
+    final data = json.decode(message);
+    if (data is! Map<String, dynamic>) return;
+
+    final seq = data['seq'];
+    if (seq is int) {
+      _pending.remove(seq)?.complete(data);
+    }
+  }
+
+  void _onClosed() {
+    _socket = null;
+    for (final completer in _pending.values) {
+      if (!completer.isCompleted) {
+        completer.completeError(const SocketException('Live stream closed'));
+      }
+    }
+    _pending.clear();
+  }
+
+  Future<void> close() async {
+    await _socket?.close();
+    _socket = null;
+  }
+}
@@ -1,13 +1,38 @@
-from fastapi import FastAPI, File, UploadFile
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, UploadFile, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from ultralytics import YOLO
 import torch
 import cv2
 import numpy as np
+import asyncio
 import base64
+import hmac
+import json
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple, List, Optional
 
+from label_pipeline import (
+    load_model,
+    letterbox_image,
+    all_detections,
+    best_detection,
+    tiled_detections,
+    find_label_contour,
+    refine_box_edges,
+    refine_box_edges_rotated,
+    rectify_label,
+)
+from frame_quality import FrameQualityGate
+from live_stream import LatestFrameSlot, StreamState, parse_frame_message
+from scheduling import FairScheduler, LatestFrameCoalescer, RateLimited, client_id_for
+from runtime_tuning import ModelPool, autotune
+from profiling import Profiler
+
 app = FastAPI()
 
 # Add CORS middleware
@@ -22,10 +47,123 @@ app.add_middleware(
 # ==================================================
 # MODEL CONFIGURATION
 # ==================================================
-MODEL_PATH = r"H:\graduation\PharmaLense_Ai\runs\detect\runs\detect\medicine_label_lowdata2\weights\best.pt"
+MODEL_PATH = os.environ.get(
+    "MODEL_PATH",
+    r"H:\graduation\PharmaLense_Ai\runs\detect\runs\detect\medicine_label_lowdata2\weights\best.pt"
+)
+# Oriented-box variant trained with `python train_yolo.py --task obb`
+OBB_MODEL_PATH = os.environ.get(
+    "OBB_MODEL_PATH",
+    r"H:\graduation\PharmaLense_Ai\runs\obb\runs\obb\medicine_label_obb\weights\best.pt"
+)
 CONF_THRESHOLD = 0.15  # Lowered even more for better detection
 IOU_THRESHOLD = 0.45
 
+# Network input size (letterbox target). Smaller students from
+# train_students.py are served with e.g. INPUT_SIZE=416 MODEL_PATH=.../student416/weights/best.pt
+INPUT_SIZE = int(os.environ.get("INPUT_SIZE", "640"))
+if INPUT_SIZE % 32 != 0:
+    raise ValueError(f"INPUT_SIZE must be a multiple of 32 (YOLO stride): {INPUT_SIZE}")
+
+# Tiled inference for high-resolution photos (a shelf, a tray of boxes):
+# letterboxing a 4000 px photo to INPUT_SIZE shrinks every label to a few
+# dozen pixels. Above TILED_MIN_SIDE (longest side, px; 0 = never) the
+# capture/debug/scan endpoints detect on overlapping INPUT_SIZE tiles at full
+# resolution plus the letterboxed full frame, TILE_BATCH model inputs at a
+# time, merged in original coordinates. Live endpoints never tile.
+TILED_MIN_SIDE = int(os.environ.get("TILED_MIN_SIDE", "1920"))
+TILE_OVERLAP = float(os.environ.get("TILE_OVERLAP", "0.2"))
+TILE_BATCH = int(os.environ.get("TILE_BATCH", "8"))
+TILE_MERGE_THRESHOLD = float(os.environ.get("TILE_MERGE_THRESHOLD", "0.5"))
+if not 0 <= TILE_OVERLAP < 1:
+    raise ValueError(f"TILE_OVERLAP must be in [0, 1): {TILE_OVERLAP}")
+
+# Rotated box source:
+#   "contour" - axis-aligned YOLO box refined by find_label_contour() (default)
+#   "obb"     - rotated box read straight from the OBB model, no contour stage
+DETECTION_MODE = os.environ.get("DETECTION_MODE", "contour").lower()
+if DETECTION_MODE not in ("contour", "obb"):
+    raise ValueError(f"Unknown DETECTION_MODE: {DETECTION_MODE} (expected 'contour' or 'obb')")
+
+# ==================================================
+# LIVE FRAME QUALITY GATE
+# ==================================================
+# Thresholds are measured on a 480 px wide grayscale thumbnail.
+# The raw metrics are returned with every rejection and /stats shows the
+# counters, which is how these values should be tuned.
+quality_gate = FrameQualityGate(
+    enabled=os.environ.get("QUALITY_GATE", "1") != "0",
+    min_sharpness=float(os.environ.get("QUALITY_MIN_SHARPNESS", "100")),
+    min_gradient_energy=float(os.environ.get("QUALITY_MIN_GRADIENT", "4000")),
+    min_gradient_isotropy=float(os.environ.get("QUALITY_MIN_ISOTROPY", "0.35")),
+    motion_blur_sharpness_factor=float(os.environ.get("QUALITY_MOTION_SHARPNESS_FACTOR", "3")),
+    min_brightness=float(os.environ.get("QUALITY_MIN_BRIGHTNESS", "35")),
+    max_brightness=float(os.environ.get("QUALITY_MAX_BRIGHTNESS", "225")),
+    max_clipped_fraction=float(os.environ.get("QUALITY_MAX_CLIPPED", "0.5")),
+)
+
+# ==================================================
+# INFERENCE ADMISSION
+# ==================================================
+# One model instance per scheduler slot (YOLO predictors are not safe to
+# call concurrently); the number of slots is picked by the runtime tuning
+# below. Every endpoint runs its model work through the scheduler, off the
+# event loop.
+#
+# Request classes (weight = share of the model when all are backlogged,
+# rate/burst = per-client token bucket, requests per second; RATE_* must be
+# > 0 and BURST_* >= 1, checked at startup):
+#   live    - /detect-live, cheap and latency sensitive (phone sends ~1.25/s)
+#   capture - /detect-and-crop and legacy /detect (NLM denoise + 2 JPEG encodes)
+#   debug   - /detect-debug
+#   scan    - /scan (detection slot only; OCR runs in its own executor)
+SCHEDULER_CLASSES = {
+    "live": {
+        "weight": 4,
+        "rate": float(os.environ.get("RATE_LIVE", "3")),
+        "burst": float(os.environ.get("BURST_LIVE", "6")),
+    },
+    "capture": {
+        "weight": 2,
+        "rate": float(os.environ.get("RATE_CAPTURE", "0.5")),
+        "burst": float(os.environ.get("BURST_CAPTURE", "3")),
+    },
+    "debug": {
+        "weight": 1,
+        "rate": float(os.environ.get("RATE_DEBUG", "0.2")),
+        "burst": float(os.environ.get("BURST_DEBUG", "2")),
+    },
+    "scan": {
+        "weight": 2,
+        "rate": float(os.environ.get("RATE_SCAN", "0.5")),
+        "burst": float(os.environ.get("BURST_SCAN", "3")),
+    },
+}
+scheduler = FairScheduler(SCHEDULER_CLASSES, workers=1)
+live_coalescer = LatestFrameCoalescer(scheduler, request_class="live")
+
+# On-demand profiling (POST /admin/profile), idle until a session is started
+profiler = Profiler()
+scheduler.task_wrapper = profiler.wrap
+
+# Open /ws/live connections (id -> StreamState), reported by /stats
+live_streams = {}
+
+
+def rate_limited_response(e: RateLimited, body: Optional[dict] = None) -> JSONResponse:
+    """429 with Retry-After for a client that ran out of tokens"""
+    content = dict(body or {})
+    content.update({
+        "error": "Rate limit exceeded",
+        "request_class": e.request_class,
+        "retry_after": round(e.retry_after, 2)
+    })
+    return JSONResponse(
+        status_code=429,
+        content=content,
+        headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+    )
+
 # Debug logging
 import logging
 logging.basicConfig(level=logging.INFO)
@@ -39,294 +177,50 @@ else:
     print(f"✅ Using GPU: {torch.cuda.get_device_name(0)}")
     device = 0
 
-# Fix PyTorch 2.10+ compatibility - disable weights_only check for our trusted model
-# Temporarily override torch.load to allow model loading
-import os
-_original_torch_load = torch.load
-
-def _patched_torch_load(*args, **kwargs):
-    kwargs['weights_only'] = False
-    return _original_torch_load(*args, **kwargs)
-
-torch.load = _patched_torch_load
+SERVED_MODEL_PATH = OBB_MODEL_PATH if DETECTION_MODE == "obb" else MODEL_PATH
+# Called like a YOLO model; each call runs on a free instance (see runtime_tuning)
+model = ModelPool(lambda: load_model(SERVED_MODEL_PATH))
+print(f"✅ Model loaded successfully (mode: {DETECTION_MODE})")
 
-model = YOLO(MODEL_PATH)
-
-# Restore original torch.load
-torch.load = _original_torch_load
-print("✅ Model loaded successfully")
+# ==================================================
+# /scan OCR + CLASSIFICATION STAGES
+# ==================================================
+# OCR (text_extraction/ocr_test.py) and field extraction
+# (Classifier/reberta_med_classification.py) live at the project root.
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "text_extraction"))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "Classifier"))
+
+# Orientations read by Tesseract (one Tesseract run each)
+SCAN_OCR_ANGLES = os.environ.get("SCAN_OCR_ANGLES", "0_deg,90_deg,180_deg,270_deg").split(",")
+# Tesseract runs as a subprocess, so several OCR jobs overlap on CPU cores
+SCAN_OCR_WORKERS = int(os.environ.get("SCAN_OCR_WORKERS", "2"))
+
+try:
+    from ocr_test import preprocess_image, extract_text_all_angles, clean_combined_text, ROTATIONS
+    from reberta_med_classification import ExtracteurMedicaments
+
+    unknown_angles = [a for a in SCAN_OCR_ANGLES if a not in ROTATIONS]
+    if unknown_angles:
+        raise ValueError(f"Unknown SCAN_OCR_ANGLES {unknown_angles} (expected {list(ROTATIONS)})")
+
+    # Library mode: no console output or results/ directory per request
+    classifier = ExtracteurMedicaments()
+    SCAN_AVAILABLE = True
+except ImportError as e:
+    print(f"⚠️ WARNING: /scan disabled ({e})")
+    classifier = None
+    SCAN_AVAILABLE = False
+
+# One executor per CPU stage: while one request is in OCR, the next one can
+# be rectified and a third one detected on the model slot
+prep_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="scan-prep")
+ocr_executor = ThreadPoolExecutor(max_workers=SCAN_OCR_WORKERS, thread_name_prefix="scan-ocr")
 
 
 # ==================================================
 # IMAGE PREPROCESSING FUNCTIONS
 # ==================================================
-def letterbox_image(img: np.ndarray, target_size: int = 640) -> Tuple[np.ndarray, float, Tuple[int, int]]:
-    """
-    Resize image with letterboxing to maintain aspect ratio
-    This prevents distortion and ensures accurate bounding boxes
-    
-    Returns: 
-        letterboxed_image: Padded image (target_size x target_size)
-        scale_factor: Resize ratio applied
-        (pad_w, pad_h): Padding offsets added
-    """
-    h, w = img.shape[:2]
-    
-    # Calculate scale to fit target size while preserving aspect ratio
-    scale = min(target_size / h, target_size / w)
-    
-    # New dimensions after scaling
-    new_w = int(w * scale)
-    new_h = int(h * scale)
-    
-    # Resize image
-    resized = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
-    
-    # Calculate padding to center the image
-    pad_w = (target_size - new_w) // 2
-    pad_h = (target_size - new_h) // 2
-    
-    # Add padding (gray color matching YOLO default)
-    letterboxed = cv2.copyMakeBorder(
-        resized,
-        pad_h, target_size - new_h - pad_h,  # top, bottom
-        pad_w, target_size - new_w - pad_w,  # left, right
-        cv2.BORDER_CONSTANT,
-        value=(114, 114, 114)  # Gray padding
-    )
-    
-    return letterboxed, scale, (pad_w, pad_h)
-
-
-def unletterbox_coords(box: Tuple[int, int, int, int], scale: float, 
-                       padding: Tuple[int, int]) -> Tuple[int, int, int, int]:
-    """
-    Convert bounding box coordinates from letterboxed image back to original image
-    
-    Steps:
-    1. Remove padding offset
-    2. Scale back by inverse of resize ratio
-    """
-    x1, y1, x2, y2 = box
-    pad_w, pad_h = padding
-    
-    # Remove padding offset
-    x1 = x1 - pad_w
-    y1 = y1 - pad_h
-    x2 = x2 - pad_w
-    y2 = y2 - pad_h
-    
-    # Scale back to original size
-    x1 = int(x1 / scale)
-    y1 = int(y1 / scale)
-    x2 = int(x2 / scale)
-    y2 = int(y2 / scale)
-    
-    return (x1, y1, x2, y2)
-
-
-def find_label_contour(img: np.ndarray, yolo_box: Tuple[int, int, int, int],
-                       expand_margin: int = 20) -> Optional[np.ndarray]:
-    """
-    GEOMETRIC EDGE DETECTION: Find the precise label contour using edge analysis.
-
-    This function treats label detection as a pure geometry problem:
-    1. Extract YOLO region (rough localization)
-    2. Apply multi-stage edge detection
-    3. Find dominant rectangular contour (the label boundary)
-    4. Return the contour points for rotated rectangle fitting
-
-    Returns: Contour points (Nx1x2 array) or None if detection fails
-    """
-    x1, y1, x2, y2 = yolo_box
-    h, w = img.shape[:2]
-
-    # Expand search region slightly beyond YOLO box
-    search_x1 = max(0, x1 - expand_margin)
-    search_y1 = max(0, y1 - expand_margin)
-    search_x2 = min(w, x2 + expand_margin)
-    search_y2 = min(h, y2 + expand_margin)
-
-    # Extract ROI
-    roi = img[search_y1:search_y2, search_x1:search_x2].copy()
-
-    if roi.size == 0 or roi.shape[0] < 30 or roi.shape[1] < 30:
-        return None
-
-    try:
-        # === STEP 1: Grayscale and denoising ===
-        gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-
-        # Bilateral filter: preserves edges while removing noise
-        denoised = cv2.bilateralFilter(gray, 9, 75, 75)
-
-        # === STEP 2: Multi-threshold edge detection ===
-        # Use adaptive thresholding to handle varying lighting
-        adaptive_thresh = cv2.adaptiveThreshold(
-            denoised, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-            cv2.THRESH_BINARY, 11, 2
-        )
-
-        # Canny edge detection with low thresholds for label boundaries
-        edges = cv2.Canny(denoised, 20, 80)
-
-        # Combine both edge detection methods
-        combined_edges = cv2.bitwise_or(edges, cv2.bitwise_not(adaptive_thresh))
-
-        # === STEP 3: Morphological operations to connect edges ===
-        # Close gaps in the label boundary
-        kernel_close = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
-        closed = cv2.morphologyEx(combined_edges, cv2.MORPH_CLOSE, kernel_close, iterations=2)
-
-        # Dilate slightly to ensure connected boundary
-        kernel_dilate = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-        dilated = cv2.dilate(closed, kernel_dilate, iterations=1)
-
-        # === STEP 4: Find contours ===
-        contours, _ = cv2.findContours(
-            dilated, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
-        )
-
-        if not contours:
-            return None
-
-        # === STEP 5: Select the label contour ===
-        # Filter by area: must occupy significant portion of ROI
-        roi_area = roi.shape[0] * roi.shape[1]
-        min_area = roi_area * 0.15  # At least 15% of ROI
-        max_area = roi_area * 0.95  # At most 95% of ROI
-
-        valid_contours = [
-            cnt for cnt in contours
-            if min_area < cv2.contourArea(cnt) < max_area
-        ]
-
-        if not valid_contours:
-            return None
-
-        # Choose largest valid contour (most likely the label)
-        label_contour = max(valid_contours, key=cv2.contourArea)
-
-        # === STEP 6: Refine contour using convex hull ===
-        # This removes internal noise and gives us the outer boundary
-        hull = cv2.convexHull(label_contour)
-
-        # Approximate to polygon to reduce noise
-        epsilon = 0.01 * cv2.arcLength(hull, True)
-        approx = cv2.approxPolyDP(hull, epsilon, True)
-
-        # Map contour back to original image coordinates
-        approx_mapped = approx.copy()
-        approx_mapped[:, 0, 0] += search_x1
-        approx_mapped[:, 0, 1] += search_y1
-
-        return approx_mapped
-
-    except Exception as e:
-        print(f"Contour detection failed: {e}")
-        return None
-
-
-def get_rotated_box_from_contour(contour: np.ndarray) -> Tuple[List[List[int]], Tuple[int, int, int, int]]:
-    """
-    Fit a minimum area rotated rectangle to the detected contour.
-
-    Returns:
-        - rotated_points: 4 corner points [[x1,y1], [x2,y2], [x3,y3], [x4,y4]]
-        - axis_aligned_bbox: (x1, y1, x2, y2) for compatibility
-    """
-    # Fit minimum area rectangle (can be rotated)
-    rect = cv2.minAreaRect(contour)
-
-    # Get the 4 corner points of the rotated rectangle
-    box_points = cv2.boxPoints(rect)
-    box_points = box_points.astype(int)  # Fixed: np.int0 deprecated in NumPy 2.0+
-
-    # Convert to list format for JSON serialization
-    rotated_points = box_points.tolist()
-
-    # Also compute axis-aligned bounding box for compatibility
-    x_coords = box_points[:, 0]
-    y_coords = box_points[:, 1]
-
-    axis_aligned_bbox = (
-        int(x_coords.min()),
-        int(y_coords.min()),
-        int(x_coords.max()),
-        int(y_coords.max())
-    )
-
-    return rotated_points, axis_aligned_bbox
-
-
-def refine_box_edges(img: np.ndarray, box: Tuple[int, int, int, int],
-                     expand_margin: int = 20) -> Tuple[int, int, int, int]:
-    """
-    PRECISION EDGE-BASED REFINEMENT using rotated rectangle fitting.
-
-    Pipeline:
-    1. Use YOLO box for rough localization
-    2. Find label contour using edge geometry
-    3. Fit minimum area (rotated) rectangle to contour
-    4. Return axis-aligned bbox (for backward compatibility)
-
-    Note: Use refine_box_edges_rotated() to get the full rotated box
-    """
-    contour = find_label_contour(img, box, expand_margin)
-
-    if contour is None:
-        return box
-
-    # Get rotated box
-    _, axis_aligned = get_rotated_box_from_contour(contour)
-
-    # Validation: ensure reasonable size
-    x1, y1, x2, y2 = axis_aligned
-    h, w = img.shape[:2]
-
-    # Clamp to image bounds
-    x1 = max(0, min(x1, w))
-    y1 = max(0, min(y1, h))
-    x2 = max(0, min(x2, w))
-    y2 = max(0, min(y2, h))
-
-    # Ensure minimum size
-    if (x2 - x1) < 30 or (y2 - y1) < 30:
-        return box
-
-    # Validate area change is reasonable
-    original_area = (box[2] - box[0]) * (box[3] - box[1])
-    refined_area = (x2 - x1) * (y2 - y1)
-
-    if refined_area < original_area * 0.15 or refined_area > original_area * 1.8:
-        return box
-
-    return (x1, y1, x2, y2)
-
-
-def refine_box_edges_rotated(img: np.ndarray, box: Tuple[int, int, int, int],
-                              expand_margin: int = 20) -> Optional[List[List[int]]]:
-    """
-    FULL ROTATED RECTANGLE REFINEMENT - returns 4 corner points.
-
-    This is the PRIMARY function for tight label detection.
-    Returns a rotated rectangle that hugs the label edges precisely.
-
-    Returns:
-        [[x1,y1], [x2,y2], [x3,y3], [x4,y4]] - 4 corners of rotated rect
-        or None if detection fails
-    """
-    contour = find_label_contour(img, box, expand_margin)
-
-    if contour is None:
-        return None
-
-    # Get rotated box points
-    rotated_points, _ = get_rotated_box_from_contour(contour)
-
-    return rotated_points
-
-
 def quick_preprocess(img: np.ndarray) -> np.ndarray:
     """
     Lightweight preprocessing to avoid freezing
@@ -387,6 +281,129 @@ def enhance_label_for_ocr(img: np.ndarray, box: Tuple[int, int, int, int]) -> np
     return enhanced
 
 
+# ==================================================
+# DETECTION PIPELINE
+# ==================================================
+def use_tiling(img_original: np.ndarray) -> bool:
+    return TILED_MIN_SIDE > 0 and max(img_original.shape[:2]) > TILED_MIN_SIDE
+
+
+def detect_all(img_original: np.ndarray, imgsz: int = INPUT_SIZE,
+               tiled: Optional[bool] = None) -> Tuple[List[dict], dict]:
+    """
+    Every label in the image, most confident first, in original image
+    coordinates. tiled=None tiles only images above TILED_MIN_SIDE.
+
+    Returns: detections, inference info (mode, model inputs, time in ms)
+    """
+    if tiled is None:
+        tiled = use_tiling(img_original)
+    start = time.perf_counter()
+
+    if tiled:
+        detections, inputs = tiled_detections(
+            model, img_original, tile=imgsz, overlap=TILE_OVERLAP, batch=TILE_BATCH,
+            merge_threshold=TILE_MERGE_THRESHOLD, nms_iou=IOU_THRESHOLD,
+            conf=CONF_THRESHOLD, iou=IOU_THRESHOLD, device=device, verbose=False
+        )
+    else:
+        img_letterboxed, scale, padding = letterbox_image(img_original, target_size=imgsz)
+        results = model(img_letterboxed, conf=CONF_THRESHOLD, iou=IOU_THRESHOLD,
+                        device=device, verbose=False, imgsz=imgsz)[0]
+        detections = sorted(all_detections(results, scale, padding, img_original.shape),
+                            key=lambda d: d["confidence"], reverse=True)
+        inputs = 1
+
+    info = {
+        "mode": "tiled" if tiled else "single",
+        "model_inputs": inputs,
+        "image_size": [img_original.shape[1], img_original.shape[0]],
+        "inference_ms": round((time.perf_counter() - start) * 1000, 1)
+    }
+    if tiled:
+        print(f"🧩 Tiled detection {info['image_size'][0]}x{info['image_size'][1]}: "
+              f"{inputs} inputs, {len(detections)} labels, {info['inference_ms']} ms")
+    return detections, info
+
+
+def run_detection(img_original: np.ndarray, imgsz: int = INPUT_SIZE,
+                  tiled: Optional[bool] = False) -> Optional[dict]:
+    """
+    Best detection in original image coordinates (see label_pipeline.best_detection),
+    with an "inference" entry describing how it was computed (see detect_all).
+    Live endpoints keep tiled=False; tiled=None tiles above TILED_MIN_SIDE.
+    """
+    detections, info = detect_all(img_original, imgsz, tiled)
+    if not detections:
+        return None
+    return dict(detections[0], inference=info)
+
+
+def locate_label(img_original: np.ndarray,
+                 detection: dict) -> Tuple[Optional[List[List[int]]], Tuple[int, int, int, int], str]:
+    """
+    Turn a detection into the precise label geometry.
+
+    Returns:
+        rotated_box: 4 corners, or None if edge detection failed
+        refined_box: axis-aligned (x1, y1, x2, y2) used for cropping
+        rotation_source: "obb" (network output) or "contour" (edge geometry)
+    """
+    yolo_box = detection["yolo_box"]
+
+    # OBB model: rotation comes straight from the network, skip the contour stage
+    if detection["obb_points"] is not None:
+        return detection["obb_points"], yolo_box, "obb"
+
+    # === CRITICAL: Find precise rotated box from edges ===
+    rotated_box = refine_box_edges_rotated(img_original, yolo_box)
+
+    # Also get axis-aligned box for cropping
+    refined_box = refine_box_edges(img_original, yolo_box)
+
+    return rotated_box, refined_box, "contour"
+
+
+# ==================================================
+# RUNTIME TUNING (workers x torch threads x cv2 threads)
+# ==================================================
+AUTOTUNE_CACHE = os.environ.get("AUTOTUNE_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                               ".autotune.json"))
+AUTOTUNE_IMAGE = os.environ.get("AUTOTUNE_IMAGE", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                               "test.jpg"))
+
+
+def tuning_workload(img: np.ndarray):
+    """One detection request as served: letterbox + YOLO + contour refinement"""
+    detections, _ = detect_all(img, tiled=False)
+    if detections:
+        locate_label(img, detections[0])
+    else:
+        # Nothing detected on the tuning image: still exercise the OpenCV stage
+        h, w = img.shape[:2]
+        box = (w // 4, h // 4, 3 * w // 4, 3 * h // 4)
+        refine_box_edges_rotated(img, box)
+        refine_box_edges(img, box)
+
+
+if device == 'cpu':
+    tuning_image = cv2.imread(AUTOTUNE_IMAGE)
+    if tuning_image is None:
+        print(f"⚠️ WARNING: autotune image not found ({AUTOTUNE_IMAGE}), using a synthetic frame")
+        tuning_image = np.random.default_rng(0).integers(0, 255, (1080, 1920, 3), dtype=np.uint8)
+    print("🔧 Tuning inference workers and thread pools...")
+    runtime_config = autotune(tuning_workload, tuning_image, model, SERVED_MODEL_PATH, INPUT_SIZE,
+                              cache_path=AUTOTUNE_CACHE or None)
+else:
+    # GPU: inference does not run on the CPU pools, a single slot keeps the device busy
+    runtime_config = {"workers": 1, "torch_threads": torch.get_num_threads(),
+                      "cv2_threads": cv2.getNumThreads(), "source": "gpu", "measurements": []}
+
+scheduler.workers = runtime_config["workers"]
+print(f"✅ Runtime: {runtime_config['workers']} worker(s), torch {runtime_config['torch_threads']} threads, "
+      f"cv2 {runtime_config['cv2_threads']} threads ({runtime_config['source']})")
+
+
 # ==================================================
 # API ENDPOINTS
 # ==================================================
@@ -398,6 +415,11 @@ async def root():
         "model": "YOLO Medicine Label Detector (Rotated Box v3.0)",
         "device": "GPU" if torch.cuda.is_available() else "CPU",
         "version": "3.0",
+        "detection_mode": DETECTION_MODE,
+        "input_size": INPUT_SIZE,
+        "tiled_min_side": TILED_MIN_SIDE,
+        "runtime": {k: v for k, v in runtime_config.items() if k != "measurements"},
+        "quality_gate": quality_gate.enabled,
         "features": [
             "Geometric edge detection",
             "Rotated rectangle fitting (minAreaRect)",
@@ -408,12 +430,72 @@ async def root():
     }
 
 
+@app.get("/stats")
+async def stats():
+    """Runtime counters (live quality gate, scheduler queues, ...)"""
+    return {
+        "quality_gate": quality_gate.stats(),
+        "live_coalescing": live_coalescer.stats(),
+        "scheduler": scheduler.stats(),
+        "runtime_tuning": runtime_config,
+        "live_streams": [state.stats() for state in live_streams.values()]
+    }
+
+
+def process_legacy_detection(img: np.ndarray) -> dict:
+    """Legacy /detect pipeline on a decoded image"""
+    # Quick preprocessing (legacy method)
+    preprocessed = quick_preprocess(img)
+
+    # Run detection
+    results = model(
+        preprocessed,
+        conf=CONF_THRESHOLD,
+        iou=IOU_THRESHOLD,
+        device=device,
+        verbose=False
+    )[0]
+
+    # No letterbox here: identity mapping back to the preprocessed image
+    detection = best_detection(results, 1.0, (0, 0), preprocessed.shape)
+
+    if detection is None:
+        return {
+            "detected": False,
+            "message": "No label detected"
+        }
+
+    x1, y1, x2, y2 = detection["yolo_box"]
+    confidence = detection["confidence"]
+
+    return {
+        "detected": True,
+        "box": {
+            "x1": x1,
+            "y1": y1,
+            "x2": x2,
+            "y2": y2
+        },
+        "confidence": confidence,
+        "image_size": {
+            "width": preprocessed.shape[1],
+            "height": preprocessed.shape[0]
+        }
+    }
+
+
 @app.post("/detect")
-async def detect_label(file: UploadFile = File(...)):
+async def detect_label(request: Request, file: UploadFile = File(...)):
     """
     Detect medicine label in uploaded image (legacy endpoint)
     Note: Use /detect-live or /detect-and-crop for better results
     """
+    client_id = client_id_for(request)
+    try:
+        scheduler.admit(client_id, "capture")
+    except RateLimited as e:
+        return rate_limited_response(e)
+
     try:
         # Read image
         contents = await file.read()
@@ -426,46 +508,8 @@ async def detect_label(file: UploadFile = File(...)):
                 content={"error": "Invalid image file"}
             )
 
-        # Quick preprocessing (legacy method)
-        preprocessed = quick_preprocess(img)
-
-        # Run detection
-        results = model(
-            preprocessed,
-            conf=CONF_THRESHOLD,
-            iou=IOU_THRESHOLD,
-            device=device,
-            verbose=False
-        )[0]
-
-        if results.boxes is None or len(results.boxes) == 0:
-            return {
-                "detected": False,
-                "message": "No label detected"
-            }
-
-        # Get best detection
-        boxes = results.boxes.xyxy.cpu().numpy()
-        scores = results.boxes.conf.cpu().numpy()
-        
-        best_idx = scores.argmax()
-        x1, y1, x2, y2 = map(int, boxes[best_idx])
-        confidence = float(scores[best_idx])
-
-        return {
-            "detected": True,
-            "box": {
-                "x1": x1,
-                "y1": y1,
-                "x2": x2,
-                "y2": y2
-            },
-            "confidence": confidence,
-            "image_size": {
-                "width": preprocessed.shape[1],
-                "height": preprocessed.shape[0]
-            }
-        }
+        return await scheduler.run(process_legacy_detection, img,
+                                   client_id=client_id, request_class="capture")
 
     except Exception as e:
         print(f"Detection error: {str(e)}")
@@ -475,12 +519,84 @@ async def detect_label(file: UploadFile = File(...)):
         )
 
 
+def process_live_frame(img_original: np.ndarray,
+                       cancel_event: Optional[threading.Event] = None) -> Optional[dict]:
+    """
+    Live pipeline on a decoded frame: detection, rotated box, crop.
+    Returns the /detect-live response body, or None if cancel_event was set
+    (client disconnected) before the refinement stage.
+    """
+    start = time.perf_counter()
+    try:
+        return _live_pipeline(img_original, cancel_event)
+    finally:
+        quality_gate.record_pipeline_time((time.perf_counter() - start) * 1000)
+
+
+def _live_pipeline(img_original: np.ndarray,
+                   cancel_event: Optional[threading.Event]) -> Optional[dict]:
+    original_h, original_w = img_original.shape[:2]
+
+    # YOLO on letterboxed image, mapped back to original coordinates
+    detection = run_detection(img_original)
+
+    if detection is None:
+        print(f"❌ No detections found (threshold: {CONF_THRESHOLD})")
+        return {"detected": False, "frame_quality": "ok"}
+
+    # Nobody is waiting for this answer any more: skip refinement and encoding
+    if cancel_event is not None and cancel_event.is_set():
+        return None
+
+    # Precise rotated box (OBB head or edge geometry)
+    rotated_box, refined_box, rotation_source = locate_label(img_original, detection)
+    rx1, ry1, rx2, ry2 = refined_box
+
+    # Crop using axis-aligned box
+    cropped = img_original[ry1:ry2, rx1:rx2]
+
+    # Encode cropped image to base64 for transmission
+    _, buffer = cv2.imencode('.jpg', cropped, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    cropped_base64 = base64.b64encode(buffer).decode('utf-8')
+
+    response = {
+        "detected": True,
+        "frame_quality": "ok",
+        "box": list(refined_box),  # Axis-aligned for compatibility
+        "confidence": detection["confidence"],
+        "original_size": {
+            "width": original_w,
+            "height": original_h
+        },
+        "refinement_applied": True,
+        "cropped_image": cropped_base64,
+        "crop_size": {
+            "width": cropped.shape[1],
+            "height": cropped.shape[0]
+        }
+    }
+
+    # Add rotated box if edge detection succeeded
+    if rotated_box is not None:
+        response["rotated_box"] = rotated_box
+        response["box_type"] = "rotated"
+        response["rotation_source"] = rotation_source
+    else:
+        response["rotated_box"] = [
+            [rx1, ry1], [rx2, ry1], [rx2, ry2], [rx1, ry2]
+        ]
+        response["box_type"] = "axis_aligned_fallback"
+
+    return response
+
+
 @app.post("/detect-live")
-async def detect_live(file: UploadFile = File(...)):
+async def detect_live(request: Request, file: UploadFile = File(...)):
     """
     FAST detection for live camera with TIGHT ROTATED bounding boxes
 
     Pipeline:
+    0. Quality gate: blurry / badly exposed frames are rejected without inference
     1. YOLO for rough localization
     2. Edge detection to find label contour
     3. Fit minimum area rotated rectangle to edges
@@ -489,7 +605,18 @@ async def detect_live(file: UploadFile = File(...)):
     Returns:
     - rotated_box: [[x1,y1], [x2,y2], [x3,y3], [x4,y4]] - exact label corners
     - box: [x1,y1,x2,y2] - axis-aligned bbox for compatibility
+    - frame_quality: "ok", or "blurry" / "dark" / "overexposed" when rejected
+
+    Frames are coalesced per client (X-Client-Id header): a frame that has not
+    started yet is answered with "superseded": true as soon as a newer frame
+    from the same client arrives. Clients over their rate get a 429.
     """
+    client_id = client_id_for(request)
+    try:
+        scheduler.admit(client_id, "live")
+    except RateLimited as e:
+        return rate_limited_response(e, {"detected": False})
+
     try:
         contents = await file.read()
         nparr = np.frombuffer(contents, np.uint8)
@@ -501,96 +628,250 @@ async def detect_live(file: UploadFile = File(...)):
 
         print(f"📸 Received image: {img_original.shape}")
 
-        original_h, original_w = img_original.shape[:2]
+        # === Quality gate: skip the model on frames that can't give a usable crop ===
+        if quality_gate.enabled:
+            quality = quality_gate.assess(img_original)
+            if quality["frame_quality"] != "ok":
+                print(f"⏭️  Frame rejected: {quality['frame_quality']}")
+                return {
+                    "detected": False,
+                    "frame_quality": quality["frame_quality"],
+                    "quality_metrics": quality["metrics"]
+                }
+
+        # === Latest frame wins: only the newest pending frame per client runs ===
+        status, response = await live_coalescer.submit(
+            client_id, request, process_live_frame, img_original
+        )
 
-        # Apply letterboxing for proper aspect ratio preservation
-        img_letterboxed, scale, padding = letterbox_image(img_original, target_size=640)
+        if status != "done":
+            return {"detected": False, "superseded": status == "superseded", "status": status}
 
-        # Run YOLO detection on letterboxed image
-        results = model(
-            img_letterboxed,
-            conf=CONF_THRESHOLD,
-            iou=IOU_THRESHOLD,
-            device=device,
-            verbose=False,
-            imgsz=640  # Explicit size to match letterboxing
-        )[0]
+        return response
 
-        if results.boxes is None or len(results.boxes) == 0:
-            print(f"❌ No detections found (threshold: {CONF_THRESHOLD})")
-            return {"detected": False}
+    except Exception as e:
+        print(f"Live detection error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return {"detected": False, "error": str(e)}
 
-        print(f"✅ Found {len(results.boxes)} detection(s)")
 
-        # Get best detection from YOLO (rough localization)
-        boxes = results.boxes.xyxy.cpu().numpy()
-        scores = results.boxes.conf.cpu().numpy()
+def process_stream_frame(img_original: np.ndarray, state: StreamState) -> dict:
+    """
+    /ws/live pipeline: same geometry as /detect-live, but the crop is only
+    encoded when the label moved since the last crop sent on this connection
+    """
+    start = time.perf_counter()
+    try:
+        return _stream_pipeline(img_original, state)
+    finally:
+        quality_gate.record_pipeline_time((time.perf_counter() - start) * 1000)
+
+
+def _stream_pipeline(img_original: np.ndarray, state: StreamState) -> dict:
+    original_h, original_w = img_original.shape[:2]
+
+    detection = run_detection(img_original, imgsz=state.imgsz)
+    if detection is None:
+        state.last_box = None
+        return {"detected": False}
+
+    rotated_box, refined_box, rotation_source = locate_label(img_original, detection)
+    rx1, ry1, rx2, ry2 = refined_box
+    state.last_box = refined_box
+
+    result = {
+        "detected": True,
+        "confidence": round(detection["confidence"], 4),
+        "box": list(refined_box),
+        "rotated_box": rotated_box if rotated_box is not None else [
+            [rx1, ry1], [rx2, ry1], [rx2, ry2], [rx1, ry2]
+        ],
+        "rotation_source": rotation_source if rotated_box is not None else "axis_aligned_fallback",
+        "size": [original_w, original_h]
+    }
 
-        best_idx = scores.argmax()
-        letterbox_coords = tuple(map(int, boxes[best_idx]))
+    if state.should_send_crop(refined_box):
+        cropped = img_original[ry1:ry2, rx1:rx2]
+        longest = max(cropped.shape[:2])
+        if state.crop_max_side and longest > state.crop_max_side:
+            factor = state.crop_max_side / longest
+            cropped = cv2.resize(cropped, (max(1, int(cropped.shape[1] * factor)),
+                                           max(1, int(cropped.shape[0] * factor))),
+                                 interpolation=cv2.INTER_AREA)
+        _, buffer = cv2.imencode('.jpg', cropped, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        result["cropped_image"] = base64.b64encode(buffer).decode('utf-8')
+        state.last_sent_crop_box = refined_box
+        state.crops_sent += 1
+    else:
+        result["crop_unchanged"] = state.crop_mode == "changed"
 
-        # Convert from letterboxed coordinates to original image coordinates
-        x1, y1, x2, y2 = unletterbox_coords(letterbox_coords, scale, padding)
+    return result
 
-        # Clamp to image bounds (safety)
-        x1 = max(0, min(x1, original_w))
-        y1 = max(0, min(y1, original_h))
-        x2 = max(0, min(x2, original_w))
-        y2 = max(0, min(y2, original_h))
 
-        yolo_box = (x1, y1, x2, y2)
+async def _read_stream(websocket: WebSocket, state: StreamState, slot: LatestFrameSlot):
+    """Socket reader: config messages are applied, frames go to the latest-frame slot"""
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            try:
+                if message.get("bytes") is not None:
+                    header, payload = parse_frame_message(message["bytes"])
+                    state.configure(header)
+                    state.frames_received += 1
+                    slot.put(header, payload)
+                elif message.get("text") is not None:
+                    settings = json.loads(message["text"])
+                    state.configure(settings)
+                    await websocket.send_text(json.dumps({"type": "config", **state.stats()}))
+            except ValueError as e:
+                await websocket.send_text(json.dumps({"error": str(e)}))
+    finally:
+        slot.close()
+
+
+@app.websocket("/ws/live")
+async def detect_live_stream(websocket: WebSocket):
+    """
+    Streaming variant of /detect-live over one persistent WebSocket.
+
+    See live_stream.py for the message format. Per frame the server only
+    decodes the JPEG and runs the live pipeline; frames that arrive while the
+    previous one is still queued replace it (latest frame wins). Results:
+    - seq: sequence number of the frame from its header
+    - detected, confidence, box, rotated_box, rotation_source, size
+    - cropped_image only when the label moved, else crop_unchanged: true
+    - frame_quality when the quality gate rejected the frame
+    - error: "rate_limited" with retry_after when over the live rate
+    """
+    await websocket.accept()
 
-        # === CRITICAL: Find precise rotated box from edges ===
-        rotated_box = refine_box_edges_rotated(img_original, yolo_box)
+    client_id = client_id_for(websocket)
+    state = StreamState(client_id, imgsz=INPUT_SIZE, max_imgsz=INPUT_SIZE)
+    slot = LatestFrameSlot(state)
+    live_streams[id(state)] = state
+    reader = asyncio.ensure_future(_read_stream(websocket, state, slot))
+    print(f"🔌 Live stream opened: {client_id}")
 
-        # Also get axis-aligned box for cropping
-        refined_box = refine_box_edges(img_original, yolo_box)
-        rx1, ry1, rx2, ry2 = refined_box
+    try:
+        while True:
+            frame = await slot.get()
+            if frame is None:
+                break
+            header, payload = frame
+            seq = header.get("seq")
+            start = time.perf_counter()
+
+            try:
+                scheduler.admit(client_id, "live")
+            except RateLimited as e:
+                await websocket.send_text(json.dumps({
+                    "seq": seq, "detected": False,
+                    "error": "rate_limited", "retry_after": round(e.retry_after, 2)
+                }))
+                continue
+
+            img_original = cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_COLOR)
+            if img_original is None:
+                await websocket.send_text(json.dumps({"seq": seq, "detected": False, "error": "invalid_image"}))
+                continue
+
+            if quality_gate.enabled:
+                quality = quality_gate.assess(img_original)
+                if quality["frame_quality"] != "ok":
+                    await websocket.send_text(json.dumps({
+                        "seq": seq, "detected": False, "frame_quality": quality["frame_quality"]
+                    }))
+                    continue
+
+            result = await scheduler.run(process_stream_frame, img_original, state,
+                                         client_id=client_id, request_class="live")
+            state.frames_processed += 1
+
+            result["seq"] = seq
+            result["ms"] = round((time.perf_counter() - start) * 1000, 1)
+            await websocket.send_text(json.dumps(result, separators=(",", ":")))
+
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"Live stream error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        reader.cancel()
+        live_streams.pop(id(state), None)
+        print(f"🔌 Live stream closed: {client_id} ({state.stats()})")
 
-        # Crop using axis-aligned box
-        cropped = img_original[ry1:ry2, rx1:rx2]
 
-        # Encode cropped image to base64 for transmission
-        _, buffer = cv2.imencode('.jpg', cropped, [cv2.IMWRITE_JPEG_QUALITY, 90])
-        cropped_base64 = base64.b64encode(buffer).decode('utf-8')
+def process_capture(img_original: np.ndarray) -> dict:
+    """/detect-and-crop pipeline on a decoded image"""
+    # Letterbox + YOLO (tiled for high-resolution photos), mapped back to original image coordinates
+    detection = run_detection(img_original, tiled=None)
 
-        response = {
-            "detected": True,
-            "box": list(refined_box),  # Axis-aligned for compatibility
-            "confidence": float(scores[best_idx]),
-            "original_size": {
-                "width": original_w,
-                "height": original_h
-            },
-            "refinement_applied": True,
-            "cropped_image": cropped_base64,
-            "crop_size": {
-                "width": cropped.shape[1],
-                "height": cropped.shape[0]
-            }
+    if detection is None:
+        return {
+            "detected": False,
+            "message": "No label detected"
         }
 
-        # Add rotated box if edge detection succeeded
-        if rotated_box is not None:
-            response["rotated_box"] = rotated_box
-            response["box_type"] = "rotated"
-        else:
-            response["rotated_box"] = [
-                [rx1, ry1], [rx2, ry1], [rx2, ry2], [rx1, ry2]
-            ]
-            response["box_type"] = "axis_aligned_fallback"
+    confidence = detection["confidence"]
+
+    # === CRITICAL: Precise refinement (OBB head or edge geometry) ===
+    rotated_box, refined_box, rotation_source = locate_label(img_original, detection)
+    rx1, ry1, rx2, ry2 = refined_box
+
+    # Crop using refined coordinates
+    cropped = img_original[ry1:ry2, rx1:rx2]
+
+    # Enhance for OCR (better text recognition)
+    enhanced = enhance_label_for_ocr(img_original, refined_box)
+
+    # Encode to base64 for transmission
+    _, buffer_enhanced = cv2.imencode('.jpg', enhanced, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    enhanced_base64 = base64.b64encode(buffer_enhanced).decode('utf-8')
+
+    _, buffer_crop = cv2.imencode('.jpg', cropped, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    cropped_base64 = base64.b64encode(buffer_crop).decode('utf-8')
+
+    response = {
+        "detected": True,
+        "confidence": confidence,
+        "box": {
+            "x1": rx1,
+            "y1": ry1,
+            "x2": rx2,
+            "y2": ry2
+        },
+        "cropped_image": cropped_base64,
+        "enhanced_image": enhanced_base64,
+        "crop_size": {
+            "width": cropped.shape[1],
+            "height": cropped.shape[0]
+        },
+        "refinement_applied": True,
+        "inference": detection["inference"]
+    }
 
-        return response
+    # Add rotated box if available
+    if rotated_box is not None:
+        response["rotated_box"] = rotated_box
+        response["box_type"] = "rotated"
+        response["rotation_source"] = rotation_source
+    else:
+        response["rotated_box"] = [
+            [rx1, ry1], [rx2, ry1], [rx2, ry2], [rx1, ry2]
+        ]
+        response["box_type"] = "axis_aligned_fallback"
 
-    except Exception as e:
-        print(f"Live detection error: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return {"detected": False, "error": str(e)}
+    return response
 
 
 @app.post("/detect-and-crop")
-async def detect_and_crop(file: UploadFile = File(...)):
+async def detect_and_crop(request: Request, file: UploadFile = File(...)):
     """
     Detect medicine label with TIGHT ROTATED bounding box and return cropped/enhanced images
 
@@ -605,6 +886,12 @@ async def detect_and_crop(file: UploadFile = File(...)):
     - cropped_image: Cropped label region
     - enhanced_image: OCR-optimized version
     """
+    client_id = client_id_for(request)
+    try:
+        scheduler.admit(client_id, "capture")
+    except RateLimited as e:
+        return rate_limited_response(e)
+
     try:
         # Read image
         contents = await file.read()
@@ -617,106 +904,125 @@ async def detect_and_crop(file: UploadFile = File(...)):
                 content={"error": "Invalid image file"}
             )
 
-        original_h, original_w = img_original.shape[:2]
+        return await scheduler.run(process_capture, img_original,
+                                   client_id=client_id, request_class="capture")
 
-        # Letterbox preprocessing for accurate detection
-        img_letterboxed, scale, padding = letterbox_image(img_original, target_size=640)
+    except Exception as e:
+        print(f"Processing error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return JSONResponse(
+            status_code=500,
+            content={"error": f"Processing failed: {str(e)}"}
+        )
 
-        # Detect label with YOLO
-        results = model(
-            img_letterboxed,
-            conf=CONF_THRESHOLD,
-            iou=IOU_THRESHOLD,
-            device=device,
-            verbose=False,
-            imgsz=640
-        )[0]
 
-        if results.boxes is None or len(results.boxes) == 0:
-            return {
-                "detected": False,
-                "message": "No label detected"
+def process_detect_all(img_original: np.ndarray) -> dict:
+    """/detect-all pipeline on a decoded image"""
+    detections, info = detect_all(img_original)
+    return {
+        "detected": bool(detections),
+        "count": len(detections),
+        "detections": [
+            {
+                "box": list(d["yolo_box"]),
+                "confidence": round(d["confidence"], 4),
+                "rotated_box": d["obb_points"]
             }
+            for d in detections
+        ],
+        "inference": info
+    }
 
-        # Get best detection
-        boxes = results.boxes.xyxy.cpu().numpy()
-        scores = results.boxes.conf.cpu().numpy()
 
-        best_idx = scores.argmax()
-        letterbox_coords = tuple(map(int, boxes[best_idx]))
-        confidence = float(scores[best_idx])
+@app.post("/detect-all")
+async def detect_all_labels(request: Request, file: UploadFile = File(...)):
+    """
+    Every label in a photo (shelf, tray of boxes), no refinement or crops.
 
-        # Convert to original image coordinates
-        x1, y1, x2, y2 = unletterbox_coords(letterbox_coords, scale, padding)
+    Images above TILED_MIN_SIDE are detected on overlapping full-resolution
+    tiles; `inference` reports the mode, number of model inputs and time.
+    """
+    client_id = client_id_for(request)
+    try:
+        scheduler.admit(client_id, "capture")
+    except RateLimited as e:
+        return rate_limited_response(e)
 
-        # Clamp to valid range
-        x1 = max(0, min(x1, original_w))
-        y1 = max(0, min(y1, original_h))
-        x2 = max(0, min(x2, original_w))
-        y2 = max(0, min(y2, original_h))
+    try:
+        contents = await file.read()
+        img_original = decode_image(contents)
 
-        yolo_box = (x1, y1, x2, y2)
+        if img_original is None:
+            return JSONResponse(
+                status_code=400,
+                content={"error": "Invalid image file"}
+            )
 
-        # === CRITICAL: Precise edge-based refinement ===
-        rotated_box = refine_box_edges_rotated(img_original, yolo_box)
-        refined_box = refine_box_edges(img_original, yolo_box)
-        rx1, ry1, rx2, ry2 = refined_box
+        return await scheduler.run(process_detect_all, img_original,
+                                   client_id=client_id, request_class="capture")
 
-        # Crop using refined coordinates
-        cropped = img_original[ry1:ry2, rx1:rx2]
+    except Exception as e:
+        print(f"Detection error: {str(e)}")
+        return JSONResponse(
+            status_code=500,
+            content={"error": f"Detection failed: {str(e)}"}
+        )
 
-        # Enhance for OCR (better text recognition)
-        enhanced = enhance_label_for_ocr(img_original, refined_box)
 
-        # Encode to base64 for transmission
-        _, buffer_enhanced = cv2.imencode('.jpg', enhanced, [cv2.IMWRITE_JPEG_QUALITY, 95])
-        enhanced_base64 = base64.b64encode(buffer_enhanced).decode('utf-8')
+def process_debug(img_original: np.ndarray) -> dict:
+    """/detect-debug pipeline on a decoded image"""
+    # Make a copy for annotation
+    annotated = img_original.copy()
 
-        _, buffer_crop = cv2.imencode('.jpg', cropped, [cv2.IMWRITE_JPEG_QUALITY, 95])
-        cropped_base64 = base64.b64encode(buffer_crop).decode('utf-8')
+    # Letterbox (or tile) and detect
+    detection = run_detection(img_original, tiled=None)
 
-        response = {
-            "detected": True,
-            "confidence": confidence,
-            "box": {
-                "x1": rx1,
-                "y1": ry1,
-                "x2": rx2,
-                "y2": ry2
-            },
-            "cropped_image": cropped_base64,
-            "enhanced_image": enhanced_base64,
-            "crop_size": {
-                "width": cropped.shape[1],
-                "height": cropped.shape[0]
-            },
-            "refinement_applied": True
-        }
+    if detection is None:
+        return {"detected": False, "message": "No label detected"}
 
-        # Add rotated box if available
-        if rotated_box is not None:
-            response["rotated_box"] = rotated_box
-            response["box_type"] = "rotated"
-        else:
-            response["rotated_box"] = [
-                [rx1, ry1], [rx2, ry1], [rx2, ry2], [rx1, ry2]
-            ]
-            response["box_type"] = "axis_aligned_fallback"
+    yolo_box = detection["yolo_box"]
+    x1, y1, x2, y2 = yolo_box
 
-        return response
+    # Draw YOLO box in RED
+    cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 0, 255), 3)
+    cv2.putText(annotated, "YOLO", (x1, y1 - 10),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
 
-    except Exception as e:
-        print(f"Processing error: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return JSONResponse(
-            status_code=500,
-            content={"error": f"Processing failed: {str(e)}"}
-        )
+    # Get precise rotated box
+    rotated_box, _, rotation_source = locate_label(img_original, detection)
+
+    if rotated_box is not None:
+        # Draw rotated box in GREEN
+        pts = np.array(rotated_box, dtype=np.int32)
+        cv2.polylines(annotated, [pts], True, (0, 255, 0), 3)
+        cv2.putText(annotated, "PRECISE", (pts[0][0], pts[0][1] - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+
+        # Also draw the detected contour in BLUE for verification
+        if rotation_source == "contour":
+            contour = find_label_contour(img_original, yolo_box)
+            if contour is not None:
+                cv2.drawContours(annotated, [contour], -1, (255, 100, 0), 2)
+
+    # Encode annotated image
+    _, buffer = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    annotated_base64 = base64.b64encode(buffer).decode('utf-8')
+
+    return {
+        "detected": True,
+        "annotated_image": annotated_base64,
+        "yolo_box": list(yolo_box),
+        "rotated_box": rotated_box,
+        "rotation_source": rotation_source,
+        "confidence": detection["confidence"],
+        "inference": detection["inference"],
+        "message": "Green = precise rotated box, Red = YOLO box, Blue = detected contour"
+    }
 
 
 @app.post("/detect-debug")
-async def detect_debug(file: UploadFile = File(...)):
+async def detect_debug(request: Request, file: UploadFile = File(...)):
     """
     Debug endpoint: Returns annotated image showing detection pipeline
 
@@ -727,6 +1033,12 @@ async def detect_debug(file: UploadFile = File(...)):
 
     Use this to verify that the rotated box aligns with physical label edges.
     """
+    client_id = client_id_for(request)
+    try:
+        scheduler.admit(client_id, "debug")
+    except RateLimited as e:
+        return rate_limited_response(e)
+
     try:
         contents = await file.read()
         nparr = np.frombuffer(contents, np.uint8)
@@ -738,80 +1050,195 @@ async def detect_debug(file: UploadFile = File(...)):
                 content={"error": "Invalid image file"}
             )
 
-        # Make a copy for annotation
-        annotated = img_original.copy()
-        original_h, original_w = img_original.shape[:2]
+        return await scheduler.run(process_debug, img_original,
+                                   client_id=client_id, request_class="debug")
 
-        # Letterbox and detect
-        img_letterboxed, scale, padding = letterbox_image(img_original, target_size=640)
+    except Exception as e:
+        print(f"Debug error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return JSONResponse(
+            status_code=500,
+            content={"error": str(e)}
+        )
 
-        results = model(
-            img_letterboxed,
-            conf=CONF_THRESHOLD,
-            iou=IOU_THRESHOLD,
-            device=device,
-            verbose=False,
-            imgsz=640
-        )[0]
 
-        if results.boxes is None or len(results.boxes) == 0:
-            return {"detected": False, "message": "No label detected"}
+# ==================================================
+# ADMIN: ON-DEMAND PROFILING
+# ==================================================
+# Disabled (404) unless ADMIN_TOKEN is set; callers send it as X-Admin-Token.
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+PROFILE_MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", "300"))
 
-        # Get YOLO box
-        boxes = results.boxes.xyxy.cpu().numpy()
-        scores = results.boxes.conf.cpu().numpy()
 
-        best_idx = scores.argmax()
-        letterbox_coords = tuple(map(int, boxes[best_idx]))
+@app.post("/admin/profile")
+async def admin_profile(request: Request, mode: str = "sample", seconds: float = 10.0,
+                        requests: int = 0, interval_ms: float = 5.0, top: int = 40):
+    """
+    Profile the live server, then return the report as text.
+
+    Query parameters:
+    - mode: sample (collapsed stacks for flamegraph.pl / speedscope),
+      cprofile (pstats of the scheduled model tasks) or
+      tracemalloc (allocation growth between start and end)
+    - seconds: session length (max PROFILE_MAX_SECONDS)
+    - requests: stop earlier, after this many model tasks (0 = time only)
+    - interval_ms: sampling period of mode=sample
+    - top: rows of the cprofile / tracemalloc report
+
+        curl -X POST -H "X-Admin-Token: $ADMIN_TOKEN" \
+            "http://localhost:8000/admin/profile?mode=sample&seconds=30" > stacks.txt
+    """
+    if not ADMIN_TOKEN:
+        return JSONResponse(status_code=404, content={"error": "Not found"})
+    if not hmac.compare_digest(request.headers.get("x-admin-token", ""), ADMIN_TOKEN):
+        return JSONResponse(status_code=401, content={"error": "Invalid admin token"})
 
-        x1, y1, x2, y2 = unletterbox_coords(letterbox_coords, scale, padding)
-        x1 = max(0, min(x1, original_w))
-        y1 = max(0, min(y1, original_h))
-        x2 = max(0, min(x2, original_w))
-        y2 = max(0, min(y2, original_h))
+    seconds = min(max(seconds, 0.1), PROFILE_MAX_SECONDS)
+    try:
+        session = profiler.start(mode, seconds, max(requests, 0),
+                                 interval_ms=max(interval_ms, 1.0), top=min(max(top, 1), 500))
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except RuntimeError as e:
+        return JSONResponse(status_code=409, content={"error": str(e)})
+
+    print(f"🔬 Profiling started: mode={mode} seconds={seconds} requests={requests or '-'}")
+    try:
+        deadline = time.perf_counter() + seconds
+        while not session.finished.is_set() and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+    finally:
+        # Snapshot diffs and report rendering can take a while: off the event loop
+        report = await asyncio.get_running_loop().run_in_executor(None, profiler.finish, session)
 
-        yolo_box = (x1, y1, x2, y2)
+    return PlainTextResponse(report)
 
-        # Draw YOLO box in RED
-        cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 0, 255), 3)
-        cv2.putText(annotated, "YOLO", (x1, y1 - 10),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
 
-        # Get precise rotated box
-        rotated_box = refine_box_edges_rotated(img_original, yolo_box)
+# ==================================================
+# END-TO-END SCAN (detect -> rectify -> OCR -> classify)
+# ==================================================
+def timed(fn, *args):
+    """Run fn(*args) and return (result, elapsed ms)"""
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
 
-        if rotated_box is not None:
-            # Draw rotated box in GREEN
-            pts = np.array(rotated_box, dtype=np.int32)
-            cv2.polylines(annotated, [pts], True, (0, 255, 0), 3)
-            cv2.putText(annotated, "PRECISE", (pts[0][0], pts[0][1] - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
 
-            # Also draw the detected contour in BLUE for verification
-            contour = find_label_contour(img_original, yolo_box)
-            if contour is not None:
-                cv2.drawContours(annotated, [contour], -1, (255, 100, 0), 2)
+def decode_image(contents: bytes) -> Optional[np.ndarray]:
+    return cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR)
+
+
+def scan_detect(img_original: np.ndarray) -> Optional[dict]:
+    """Model stage of /scan: best detection and its precise geometry"""
+    detection = run_detection(img_original, tiled=None)
+    if detection is None:
+        return None
+
+    rotated_box, refined_box, rotation_source = locate_label(img_original, detection)
+    return {
+        "confidence": detection["confidence"],
+        "box": list(refined_box),
+        "rotated_box": rotated_box,
+        "rotation_source": rotation_source if rotated_box is not None else "axis_aligned_fallback",
+        "inference": detection["inference"]
+    }
+
+
+def scan_rectify(img_original: np.ndarray, geometry: dict) -> np.ndarray:
+    """Upright label (perspective-corrected when a rotated box exists), binarized for Tesseract"""
+    if geometry["rotated_box"] is not None:
+        label = rectify_label(img_original, geometry["rotated_box"])
+    else:
+        x1, y1, x2, y2 = geometry["box"]
+        label = img_original[y1:y2, x1:x2]
+    return preprocess_image(label)
+
+
+def scan_ocr(processed: np.ndarray) -> str:
+    return clean_combined_text(extract_text_all_angles(processed, SCAN_OCR_ANGLES))
+
+
+@app.post("/scan")
+async def scan_label(request: Request, file: UploadFile = File(...)):
+    """
+    Image in, structured medicine fields out.
+
+    Pipeline (each stage on its own executor, so consecutive requests overlap):
+    1. decode
+    2. detect: YOLO + rotated box on the shared model slot
+    3. rectify: perspective warp of the label + OCR binarization
+    4. ocr: Tesseract on SCAN_OCR_ANGLES
+    5. classify: ExtracteurMedicaments.analyser_format_algerian
+
+    Returns:
+    - fields: nom_medicament, principe_actif, dosage, forme_pharmaceutique,
+      entreprise, numero_lot, date_fabrication, date_peremption, prix,
+      numero_enregistrement (lists, empty when not found)
+    - text: OCR text the fields were extracted from
+    - box / rotated_box / confidence of the detected label
+    - timings_ms: per stage, detect_queue = wait for the model slot
+    """
+    if not SCAN_AVAILABLE:
+        return JSONResponse(
+            status_code=503,
+            content={"error": "OCR stage unavailable (pytesseract not installed)"}
+        )
 
-        # Encode annotated image
-        _, buffer = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, 95])
-        annotated_base64 = base64.b64encode(buffer).decode('utf-8')
+    client_id = client_id_for(request)
+    try:
+        scheduler.admit(client_id, "scan")
+    except RateLimited as e:
+        return rate_limited_response(e)
+
+    try:
+        loop = asyncio.get_running_loop()
+        timings = {}
+        start = time.perf_counter()
+
+        contents = await file.read()
+        img_original, timings["decode"] = await loop.run_in_executor(prep_executor, timed, decode_image, contents)
+        if img_original is None:
+            return JSONResponse(
+                status_code=400,
+                content={"error": "Invalid image file"}
+            )
+
+        stage_start = time.perf_counter()
+        geometry, timings["detect"] = await scheduler.run(timed, scan_detect, img_original,
+                                                          client_id=client_id, request_class="scan")
+        timings["detect_queue"] = (time.perf_counter() - stage_start) * 1000 - timings["detect"]
+
+        if geometry is None:
+            timings["total"] = (time.perf_counter() - start) * 1000
+            return {
+                "detected": False,
+                "message": "No label detected",
+                "timings_ms": {k: round(v, 1) for k, v in timings.items()}
+            }
+
+        processed, timings["rectify"] = await loop.run_in_executor(prep_executor, timed, scan_rectify,
+                                                                   img_original, geometry)
+        text, timings["ocr"] = await loop.run_in_executor(ocr_executor, timed, scan_ocr, processed)
+        fields, timings["classify"] = await loop.run_in_executor(prep_executor, timed,
+                                                                 classifier.analyser_format_algerian, text)
+        timings["total"] = (time.perf_counter() - start) * 1000
 
         return {
             "detected": True,
-            "annotated_image": annotated_base64,
-            "yolo_box": list(yolo_box),
-            "rotated_box": rotated_box,
-            "confidence": float(scores[best_idx]),
-            "message": "Green = precise rotated box, Red = YOLO box, Blue = detected contour"
+            **geometry,
+            "fields": fields,
+            "text": text,
+            "timings_ms": {k: round(v, 1) for k, v in timings.items()}
         }
 
     except Exception as e:
-        print(f"Debug error: {str(e)}")
+        print(f"Scan error: {str(e)}")
         import traceback
         traceback.print_exc()
         return JSONResponse(
             status_code=500,
-            content={"error": str(e)}
+            content={"error": f"Scan failed: {str(e)}"}
         )
 
 
@@ -826,6 +1253,15 @@ if __name__ == "__main__":
     print(f"📱 Network: http://<YOUR_IP>:8000")
     print(f"🔧 Confidence Threshold: {CONF_THRESHOLD}")
     print(f"🔧 IoU Threshold: {IOU_THRESHOLD}")
+    print(f"🔧 Detection Mode: {DETECTION_MODE}")
+    print(f"🔧 Input Size: {INPUT_SIZE}")
+    print(f"🔧 Workers: {runtime_config['workers']} (torch {runtime_config['torch_threads']} threads, "
+          f"cv2 {runtime_config['cv2_threads']} threads, {runtime_config['source']})")
+    print(f"🔧 Tiled Inference: " + (f"above {TILED_MIN_SIDE} px ({TILE_OVERLAP:.0%} overlap, batch {TILE_BATCH})"
+                                     if TILED_MIN_SIDE > 0 else "off"))
+    print(f"🔧 Live Quality Gate: {'on' if quality_gate.enabled else 'off'}")
+    print("🔧 Per-client rate limits (req/s): " + ", ".join(
+        f"{name}={cfg['rate']:g}" for name, cfg in SCHEDULER_CLASSES.items()))
     print(f"⚡ Device: {'GPU - ' + torch.cuda.get_device_name(0) if torch.cuda.is_available() else 'CPU'}")
     print("\n✨ NEW in v3.0 - GEOMETRIC EDGE ALIGNMENT:")
     print("   • YOLO used ONLY for rough localization")
@@ -836,8 +1272,13 @@ if __name__ == "__main__":
     print("   • GUARANTEED tight fit regardless of rotation")
     print("\n📋 Endpoints:")
     print("   • /detect-live - Fast detection with rotated boxes")
+    print("   • /ws/live - Same as /detect-live over one persistent WebSocket")
     print("   • /detect-and-crop - Full pipeline with OCR enhancement")
+    print("   • /detect-all - Every label in a shelf/tray photo (tiled above TILED_MIN_SIDE)")
     print("   • /detect-debug - Visualize detection pipeline")
+    print(f"   • /scan - Detection + OCR + field extraction{'' if SCAN_AVAILABLE else ' (disabled)'}")
+    print("   • /stats - Runtime counters (quality gate, queue waits per class)")
+    print(f"   • /admin/profile - On-demand profiling{'' if ADMIN_TOKEN else ' (disabled, set ADMIN_TOKEN)'}")
     print("="*70 + "\n")
 
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
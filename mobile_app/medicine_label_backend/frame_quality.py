@@ -0,0 +1,152 @@
+"""
+Cheap pre-inference quality gate for live camera frames.
+
+Frames taken while the phone is still moving are motion-blurred and can never
+give a usable crop, so /detect-live rejects them before running YOLO and the
+contour refinement. All measurements run on a small grayscale thumbnail:
+
+    - sharpness: variance of the Laplacian
+    - gradient energy: mean squared Sobel magnitude (Tenengrad)
+    - gradient isotropy: smallest / largest eigenvalue of the gradient
+      structure tensor; motion blur smears edges along one direction only
+    - exposure: mean brightness and fraction of clipped pixels (histogram)
+
+A frame is "blurry" when BOTH sharpness and gradient energy are below their
+thresholds (defocus; sharp but low-texture labels are not rejected), or when
+its gradients are strongly one-directional AND its sharpness is below
+motion_blur_sharpness_factor x min_sharpness (motion blur, which leaves enough
+edges across the motion to pass the first test). Low isotropy alone is not
+blur: a crisp barcode or ruled box side has one-directional edges too.
+"""
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# Below ~480 px the downscale itself hides moderate motion blur
+THUMBNAIL_WIDTH = 480
+
+
+class FrameQualityGate:
+    """Thresholded blur/exposure check with counters of the inference it saved"""
+
+    def __init__(self, enabled: bool = True,
+                 min_sharpness: float = 100.0,
+                 min_gradient_energy: float = 4000.0,
+                 min_gradient_isotropy: float = 0.35,
+                 motion_blur_sharpness_factor: float = 3.0,
+                 min_brightness: float = 35.0,
+                 max_brightness: float = 225.0,
+                 max_clipped_fraction: float = 0.5):
+        self.enabled = enabled
+        self.min_sharpness = min_sharpness
+        self.min_gradient_energy = min_gradient_energy
+        self.min_gradient_isotropy = min_gradient_isotropy
+        self.motion_blur_sharpness_factor = motion_blur_sharpness_factor
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_clipped_fraction = max_clipped_fraction
+
+        self._lock = threading.Lock()
+        self._checked = 0
+        self._rejected = {"blurry": 0, "dark": 0, "overexposed": 0}
+        self._gate_ms = 0.0
+        # Running average of the full pipeline on accepted frames,
+        # used to estimate how much inference time the rejections saved
+        self._pipeline_ms_avg = None
+
+    def assess(self, img: np.ndarray) -> dict:
+        """
+        Returns:
+            frame_quality: "ok", "blurry", "dark" or "overexposed"
+            metrics: raw measurements (useful for tuning the thresholds)
+        """
+        start = time.perf_counter()
+
+        h, w = img.shape[:2]
+        scale = THUMBNAIL_WIDTH / w if w > THUMBNAIL_WIDTH else 1.0
+        thumb = cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY) if thumb.ndim == 3 else thumb
+
+        # Exposure from the histogram
+        hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+        total = hist.sum()
+        brightness = float(np.dot(hist, np.arange(256)) / total)
+        dark_clipped = float(hist[:11].sum() / total)
+        bright_clipped = float(hist[245:].sum() / total)
+
+        # Focus measures
+        sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+        gx = cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3)
+        gy = cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3)
+        jxx = float(np.mean(gx * gx))
+        jyy = float(np.mean(gy * gy))
+        jxy = float(np.mean(gx * gy))
+        gradient_energy = jxx + jyy
+        half_trace = gradient_energy / 2
+        spread = float(np.sqrt((jxx - jyy) ** 2 / 4 + jxy * jxy))
+        gradient_isotropy = (half_trace - spread) / (half_trace + spread) if gradient_energy > 0 else 1.0
+
+        if brightness < self.min_brightness or dark_clipped > self.max_clipped_fraction:
+            verdict = "dark"
+        elif brightness > self.max_brightness or bright_clipped > self.max_clipped_fraction:
+            verdict = "overexposed"
+        elif sharpness < self.min_sharpness and gradient_energy < self.min_gradient_energy:
+            verdict = "blurry"
+        elif (gradient_isotropy < self.min_gradient_isotropy
+              and sharpness < self.motion_blur_sharpness_factor * self.min_sharpness):
+            verdict = "blurry"
+        else:
+            verdict = "ok"
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        with self._lock:
+            self._checked += 1
+            self._gate_ms += elapsed_ms
+            if verdict != "ok":
+                self._rejected[verdict] += 1
+
+        return {
+            "frame_quality": verdict,
+            "metrics": {
+                "sharpness": round(sharpness, 1),
+                "gradient_energy": round(gradient_energy, 1),
+                "gradient_isotropy": round(gradient_isotropy, 3),
+                "brightness": round(brightness, 1),
+                "dark_clipped": round(dark_clipped, 3),
+                "bright_clipped": round(bright_clipped, 3),
+            }
+        }
+
+    def record_pipeline_time(self, elapsed_ms: float):
+        """Report the detection pipeline time of a frame that passed the gate"""
+        with self._lock:
+            if self._pipeline_ms_avg is None:
+                self._pipeline_ms_avg = elapsed_ms
+            else:
+                self._pipeline_ms_avg = 0.9 * self._pipeline_ms_avg + 0.1 * elapsed_ms
+
+    def stats(self) -> dict:
+        with self._lock:
+            rejected = sum(self._rejected.values())
+            avg = self._pipeline_ms_avg
+            return {
+                "enabled": self.enabled,
+                "thresholds": {
+                    "min_sharpness": self.min_sharpness,
+                    "min_gradient_energy": self.min_gradient_energy,
+                    "min_gradient_isotropy": self.min_gradient_isotropy,
+                    "min_brightness": self.min_brightness,
+                    "max_brightness": self.max_brightness,
+                    "max_clipped_fraction": self.max_clipped_fraction,
+                },
+                "frames_checked": self._checked,
+                "frames_rejected": rejected,
+                "rejected_by_reason": dict(self._rejected),
+                "rejection_rate": round(rejected / self._checked, 3) if self._checked else 0.0,
+                "gate_time_ms_avg": round(self._gate_ms / self._checked, 2) if self._checked else 0.0,
+                "pipeline_time_ms_avg": None if avg is None else round(avg, 1),
+                "inference_saved_ms_est": None if avg is None else round(rejected * avg, 1),
+            }
@@ -0,0 +1,639 @@
+"""
+Shared label localization helpers for the detection backend.
+
+Nothing here loads a model at import time, so offline tools (label
+conversion, benchmarks) can reuse exactly the same code as the server.
+"""
+import cv2
+import numpy as np
+from typing import Tuple, List, Optional
+
+
+# ==================================================
+# MODEL LOADING
+# ==================================================
+def load_model(path: str):
+    """
+    Load YOLO weights with the PyTorch 2.10+ compatibility fix
+    (weights_only check disabled for our trusted model)
+    """
+    import torch
+    from ultralytics import YOLO
+
+    # Temporarily override torch.load to allow model loading
+    original_torch_load = torch.load
+
+    def _patched_torch_load(*args, **kwargs):
+        kwargs['weights_only'] = False
+        return original_torch_load(*args, **kwargs)
+
+    torch.load = _patched_torch_load
+    try:
+        return YOLO(path)
+    finally:
+        # Restore original torch.load
+        torch.load = original_torch_load
+
+
+# ==================================================
+# LETTERBOX COORDINATE MAPPING
+# ==================================================
+def letterbox_image(img: np.ndarray, target_size: int = 640) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+    """
+    Resize image with letterboxing to maintain aspect ratio
+    This prevents distortion and ensures accurate bounding boxes
+    
+    Returns: 
+        letterboxed_image: Padded image (target_size x target_size)
+        scale_factor: Resize ratio applied
+        (pad_w, pad_h): Padding offsets added
+    """
+    h, w = img.shape[:2]
+    
+    # Calculate scale to fit target size while preserving aspect ratio
+    scale = min(target_size / h, target_size / w)
+    
+    # New dimensions after scaling
+    new_w = int(w * scale)
+    new_h = int(h * scale)
+    
+    # Resize image
+    resized = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    
+    # Calculate padding to center the image
+    pad_w = (target_size - new_w) // 2
+    pad_h = (target_size - new_h) // 2
+    
+    # Add padding (gray color matching YOLO default)
+    letterboxed = cv2.copyMakeBorder(
+        resized,
+        pad_h, target_size - new_h - pad_h,  # top, bottom
+        pad_w, target_size - new_w - pad_w,  # left, right
+        cv2.BORDER_CONSTANT,
+        value=(114, 114, 114)  # Gray padding
+    )
+    
+    return letterboxed, scale, (pad_w, pad_h)
+
+
+def unletterbox_coords(box: Tuple[int, int, int, int], scale: float, 
+                       padding: Tuple[int, int]) -> Tuple[int, int, int, int]:
+    """
+    Convert bounding box coordinates from letterboxed image back to original image
+    
+    Steps:
+    1. Remove padding offset
+    2. Scale back by inverse of resize ratio
+    """
+    x1, y1, x2, y2 = box
+    pad_w, pad_h = padding
+    
+    # Remove padding offset
+    x1 = x1 - pad_w
+    y1 = y1 - pad_h
+    x2 = x2 - pad_w
+    y2 = y2 - pad_h
+    
+    # Scale back to original size
+    x1 = int(x1 / scale)
+    y1 = int(y1 / scale)
+    x2 = int(x2 / scale)
+    y2 = int(y2 / scale)
+    
+    return (x1, y1, x2, y2)
+
+
+def unletterbox_points(points: np.ndarray, scale: float,
+                       padding: Tuple[int, int]) -> np.ndarray:
+    """
+    Same mapping as unletterbox_coords() for an (N, 2) array of corner points
+    (used for oriented boxes, which have 4 free corners instead of x1/y1/x2/y2)
+    """
+    pad_w, pad_h = padding
+    mapped = np.asarray(points, dtype=np.float32).copy()
+    mapped[:, 0] = (mapped[:, 0] - pad_w) / scale
+    mapped[:, 1] = (mapped[:, 1] - pad_h) / scale
+    return mapped
+
+
+def clamp_box(box: Tuple[int, int, int, int], width: int, height: int) -> Tuple[int, int, int, int]:
+    """Clamp an (x1, y1, x2, y2) box to the image bounds"""
+    x1, y1, x2, y2 = box
+    return (
+        max(0, min(x1, width)),
+        max(0, min(y1, height)),
+        max(0, min(x2, width)),
+        max(0, min(y2, height))
+    )
+
+
+def all_detections(results, scale: float, padding: Tuple[int, int],
+                   image_shape: Tuple[int, ...]) -> List[dict]:
+    """
+    Every detection of a YOLO result computed on a letterboxed image (or a
+    tile: scale 1, padding = minus the tile origin), mapped back to original
+    image coordinates.
+
+    Works for both model heads:
+    - detect: results.boxes (axis-aligned only)
+    - obb:    results.obb (4 rotated corners straight from the network)
+
+    Each detection:
+        yolo_box: (x1, y1, x2, y2) clamped axis-aligned box
+        confidence: detection score
+        obb_points: [[x,y] x4] clamped rotated corners, or None for the detect head
+    """
+    original_h, original_w = image_shape[:2]
+
+    obb = getattr(results, "obb", None)
+    if obb is not None and len(obb) > 0:
+        detections = []
+        for corners, score in zip(obb.xyxyxyxy.cpu().numpy(), obb.conf.cpu().numpy()):
+            corners = unletterbox_points(corners, scale, padding)
+            corners[:, 0] = np.clip(corners[:, 0], 0, original_w)
+            corners[:, 1] = np.clip(corners[:, 1], 0, original_h)
+            corners = corners.astype(int)
+
+            yolo_box = (
+                int(corners[:, 0].min()),
+                int(corners[:, 1].min()),
+                int(corners[:, 0].max()),
+                int(corners[:, 1].max())
+            )
+            detections.append({
+                "yolo_box": yolo_box,
+                "confidence": float(score),
+                "obb_points": corners.tolist()
+            })
+        return detections
+
+    if results.boxes is None or len(results.boxes) == 0:
+        return []
+
+    return [
+        {
+            "yolo_box": clamp_box(
+                unletterbox_coords(tuple(map(int, box)), scale, padding),
+                original_w, original_h
+            ),
+            "confidence": float(score),
+            "obb_points": None
+        }
+        for box, score in zip(results.boxes.xyxy.cpu().numpy(), results.boxes.conf.cpu().numpy())
+    ]
+
+
+def best_detection(results, scale: float, padding: Tuple[int, int],
+                   image_shape: Tuple[int, ...]) -> Optional[dict]:
+    """
+    Pick the highest-confidence detection from a YOLO result computed on a
+    letterboxed image and map it back to original image coordinates
+    (see all_detections() for the returned fields).
+
+    Returns None if nothing was detected.
+    """
+    detections = all_detections(results, scale, padding, image_shape)
+    if not detections:
+        return None
+    return max(detections, key=lambda d: d["confidence"])
+
+
+# ==================================================
+# TILED INFERENCE (high-resolution photos)
+# ==================================================
+def tile_starts(length: int, tile: int, overlap: float) -> List[int]:
+    """Start offsets of overlapping windows covering [0, length), the last one flush with the end"""
+    if length <= tile:
+        return [0]
+    stride = max(1, int(tile * (1 - overlap)))
+    starts = list(range(0, length - tile, stride))
+    starts.append(length - tile)
+    return starts
+
+
+def make_tiles(img: np.ndarray, tile: int = 640,
+               overlap: float = 0.2) -> Tuple[List[np.ndarray], List[Tuple[int, int]]]:
+    """
+    Cut the image into overlapping tile x tile crops at full resolution.
+    A side shorter than the tile is padded gray (bottom/right, so the
+    origin mapping stays a pure offset).
+
+    Returns: crops, (x0, y0) origin of each crop
+    """
+    h, w = img.shape[:2]
+    tiles, origins = [], []
+    for y0 in tile_starts(h, tile, overlap):
+        for x0 in tile_starts(w, tile, overlap):
+            crop = img[y0:y0 + tile, x0:x0 + tile]
+            if crop.shape[:2] != (tile, tile):
+                crop = cv2.copyMakeBorder(
+                    crop, 0, tile - crop.shape[0], 0, tile - crop.shape[1],
+                    cv2.BORDER_CONSTANT, value=(114, 114, 114)
+                )
+            tiles.append(crop)
+            origins.append((x0, y0))
+    return tiles, origins
+
+
+def intersection_over_smaller(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """Intersection area / area of the smaller box, between one box and an (N, 4) array"""
+    inter = ((np.minimum(box[2], boxes[:, 2]) - np.maximum(box[0], boxes[:, 0])).clip(0) *
+             (np.minimum(box[3], boxes[:, 3]) - np.maximum(box[1], boxes[:, 1])).clip(0))
+    area = max(box[2] - box[0], 0) * max(box[3] - box[1], 0)
+    areas = (boxes[:, 2] - boxes[:, 0]).clip(0) * (boxes[:, 3] - boxes[:, 1]).clip(0)
+    return inter / np.maximum(np.minimum(area, areas), 1e-6)
+
+
+def box_iou(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """IoU between one box and an (N, 4) array"""
+    inter = ((np.minimum(box[2], boxes[:, 2]) - np.maximum(box[0], boxes[:, 0])).clip(0) *
+             (np.minimum(box[3], boxes[:, 3]) - np.maximum(box[1], boxes[:, 1])).clip(0))
+    area = max(box[2] - box[0], 0) * max(box[3] - box[1], 0)
+    areas = (boxes[:, 2] - boxes[:, 0]).clip(0) * (boxes[:, 3] - boxes[:, 1]).clip(0)
+    return inter / np.maximum(area + areas - inter, 1e-6)
+
+
+def seam_cut(box: Tuple[int, int, int, int], origin: Tuple[int, int], tile: int,
+             image_shape: Tuple[int, ...], margin: int) -> bool:
+    """True if the box touches a border of its tile that lies inside the image (label cut by the tile)"""
+    x0, y0 = origin
+    h, w = image_shape[:2]
+    x1, y1, x2, y2 = box
+    return bool((x0 > 0 and x1 <= x0 + margin) or (y0 > 0 and y1 <= y0 + margin) or
+                (x0 + tile < w and x2 >= x0 + tile - margin) or
+                (y0 + tile < h and y2 >= y0 + tile - margin))
+
+
+def merge_detections(detections: List[dict], threshold: float = 0.5, nms_iou: float = 0.45,
+                     tile_ids: Optional[List[int]] = None,
+                     cut: Optional[List[bool]] = None) -> Tuple[List[dict], List[bool]]:
+    """
+    Greedy merge of detections coming from overlapping tiles, highest
+    confidence first.
+
+    - IoU above nms_iou: the same label seen whole by two tiles, the less
+      confident box is dropped (plain NMS).
+    - Intersection over the SMALLER box above threshold, between boxes of
+      different tiles of which one touches a tile seam (`cut`): the pieces of
+      a label cut by a tile border. They have a low IoU but lie inside each
+      other's extent; axis-aligned pieces are unioned and the grown box is
+      matched again, so a label spanning several tiles ends up in one box.
+      OBB detections keep the corners of the most confident piece.
+
+    Two whole boxes side by side are never unioned, however close they are.
+
+    Returns: merged detections, whether each one still contains a cut piece
+    """
+    if not detections:
+        return [], []
+
+    boxes = np.array([d["yolo_box"] for d in detections], dtype=np.float32)
+    scores = np.array([d["confidence"] for d in detections], dtype=np.float32)
+    tile_ids = np.zeros(len(detections), dtype=int) if tile_ids is None else np.asarray(tile_ids)
+    cut = np.zeros(len(detections), dtype=bool) if cut is None else np.asarray(cut, dtype=bool)
+
+    order = np.argsort(-scores, kind="stable")
+    merged, merged_cut = [], []
+    while order.size:
+        i, rest = order[0], order[1:]
+        detection = dict(detections[i])
+        box = boxes[i].copy()
+        tiles = {tile_ids[i]}
+        group_cut = bool(cut[i])
+        absorbed = np.zeros(rest.size, dtype=bool)
+
+        while rest.size:
+            duplicate = (box_iou(box, boxes[rest]) > nms_iou) & ~absorbed
+            seam = ((intersection_over_smaller(box, boxes[rest]) > threshold) & ~absorbed & ~duplicate
+                    & (cut[rest] | group_cut) & ~np.isin(tile_ids[rest], list(tiles)))
+            if not (duplicate.any() or seam.any()):
+                break
+            absorbed |= duplicate | seam
+            if not seam.any():
+                continue
+            tiles.update(tile_ids[rest[seam]].tolist())
+            group_cut |= bool(cut[rest[seam]].any())
+            if detection["obb_points"] is None:
+                group = boxes[rest[seam]]
+                box = np.array([
+                    min(box[0], group[:, 0].min()), min(box[1], group[:, 1].min()),
+                    max(box[2], group[:, 2].max()), max(box[3], group[:, 3].max())
+                ], dtype=np.float32)
+
+        if detection["obb_points"] is None:
+            detection["yolo_box"] = tuple(int(v) for v in box)
+        merged.append(detection)
+        merged_cut.append(group_cut)
+        order = rest[~absorbed]
+    return merged, merged_cut
+
+
+def add_full_frame_detections(merged: List[dict], merged_cut: List[bool], full: List[dict],
+                              tile: int, threshold: float = 0.5, nms_iou: float = 0.45) -> List[dict]:
+    """
+    Combine the letterboxed full-frame detections with the merged tile ones.
+
+    The full frame is coarse: one of its boxes may span several neighbouring
+    labels. A full-frame box is therefore only kept when no tile detection
+    overlaps it (IoU above nms_iou or intersection over the smaller box above
+    threshold: a label the tiles missed), or when it is larger than a tile and
+    everything it overlaps is made of cut pieces: the pieces are then replaced
+    by the whole box. Otherwise (whole labels seen by the tiles, duplicates)
+    the tile detections win.
+    """
+    merged = list(merged)
+    merged_cut = list(merged_cut)
+    for detection in sorted(full, key=lambda d: d["confidence"], reverse=True):
+        box = np.array(detection["yolo_box"], dtype=np.float32)
+        if merged:
+            boxes = np.array([d["yolo_box"] for d in merged], dtype=np.float32)
+            overlapping = np.flatnonzero((box_iou(box, boxes) > nms_iou) |
+                                         (intersection_over_smaller(box, boxes) > threshold))
+        else:
+            overlapping = np.array([], dtype=int)
+
+        if overlapping.size:
+            larger_than_tile = max(box[2] - box[0], box[3] - box[1]) > tile
+            if not (larger_than_tile and all(merged_cut[k] for k in overlapping)):
+                continue
+            keep = [k for k in range(len(merged)) if k not in set(overlapping.tolist())]
+            merged = [merged[k] for k in keep]
+            merged_cut = [merged_cut[k] for k in keep]
+
+        merged.append(detection)
+        merged_cut.append(False)
+    return merged
+
+
+def tiled_detections(model, img: np.ndarray, tile: int = 640, overlap: float = 0.2,
+                     batch: int = 8, merge_threshold: float = 0.5, nms_iou: float = 0.45,
+                     **predict_kwargs) -> Tuple[List[dict], int]:
+    """
+    Detect on overlapping full-resolution tiles plus the letterboxed full
+    frame (labels larger than a tile are only whole at that scale), sent to
+    the model `batch` images at a time, and merge everything in original
+    image coordinates (merge_detections, then add_full_frame_detections).
+
+    Returns: merged detections sorted by confidence, number of model inputs
+    """
+    tiles, origins = make_tiles(img, tile, overlap)
+    full, scale, padding = letterbox_image(img, target_size=tile)
+
+    frames = tiles + [full]
+    mappings = [(1.0, (-x0, -y0)) for x0, y0 in origins] + [(scale, padding)]
+    margin = max(2, tile // 100)
+
+    tile_detections, tile_ids, cut, full_detections = [], [], [], []
+    for i in range(0, len(frames), batch):
+        results = model(frames[i:i + batch], imgsz=tile, **predict_kwargs)
+        for k, (result, (s, pad)) in enumerate(zip(results, mappings[i:i + batch]), start=i):
+            detections = all_detections(result, s, pad, img.shape)
+            if k == len(tiles):
+                full_detections.extend(detections)
+                continue
+            for detection in detections:
+                tile_detections.append(detection)
+                tile_ids.append(k)
+                cut.append(seam_cut(detection["yolo_box"], origins[k], tile, img.shape, margin))
+
+    merged, merged_cut = merge_detections(tile_detections, merge_threshold, nms_iou, tile_ids, cut)
+    merged = add_full_frame_detections(merged, merged_cut, full_detections, tile, merge_threshold, nms_iou)
+    return sorted(merged, key=lambda d: d["confidence"], reverse=True), len(frames)
+
+
+# ==================================================
+# EDGE-BASED ROTATED BOX REFINEMENT
+# ==================================================
+def find_label_contour(img: np.ndarray, yolo_box: Tuple[int, int, int, int],
+                       expand_margin: int = 20) -> Optional[np.ndarray]:
+    """
+    GEOMETRIC EDGE DETECTION: Find the precise label contour using edge analysis.
+
+    This function treats label detection as a pure geometry problem:
+    1. Extract YOLO region (rough localization)
+    2. Apply multi-stage edge detection
+    3. Find dominant rectangular contour (the label boundary)
+    4. Return the contour points for rotated rectangle fitting
+
+    Returns: Contour points (Nx1x2 array) or None if detection fails
+    """
+    x1, y1, x2, y2 = yolo_box
+    h, w = img.shape[:2]
+
+    # Expand search region slightly beyond YOLO box
+    search_x1 = max(0, x1 - expand_margin)
+    search_y1 = max(0, y1 - expand_margin)
+    search_x2 = min(w, x2 + expand_margin)
+    search_y2 = min(h, y2 + expand_margin)
+
+    # Extract ROI
+    roi = img[search_y1:search_y2, search_x1:search_x2].copy()
+
+    if roi.size == 0 or roi.shape[0] < 30 or roi.shape[1] < 30:
+        return None
+
+    try:
+        # === STEP 1: Grayscale and denoising ===
+        gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+
+        # Bilateral filter: preserves edges while removing noise
+        denoised = cv2.bilateralFilter(gray, 9, 75, 75)
+
+        # === STEP 2: Multi-threshold edge detection ===
+        # Use adaptive thresholding to handle varying lighting
+        adaptive_thresh = cv2.adaptiveThreshold(
+            denoised, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+            cv2.THRESH_BINARY, 11, 2
+        )
+
+        # Canny edge detection with low thresholds for label boundaries
+        edges = cv2.Canny(denoised, 20, 80)
+
+        # Combine both edge detection methods
+        combined_edges = cv2.bitwise_or(edges, cv2.bitwise_not(adaptive_thresh))
+
+        # === STEP 3: Morphological operations to connect edges ===
+        # Close gaps in the label boundary
+        kernel_close = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
+        closed = cv2.morphologyEx(combined_edges, cv2.MORPH_CLOSE, kernel_close, iterations=2)
+
+        # Dilate slightly to ensure connected boundary
+        kernel_dilate = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+        dilated = cv2.dilate(closed, kernel_dilate, iterations=1)
+
+        # === STEP 4: Find contours ===
+        contours, _ = cv2.findContours(
+            dilated, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+        )
+
+        if not contours:
+            return None
+
+        # === STEP 5: Select the label contour ===
+        # Filter by area: must occupy significant portion of ROI
+        roi_area = roi.shape[0] * roi.shape[1]
+        min_area = roi_area * 0.15  # At least 15% of ROI
+        max_area = roi_area * 0.95  # At most 95% of ROI
+
+        valid_contours = [
+            cnt for cnt in contours
+            if min_area < cv2.contourArea(cnt) < max_area
+        ]
+
+        if not valid_contours:
+            return None
+
+        # Choose largest valid contour (most likely the label)
+        label_contour = max(valid_contours, key=cv2.contourArea)
+
+        # === STEP 6: Refine contour using convex hull ===
+        # This removes internal noise and gives us the outer boundary
+        hull = cv2.convexHull(label_contour)
+
+        # Approximate to polygon to reduce noise
+        epsilon = 0.01 * cv2.arcLength(hull, True)
+        approx = cv2.approxPolyDP(hull, epsilon, True)
+
+        # Map contour back to original image coordinates
+        approx_mapped = approx.copy()
+        approx_mapped[:, 0, 0] += search_x1
+        approx_mapped[:, 0, 1] += search_y1
+
+        return approx_mapped
+
+    except Exception as e:
+        print(f"Contour detection failed: {e}")
+        return None
+
+
+def get_rotated_box_from_contour(contour: np.ndarray) -> Tuple[List[List[int]], Tuple[int, int, int, int]]:
+    """
+    Fit a minimum area rotated rectangle to the detected contour.
+
+    Returns:
+        - rotated_points: 4 corner points [[x1,y1], [x2,y2], [x3,y3], [x4,y4]]
+        - axis_aligned_bbox: (x1, y1, x2, y2) for compatibility
+    """
+    # Fit minimum area rectangle (can be rotated)
+    rect = cv2.minAreaRect(contour)
+
+    # Get the 4 corner points of the rotated rectangle
+    box_points = cv2.boxPoints(rect)
+    box_points = box_points.astype(int)  # Fixed: np.int0 deprecated in NumPy 2.0+
+
+    # Convert to list format for JSON serialization
+    rotated_points = box_points.tolist()
+
+    # Also compute axis-aligned bounding box for compatibility
+    x_coords = box_points[:, 0]
+    y_coords = box_points[:, 1]
+
+    axis_aligned_bbox = (
+        int(x_coords.min()),
+        int(y_coords.min()),
+        int(x_coords.max()),
+        int(y_coords.max())
+    )
+
+    return rotated_points, axis_aligned_bbox
+
+
+def refine_box_edges(img: np.ndarray, box: Tuple[int, int, int, int],
+                     expand_margin: int = 20) -> Tuple[int, int, int, int]:
+    """
+    PRECISION EDGE-BASED REFINEMENT using rotated rectangle fitting.
+
+    Pipeline:
+    1. Use YOLO box for rough localization
+    2. Find label contour using edge geometry
+    3. Fit minimum area (rotated) rectangle to contour
+    4. Return axis-aligned bbox (for backward compatibility)
+
+    Note: Use refine_box_edges_rotated() to get the full rotated box
+    """
+    contour = find_label_contour(img, box, expand_margin)
+
+    if contour is None:
+        return box
+
+    # Get rotated box
+    _, axis_aligned = get_rotated_box_from_contour(contour)
+
+    # Validation: ensure reasonable size
+    x1, y1, x2, y2 = axis_aligned
+    h, w = img.shape[:2]
+
+    # Clamp to image bounds
+    x1 = max(0, min(x1, w))
+    y1 = max(0, min(y1, h))
+    x2 = max(0, min(x2, w))
+    y2 = max(0, min(y2, h))
+
+    # Ensure minimum size
+    if (x2 - x1) < 30 or (y2 - y1) < 30:
+        return box
+
+    # Validate area change is reasonable
+    original_area = (box[2] - box[0]) * (box[3] - box[1])
+    refined_area = (x2 - x1) * (y2 - y1)
+
+    if refined_area < original_area * 0.15 or refined_area > original_area * 1.8:
+        return box
+
+    return (x1, y1, x2, y2)
+
+
+def refine_box_edges_rotated(img: np.ndarray, box: Tuple[int, int, int, int],
+                              expand_margin: int = 20) -> Optional[List[List[int]]]:
+    """
+    FULL ROTATED RECTANGLE REFINEMENT - returns 4 corner points.
+
+    This is the PRIMARY function for tight label detection.
+    Returns a rotated rectangle that hugs the label edges precisely.
+
+    Returns:
+        [[x1,y1], [x2,y2], [x3,y3], [x4,y4]] - 4 corners of rotated rect
+        or None if detection fails
+    """
+    contour = find_label_contour(img, box, expand_margin)
+
+    if contour is None:
+        return None
+
+    # Get rotated box points
+    rotated_points, _ = get_rotated_box_from_contour(contour)
+
+    return rotated_points
+
+
+# ==================================================
+# RECTIFICATION (for OCR)
+# ==================================================
+def order_corners(points) -> np.ndarray:
+    """Order 4 corners as top-left, top-right, bottom-right, bottom-left"""
+    pts = np.array(points, dtype=np.float32).reshape(4, 2)
+    sums = pts.sum(axis=1)
+    diffs = np.diff(pts, axis=1).ravel()
+    return np.array([
+        pts[np.argmin(sums)],
+        pts[np.argmin(diffs)],
+        pts[np.argmax(sums)],
+        pts[np.argmax(diffs)]
+    ], dtype=np.float32)
+
+
+def rectify_label(img: np.ndarray, corners) -> np.ndarray:
+    """
+    Warp the rotated label region to an upright rectangle, so the text
+    lines are horizontal (or vertical) instead of skewed for the OCR.
+    """
+    src = order_corners(corners)
+    tl, tr, br, bl = src
+    width = int(round(max(np.linalg.norm(tr - tl), np.linalg.norm(br - bl))))
+    height = int(round(max(np.linalg.norm(bl - tl), np.linalg.norm(br - tr))))
+    width, height = max(width, 1), max(height, 1)
+
+    dst = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], dtype=np.float32)
+    matrix = cv2.getPerspectiveTransform(src, dst)
+    return cv2.warpPerspective(img, matrix, (width, height),
+                               flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
@@ -0,0 +1,141 @@
+"""
+Wire format and per-connection state of the /ws/live streaming endpoint.
+
+One WebSocket replaces the multipart POST the app sends to /detect-live on
+every scan tick, so the steady-state cost of a frame is JPEG decode +
+inference. Each binary message is
+
+    [4 bytes: header length N, big-endian][N bytes: UTF-8 JSON header][JPEG bytes]
+
+The header carries the frame sequence number and, optionally, settings that
+stick for the rest of the connection (text messages {"type": "config", ...}
+set them too):
+
+    seq         int, echoed back in the result
+    imgsz       network input size for this connection (multiple of 32)
+    crop        "changed" (default) | "always" | "never"
+    crop_max    longest side of the returned crop in px (0 = full resolution)
+    crop_iou    IoU above which the box counts as unchanged (default 0.9)
+
+Results are compact JSON text messages. When the label has not moved since
+the last crop that was sent, the crop is omitted and "crop_unchanged": true
+tells the client to keep its previous one.
+"""
+import asyncio
+import json
+import struct
+from typing import Optional, Tuple
+
+HEADER_LENGTH = struct.Struct(">I")
+MAX_HEADER_BYTES = 4096
+CROP_MODES = ("changed", "always", "never")
+
+
+def parse_frame_message(data: bytes) -> Tuple[dict, bytes]:
+    """Split a binary message into (header, jpeg bytes); raises ValueError if malformed"""
+    if len(data) < HEADER_LENGTH.size:
+        raise ValueError("Message shorter than the header length prefix")
+    (length,) = HEADER_LENGTH.unpack_from(data)
+    if length > MAX_HEADER_BYTES or HEADER_LENGTH.size + length > len(data):
+        raise ValueError(f"Invalid header length: {length}")
+
+    header_end = HEADER_LENGTH.size + length
+    header = json.loads(data[HEADER_LENGTH.size:header_end].decode("utf-8")) if length else {}
+    if not isinstance(header, dict):
+        raise ValueError("Header must be a JSON object")
+    return header, data[header_end:]
+
+
+def box_iou(a, b) -> float:
+    """IoU of two (x1, y1, x2, y2) boxes in pixels"""
+    iw = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    ih = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = iw * ih
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class StreamState:
+    """Settings and memory of one /ws/live connection"""
+
+    def __init__(self, client_id: str, imgsz: int, max_imgsz: int):
+        self.client_id = client_id
+        self.imgsz = imgsz
+        self.max_imgsz = max_imgsz
+        self.crop_mode = "changed"
+        self.crop_max_side = 0
+        self.crop_iou = 0.9
+
+        self.last_box: Optional[Tuple[int, int, int, int]] = None
+        self.last_sent_crop_box: Optional[Tuple[int, int, int, int]] = None
+        self.frames_received = 0
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.crops_sent = 0
+
+    def configure(self, settings: dict):
+        """Apply the recognized keys of a header / config message, validating each"""
+        if "imgsz" in settings:
+            imgsz = int(settings["imgsz"])
+            if imgsz % 32 != 0 or not 32 <= imgsz <= self.max_imgsz:
+                raise ValueError(f"imgsz must be a multiple of 32 in [32, {self.max_imgsz}]: {imgsz}")
+            self.imgsz = imgsz
+        if "crop" in settings:
+            if settings["crop"] not in CROP_MODES:
+                raise ValueError(f"crop must be one of {CROP_MODES}: {settings['crop']}")
+            self.crop_mode = settings["crop"]
+        if "crop_max" in settings:
+            self.crop_max_side = max(0, int(settings["crop_max"]))
+        if "crop_iou" in settings:
+            self.crop_iou = min(1.0, max(0.0, float(settings["crop_iou"])))
+
+    def should_send_crop(self, box: Tuple[int, int, int, int]) -> bool:
+        if self.crop_mode == "never":
+            return False
+        if self.crop_mode == "always" or self.last_sent_crop_box is None:
+            return True
+        return box_iou(box, self.last_sent_crop_box) < self.crop_iou
+
+    def stats(self) -> dict:
+        return {
+            "imgsz": self.imgsz,
+            "crop": self.crop_mode,
+            "frames_received": self.frames_received,
+            "frames_processed": self.frames_processed,
+            "frames_dropped": self.frames_dropped,
+            "crops_sent": self.crops_sent,
+        }
+
+
+class LatestFrameSlot:
+    """
+    Single-slot mailbox between the socket reader and the inference loop:
+    a frame that arrives while the previous one is still waiting replaces it
+    (the WebSocket counterpart of LatestFrameCoalescer).
+    """
+
+    def __init__(self, state: StreamState):
+        self.state = state
+        self._frame = None
+        self._closed = False
+        self._ready = asyncio.Event()
+
+    def put(self, header: dict, payload: bytes):
+        if self._frame is not None:
+            self.state.frames_dropped += 1
+        self._frame = (header, payload)
+        self._ready.set()
+
+    def close(self):
+        self._closed = True
+        self._ready.set()
+
+    async def get(self) -> Optional[Tuple[dict, bytes]]:
+        """Next frame, or None once the connection is closed"""
+        while self._frame is None:
+            if self._closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        frame, self._frame = self._frame, None
+        return frame
@@ -0,0 +1,376 @@
+"""
+Load generator and soak test for the detection server.
+
+Replays dataset images against a running backend_server.py (or one started
+here with --start-server) at a target request rate and endpoint mix, from
+many simulated phones (one X-Client-Id each, so the per-client rate limits
+behave as in production). Every --interval seconds it prints and records:
+requests sent, 200s, 429s, errors (5xx / timeouts / connection failures),
+latency percentiles of the successful requests and the server RSS.
+
+Soak mode (--soak-hours) runs the same load for hours and fits a line to
+the RSS samples after warm-up: a steady slope means memory grows in the
+decode / encode / inference path. Pair it with
+POST /admin/profile?mode=tracemalloc to find the allocation sites.
+
+    python load_test.py --rate 5 --duration 120 --mix detect-live=0.8,detect-and-crop=0.2
+    python load_test.py --start-server --soak-hours 4 --rate 2 --csv soak.csv
+
+Needs httpx (pip install httpx); psutil is optional and only used to read
+the server RSS where /proc is not available.
+
+Arrivals are open loop (Poisson by default): a slow server does not slow the
+generator down; requests beyond --concurrency in flight are skipped and
+counted instead of piling up.
+"""
+import argparse
+import asyncio
+import csv
+import glob
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import cv2
+import httpx
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(HERE, "..", ".."))
+DEFAULT_IMAGES = os.path.join(PROJECT_ROOT, "medicine_dataset", "images", "**", "*.jpg")
+ENDPOINTS = ("detect-live", "detect-and-crop", "detect", "detect-debug", "detect-all", "scan")
+
+
+# ==================================================
+# INPUTS
+# ==================================================
+def parse_mix(text: str) -> Dict[str, float]:
+    """"detect-live=0.8,detect-and-crop=0.2" -> normalized weights"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.strip().partition("=")
+        name = name.strip().lstrip("/")
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint in --mix: {name} (expected one of {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError("--mix weights must add up to more than 0")
+    return {name: weight / total for name, weight in mix.items()}
+
+
+def load_images(pattern: str, limit: int, max_side: int) -> List[bytes]:
+    """JPEG payloads, resized like a phone upload when max_side is set"""
+    paths = sorted(glob.glob(pattern, recursive=True))[:limit or None]
+    payloads = []
+    for path in paths:
+        if not max_side:
+            with open(path, "rb") as f:
+                payloads.append(f.read())
+            continue
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        scale = max_side / max(img.shape[:2])
+        if scale < 1:
+            img = cv2.resize(img, (int(img.shape[1] * scale), int(img.shape[0] * scale)),
+                             interpolation=cv2.INTER_AREA)
+        payloads.append(cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes())
+    return payloads
+
+
+# ==================================================
+# SERVER
+# ==================================================
+def rss_mb(pid: Optional[int]) -> Optional[float]:
+    """Resident memory of a process in MB (psutil, else /proc on Linux)"""
+    if not pid:
+        return None
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss / 1e6
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024 / 1e6
+    except OSError:
+        return None
+    return None
+
+
+def start_server(url: str) -> subprocess.Popen:
+    port = urlparse(url).port or 8000
+    print(f"🚀 Starting backend on port {port}...")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend_server:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=HERE
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient, url: str, timeout: float,
+                     server: Optional[subprocess.Popen] = None):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            if (await client.get(f"{url}/", timeout=5)).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(1)
+    raise RuntimeError(f"Server not ready after {timeout:.0f}s: {url}")
+
+
+# ==================================================
+# RECORDING
+# ==================================================
+def percentile(values: List[float], q: float) -> Optional[float]:
+    return round(float(np.percentile(values, q)), 1) if values else None
+
+
+class Recorder:
+    """Per-endpoint totals plus the current reporting window"""
+
+    def __init__(self, endpoints):
+        self.totals = {name: {"sent": 0, "ok": 0, "rate_limited": 0, "errors": 0, "latencies": []}
+                       for name in endpoints}
+        self.skipped = 0
+        self.window = self._empty_window()
+
+    @staticmethod
+    def _empty_window():
+        return {"sent": 0, "ok": 0, "rate_limited": 0, "errors": 0, "skipped": 0, "latencies": []}
+
+    def sent(self, endpoint: str):
+        self.totals[endpoint]["sent"] += 1
+        self.window["sent"] += 1
+
+    def skip(self):
+        self.skipped += 1
+        self.window["skipped"] += 1
+
+    def done(self, endpoint: str, status: Optional[int], latency_ms: float):
+        if status == 200:
+            key = "ok"
+            self.totals[endpoint]["latencies"].append(latency_ms)
+            self.window["latencies"].append(latency_ms)
+        elif status == 429:
+            key = "rate_limited"
+        else:
+            key = "errors"
+        self.totals[endpoint][key] += 1
+        self.window[key] += 1
+
+    def window_row(self, elapsed: float, rss: Optional[float]) -> dict:
+        w, self.window = self.window, self._empty_window()
+        return {
+            "elapsed_s": round(elapsed, 1),
+            "sent": w["sent"],
+            "ok": w["ok"],
+            "rate_limited": w["rate_limited"],
+            "errors": w["errors"],
+            "skipped": w["skipped"],
+            "p50_ms": percentile(w["latencies"], 50),
+            "p95_ms": percentile(w["latencies"], 95),
+            "p99_ms": percentile(w["latencies"], 99),
+            "server_rss_mb": None if rss is None else round(rss, 1),
+        }
+
+    def summary(self) -> List[dict]:
+        rows = []
+        for name, t in self.totals.items():
+            finished = t["ok"] + t["rate_limited"] + t["errors"]
+            rows.append({
+                "endpoint": f"/{name}",
+                "sent": t["sent"],
+                "ok": t["ok"],
+                "rate_limited": t["rate_limited"],
+                "errors": t["errors"],
+                "error_rate": round(t["errors"] / finished, 4) if finished else None,
+                "p50_ms": percentile(t["latencies"], 50),
+                "p90_ms": percentile(t["latencies"], 90),
+                "p99_ms": percentile(t["latencies"], 99),
+                "max_ms": round(max(t["latencies"]), 1) if t["latencies"] else None,
+            })
+        return rows
+
+
+def rss_slope_mb_per_hour(rows: List[dict], warmup_fraction: float = 0.1) -> Optional[float]:
+    """Least-squares RSS trend after warm-up (None with fewer than 3 samples)"""
+    samples = [(r["elapsed_s"], r["server_rss_mb"]) for r in rows if r["server_rss_mb"] is not None]
+    samples = samples[int(len(samples) * warmup_fraction):]
+    if len(samples) < 3:
+        return None
+    t, rss = np.array(samples).T
+    return float(np.polyfit(t / 3600, rss, 1)[0])
+
+
+def print_table(rows: List[dict]):
+    header = list(rows[0].keys())
+    print("\n| " + " | ".join(header) + " |")
+    print("|" + "---|" * len(header))
+    for row in rows:
+        print("| " + " | ".join("" if row[k] is None else str(row[k]) for k in header) + " |")
+
+
+# ==================================================
+# LOAD
+# ==================================================
+async def send(client: httpx.AsyncClient, url: str, endpoint: str, payload: bytes,
+               client_id: str, recorder: Recorder, timeout: float):
+    recorder.sent(endpoint)
+    start = time.perf_counter()
+    try:
+        response = await client.post(
+            f"{url}/{endpoint}",
+            files={"file": ("frame.jpg", payload, "image/jpeg")},
+            headers={"X-Client-Id": client_id},
+            timeout=timeout
+        )
+        status = response.status_code
+    except httpx.HTTPError:
+        status = None
+    recorder.done(endpoint, status, (time.perf_counter() - start) * 1000)
+
+
+async def run_load(args, payloads: List[bytes], mix: Dict[str, float],
+                   server: Optional[subprocess.Popen]) -> List[dict]:
+    recorder = Recorder(mix)
+    rows = []
+    rng = random.Random(args.seed)
+    endpoints, weights = list(mix), list(mix.values())
+    client_ids = [f"loadtest-{i:03d}" for i in range(args.clients)]
+    server_pid = server.pid if server is not None else args.server_pid
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(limits=limits) as client:
+        await wait_ready(client, args.url, args.ready_timeout, server)
+        print(f"📈 {args.rate:g} req/s for {args.duration:.0f}s, mix "
+              + ", ".join(f"/{e}={w:.0%}" for e, w in mix.items())
+              + f", {len(payloads)} images, {args.clients} clients")
+
+        in_flight = set()
+        start = time.perf_counter()
+        next_arrival = start
+        next_report = start + args.interval
+        i = 0
+
+        while True:
+            now = time.perf_counter()
+            if now - start >= args.duration:
+                break
+
+            if now >= next_report:
+                rows.append(recorder.window_row(now - start, rss_mb(server_pid)))
+                row = rows[-1]
+                print(f"⏱️ {row['elapsed_s']:>7.0f}s  sent {row['sent']:>4}  ok {row['ok']:>4}  "
+                      f"429 {row['rate_limited']:>3}  err {row['errors']:>3}  skip {row['skipped']:>3}  "
+                      f"p50 {row['p50_ms']} p95 {row['p95_ms']} p99 {row['p99_ms']} ms  "
+                      f"rss {row['server_rss_mb']} MB")
+                next_report += args.interval
+                if server is not None and server.poll() is not None:
+                    print(f"❌ Server exited with code {server.returncode}")
+                    break
+
+            if now >= next_arrival:
+                if len(in_flight) >= args.concurrency:
+                    recorder.skip()
+                else:
+                    endpoint = rng.choices(endpoints, weights)[0]
+                    task = asyncio.ensure_future(send(
+                        client, args.url, endpoint, payloads[i % len(payloads)],
+                        client_ids[i % len(client_ids)], recorder, args.timeout))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+                    i += 1
+                gap = rng.expovariate(args.rate) if args.arrivals == "poisson" else 1 / args.rate
+                next_arrival += gap
+
+            await asyncio.sleep(max(0.0, min(next_arrival, next_report) - time.perf_counter()))
+
+        if in_flight:
+            await asyncio.wait(in_flight, timeout=args.timeout)
+        rows.append(recorder.window_row(time.perf_counter() - start, rss_mb(server_pid)))
+
+    print_table(recorder.summary())
+    if recorder.skipped:
+        print(f"\n⚠️ {recorder.skipped} requests skipped: {args.concurrency} already in flight (server saturated)")
+    return rows
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load generator / soak test for backend_server.py")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--start-server", action="store_true", help="Launch backend_server.py (uvicorn) first")
+    parser.add_argument("--server-pid", type=int, help="PID of an already running server, for RSS sampling")
+    parser.add_argument("--images", default=DEFAULT_IMAGES, help="Glob of images to replay")
+    parser.add_argument("--limit", type=int, default=0, help="Use at most this many images")
+    parser.add_argument("--max-side", type=int, default=1280, help="Resize uploads like the app (0 = send files as is)")
+    parser.add_argument("--mix", default="detect-live=0.8,detect-and-crop=0.2", help="endpoint=weight,...")
+    parser.add_argument("--rate", type=float, default=5.0, help="Requests per second (all clients)")
+    parser.add_argument("--arrivals", choices=["poisson", "constant"], default="poisson")
+    parser.add_argument("--clients", type=int, default=20, help="Distinct X-Client-Id values")
+    parser.add_argument("--concurrency", type=int, default=64, help="Max requests in flight")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout (s)")
+    parser.add_argument("--duration", type=float, default=60.0, help="Test length (s)")
+    parser.add_argument("--soak-hours", type=float, help="Soak mode: run this many hours (overrides --duration)")
+    parser.add_argument("--interval", type=float, default=10.0, help="Reporting / RSS sampling period (s)")
+    parser.add_argument("--leak-threshold", type=float, default=20.0,
+                        help="RSS growth (MB/hour) reported as a probable leak")
+    parser.add_argument("--ready-timeout", type=float, default=180.0, help="Wait for the server to answer /")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--csv", help="Write the per-interval time series here")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.soak_hours:
+        args.duration = args.soak_hours * 3600
+        args.interval = max(args.interval, 30.0)
+    args.url = args.url.rstrip("/")
+    mix = parse_mix(args.mix)
+
+    payloads = load_images(args.images, args.limit, args.max_side)
+    if not payloads:
+        print(f"❌ No images found: {args.images}")
+        sys.exit(1)
+
+    server = start_server(args.url) if args.start_server else None
+    try:
+        rows = asyncio.run(run_load(args, payloads, mix, server))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    if args.csv and rows:
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"\n💾 Saved: {args.csv}")
+
+    rss = [r["server_rss_mb"] for r in rows if r["server_rss_mb"] is not None]
+    if rss:
+        print(f"\n🧠 Server RSS: start {rss[0]:.0f} MB, end {rss[-1]:.0f} MB, max {max(rss):.0f} MB")
+        slope = rss_slope_mb_per_hour(rows)
+        if slope is not None:
+            verdict = "⚠️ probable leak" if slope > args.leak_threshold else "✅ stable"
+            print(f"   Trend after warm-up: {slope:+.1f} MB/hour ({verdict}, threshold {args.leak_threshold:g})")
+    elif not args.start_server and not args.server_pid:
+        print("\nℹ️ Pass --server-pid (or --start-server) to track server memory")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+On-demand profiling of the running backend (POST /admin/profile).
+
+Nothing runs until a session is started, and only one session runs at a
+time. A session ends after `requests` model tasks have completed (everything
+that goes through FairScheduler.run) or after `seconds`, whichever is first.
+
+Modes:
+    sample      a background thread samples the stacks of every thread each
+                `interval_ms` (sys._current_frames). Output: collapsed stacks,
+                one "thread;outer;...;inner count" line per stack, for
+                flamegraph.pl or speedscope. Idle threads (waiting on a lock,
+                a queue or the event loop selector) are left out.
+    cprofile    deterministic cProfile of each scheduled model task (the
+                thread that runs it), merged across tasks. Output: pstats
+                sorted by cumulative time. Stages outside the scheduler
+                (/scan rectify / OCR executors) are only visible in "sample".
+    tracemalloc snapshot at start and at the end. Output: the allocation sites
+                whose memory grew the most in between (memory growth hunting).
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Callable, Optional
+
+MODES = ("sample", "cprofile", "tracemalloc")
+
+# Leaf frames of threads that are parked, not working
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Counts the collapsed stacks of all other threads every `interval` seconds"""
+
+    def __init__(self, interval: float = 0.005, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+                if not self.include_idle and leaf in IDLE_LEAVES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.counts[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+class ProfileSession:
+    def __init__(self, mode: str, seconds: float, requests: int, interval_ms: float, top: int):
+        self.mode = mode
+        self.seconds = seconds
+        self.max_requests = requests
+        self.top = top
+        self.requests_done = 0
+        self.started = time.perf_counter()
+        self.finished = threading.Event()
+        self.lock = threading.Lock()
+
+        self.sampler = StackSampler(interval_ms / 1000) if mode == "sample" else None
+        self.stats: Optional[pstats.Stats] = None
+        self.snapshot = None
+        self.started_tracemalloc = False
+
+    def begin(self):
+        if self.mode == "sample":
+            self.sampler.start()
+        elif self.mode == "tracemalloc":
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(25)
+                self.started_tracemalloc = True
+            self.snapshot = tracemalloc.take_snapshot()
+
+    def task_done(self):
+        with self.lock:
+            self.requests_done += 1
+            if self.max_requests and self.requests_done >= self.max_requests:
+                self.finished.set()
+
+    def add_profile(self, profile: cProfile.Profile):
+        with self.lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+
+    def end(self) -> str:
+        """Stop collecting and render the report"""
+        elapsed = time.perf_counter() - self.started
+        header = (f"# mode={self.mode} seconds={elapsed:.1f} requests={self.requests_done}\n")
+
+        if self.mode == "sample":
+            self.sampler.stop()
+            return header + f"# samples={self.sampler.samples}\n" + self.sampler.collapsed()
+
+        if self.mode == "cprofile":
+            with self.lock:
+                if self.stats is None:
+                    return header + "# no scheduled task completed\n"
+                out = io.StringIO()
+                self.stats.stream = out
+                self.stats.sort_stats("cumulative").print_stats(self.top)
+                return header + out.getvalue()
+
+        after = tracemalloc.take_snapshot()
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        diff = after.filter_traces(ignore).compare_to(self.snapshot.filter_traces(ignore), "lineno")
+        growth = sum(d.size_diff for d in diff)
+        lines = [header, f"# total growth: {growth / 1024:.1f} KiB\n"]
+        lines.extend(f"{d}\n" for d in diff[:self.top])
+        return "".join(lines)
+
+
+class Profiler:
+    """
+    Owner of the (single) profiling session.
+
+    FairScheduler calls wrap(fn) for every task; without a session it
+    returns fn itself, so the disabled cost is one attribute check.
+    """
+
+    def __init__(self):
+        self.session: Optional[ProfileSession] = None
+
+    @property
+    def busy(self) -> bool:
+        return self.session is not None
+
+    def start(self, mode: str, seconds: float, requests: int = 0,
+              interval_ms: float = 5.0, top: int = 40) -> ProfileSession:
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode: {mode} (expected one of {', '.join(MODES)})")
+        if self.session is not None:
+            raise RuntimeError("A profiling session is already running")
+        session = ProfileSession(mode, seconds, requests, interval_ms, top)
+        session.begin()
+        self.session = session
+        return session
+
+    def finish(self, session: ProfileSession) -> str:
+        self.session = None
+        return session.end()
+
+    def wrap(self, fn: Callable) -> Callable:
+        session = self.session
+        if session is None:
+            return fn
+
+        def profiled(*args, **kwargs):
+            if session.mode != "cprofile":
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    session.task_done()
+
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12+: one active profiler per process, another task holds it
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    session.task_done()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.disable()
+                session.add_profile(profile)
+                session.task_done()
+
+        return profiled
@@ -0,0 +1,245 @@
+"""
+Inference worker / thread-pool sizing for the detection backend.
+
+Every request runs letterbox + YOLO (torch intra-op pool) and the contour
+refinement (OpenCV pool) on a scheduler slot. Left alone, torch and OpenCV
+each start one thread per core *per concurrent caller*, so with several
+slots busy the cores are oversubscribed and latency collapses.
+
+At startup the backend measures the real workload on this machine for a
+few (workers x torch threads x cv2 threads) combinations, keeps the one
+with the highest throughput and applies it:
+
+    torch.set_num_threads / cv2.setNumThreads   process-wide pools
+    FairScheduler.workers                        concurrent inference slots
+    ModelPool                                    one YOLO instance per slot
+                                                 (predictors are not thread safe)
+
+Results are cached per (machine, model, input size) in AUTOTUNE_CACHE, so a
+restart does not measure again. Environment overrides (each one pins that
+dimension; with all three set nothing is measured):
+
+    WORKERS, TORCH_THREADS, CV2_THREADS
+    AUTOTUNE=0            skip measuring: 1 worker, torch and cv2 on every core
+    AUTOTUNE_SECONDS      measuring time per combination (default 2)
+    AUTOTUNE_CACHE        cache file ("" = always measure)
+    AUTOTUNE_IMAGE        image the workload runs on (default test.jpg)
+"""
+import json
+import os
+import platform
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+
+# ==================================================
+# MODEL POOL
+# ==================================================
+class ModelPool:
+    """
+    Drop-in replacement for a YOLO model shared by several threads:
+    pool(img, ...) checks out a free instance for the duration of the call.
+    Size it to the number of scheduler slots so a call never waits.
+    """
+
+    def __init__(self, loader: Callable[[], object], size: int = 1):
+        self.loader = loader
+        self.instances: List[object] = []
+        self.free: "queue.Queue" = queue.Queue()
+        self.lock = threading.Lock()
+        self.resize(size)
+
+    @property
+    def size(self) -> int:
+        return len(self.instances)
+
+    def resize(self, size: int):
+        """Load or drop instances (only call while no inference is running)"""
+        with self.lock:
+            while len(self.instances) < size:
+                instance = self.loader()
+                self.instances.append(instance)
+                self.free.put(instance)
+            while len(self.instances) > max(size, 1):
+                instance = self.free.get_nowait()
+                self.instances.remove(instance)
+
+    def __call__(self, *args, **kwargs):
+        instance = self.free.get()
+        try:
+            return instance(*args, **kwargs)
+        finally:
+            self.free.put(instance)
+
+    def __getattr__(self, name):
+        # names, task, ... are the same on every instance
+        return getattr(self.instances[0], name)
+
+
+# ==================================================
+# CONFIGURATIONS
+# ==================================================
+def usable_cores() -> int:
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+
+
+def default_config(cores: int) -> dict:
+    """Single slot using every core (the behaviour before tuning)"""
+    return {"workers": 1, "torch_threads": cores, "cv2_threads": cores}
+
+
+def env_overrides() -> Dict[str, int]:
+    overrides = {}
+    for key, var in (("workers", "WORKERS"), ("torch_threads", "TORCH_THREADS"), ("cv2_threads", "CV2_THREADS")):
+        if os.environ.get(var):
+            overrides[key] = int(os.environ[var])
+    return overrides
+
+
+def candidate_configs(cores: int, overrides: Optional[Dict[str, int]] = None) -> List[dict]:
+    """
+    Combinations worth measuring: workers x torch threads never far above
+    the core count, cv2 either single-threaded or sharing the worker's cores
+    """
+    overrides = overrides or {}
+    workers_options = [overrides["workers"]] if "workers" in overrides else \
+        sorted({w for w in (1, 2, 4) if w <= max(1, cores)})
+
+    configs = []
+    for workers in workers_options:
+        per_worker = max(1, cores // workers)
+        torch_options = [overrides["torch_threads"]] if "torch_threads" in overrides else \
+            sorted({per_worker, max(1, per_worker // 2)})
+        cv2_options = [overrides["cv2_threads"]] if "cv2_threads" in overrides else \
+            sorted({1, per_worker})
+        for torch_threads in torch_options:
+            for cv2_threads in cv2_options:
+                configs.append({"workers": workers, "torch_threads": torch_threads, "cv2_threads": cv2_threads})
+    return configs
+
+
+def apply_threads(config: dict):
+    import cv2
+    import torch
+
+    torch.set_num_threads(config["torch_threads"])
+    cv2.setNumThreads(config["cv2_threads"])
+
+
+# ==================================================
+# MEASUREMENT
+# ==================================================
+def measure_config(workload: Callable[[np.ndarray], None], image: np.ndarray,
+                   config: dict, seconds: float) -> dict:
+    """Run `workers` threads looping on workload(image) for `seconds`: throughput + latency"""
+    apply_threads(config)
+    workload(image)  # warm-up (thread pools start lazily)
+
+    latencies: List[float] = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def loop():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            workload(image)
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=loop) for _ in range(config["workers"])]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    samples = np.array(latencies)
+    return {
+        **config,
+        "requests_per_s": round(len(samples) / wall, 2),
+        "latency_ms_p50": round(float(np.percentile(samples, 50)), 1),
+        "latency_ms_p95": round(float(np.percentile(samples, 95)), 1),
+    }
+
+
+def cache_key(model_path: str, input_size: int, overrides: Dict[str, int]) -> str:
+    pinned = ",".join(f"{k}={v}" for k, v in sorted(overrides.items()))
+    return f"{platform.node()}|{usable_cores()}|{os.path.abspath(model_path)}|{input_size}|{pinned}"
+
+
+def load_cached(path: str, key: str) -> Optional[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get(key)
+    except (OSError, ValueError):
+        return None
+
+
+def save_cached(path: str, key: str, result: dict):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    data[key] = result
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
+def autotune(workload: Callable[[np.ndarray], None], image: np.ndarray, pool: ModelPool,
+             model_path: str, input_size: int, cache_path: Optional[str] = None,
+             seconds: Optional[float] = None) -> dict:
+    """
+    Pick (workers, torch threads, cv2 threads) for this machine and apply the
+    thread counts; resizes `pool` to the chosen workers.
+
+    Returns: {"workers", "torch_threads", "cv2_threads", "source", "measurements"}
+    with source one of "env", "cache", "autotune", "default".
+    """
+    cores = usable_cores()
+    overrides = env_overrides()
+    seconds = float(seconds or os.environ.get("AUTOTUNE_SECONDS", "2"))
+    key = cache_key(model_path, input_size, overrides)
+
+    if len(overrides) == 3:
+        result = {**overrides, "source": "env", "measurements": []}
+    elif os.environ.get("AUTOTUNE", "1") == "0":
+        result = {**default_config(cores), **overrides, "source": "default", "measurements": []}
+    else:
+        cached = load_cached(cache_path, key) if cache_path else None
+        if cached:
+            result = {**cached, "source": "cache"}
+        else:
+            configs = candidate_configs(cores, overrides)
+            pool.resize(max(c["workers"] for c in configs))
+            measurements = []
+            for config in configs:
+                measured = measure_config(workload, image, config, seconds)
+                print(f"   ⏱️ workers={config['workers']} torch={config['torch_threads']} "
+                      f"cv2={config['cv2_threads']}: {measured['requests_per_s']} req/s, "
+                      f"p95 {measured['latency_ms_p95']} ms")
+                measurements.append(measured)
+
+            # Highest throughput; among near-ties (within 5%) the lowest p95
+            top = max(m["requests_per_s"] for m in measurements)
+            best = min((m for m in measurements if m["requests_per_s"] >= 0.95 * top),
+                       key=lambda m: m["latency_ms_p95"])
+            result = {
+                "workers": best["workers"],
+                "torch_threads": best["torch_threads"],
+                "cv2_threads": best["cv2_threads"],
+                "source": "autotune",
+                "measurements": measurements
+            }
+            if cache_path:
+                save_cached(cache_path, key, {k: v for k, v in result.items() if k != "source"})
+
+    apply_threads(result)
+    pool.resize(result["workers"])
+    return result
@@ -0,0 +1,361 @@
+"""
+Admission control in front of the inference workers.
+
+Every endpoint shares a fixed number of inference slots (one YOLO instance
+each, sized by runtime_tuning), so all model work goes through FairScheduler
+and runs in the threadpool instead of blocking the event loop.
+
+FairScheduler orders waiting requests with start-time fair queueing: every
+(client, request class) pair is a flow, and a flow is charged the measured
+service time of its class divided by the class weight. A client looping on
+the expensive /detect-and-crop path therefore only delays itself, and live
+frames (high weight, cheap) keep a predictable latency under mixed load.
+Per-client token buckets reject floods before they ever reach the queue.
+
+/detect-live additionally goes through LatestFrameCoalescer: phones post a
+frame every 800 ms with a 2 s timeout, so on a loaded server a frame that has
+not started yet is worthless once a newer frame from the same client
+arrives. The newer frame takes its place in the queue, and frames whose client
+has disconnected are dropped (or aborted between pipeline stages).
+"""
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import HTTPConnection, Request
+
+# Number of recent queue waits kept per class for the percentiles in stats()
+WAIT_WINDOW = 1000
+# Token buckets of idle clients are dropped once this many exist
+MAX_BUCKETS = 4096
+
+
+def client_id_for(request: HTTPConnection) -> str:
+    """
+    Identify the sending device (HTTP request or WebSocket): X-Client-Id /
+    X-Session-Id header, then a session_id query parameter, then the client
+    IP as a last resort
+    """
+    for header in ("x-client-id", "x-session-id"):
+        value = request.headers.get(header)
+        if value:
+            return value
+    session_id = request.query_params.get("session_id")
+    if session_id:
+        return session_id
+    return request.client.host if request.client else "unknown"
+
+
+class RateLimited(Exception):
+    """Raised by FairScheduler.admit() when a client is out of tokens"""
+
+    def __init__(self, client_id: str, request_class: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded for {client_id} on {request_class}")
+        self.client_id = client_id
+        self.request_class = request_class
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """`rate` tokens per second, at most `burst` saved up"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> float:
+        """Consume one token; returns 0 on success, else seconds until one is available"""
+        self._refill(time.monotonic())
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def is_full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.burst
+
+
+class _ClassStats:
+    def __init__(self):
+        self.admitted = 0
+        self.rate_limited = 0
+        self.served = 0
+        self.waits_ms = deque(maxlen=WAIT_WINDOW)
+        # Running average of the service time, used as the WFQ cost of the class
+        self.service_ms_avg = None
+
+
+class FairScheduler:
+    """
+    Weighted fair queueing over a bounded number of inference slots.
+
+    classes maps a request class name to
+        weight: share of the slots when every class is backlogged (> 0)
+        rate:   sustained requests per second allowed per client (> 0)
+        burst:  requests a client may send back to back (>= 1)
+
+    Usage:
+        scheduler.admit(client_id, "capture")      # may raise RateLimited
+        result = await scheduler.run(fn, *args, client_id=client_id, request_class="capture")
+    """
+
+    def __init__(self, classes: Dict[str, dict], workers: int = 1):
+        for name, config in classes.items():
+            # rate 0 would make retry_after infinite (Retry-After / JSON can't carry it)
+            if not config["rate"] > 0 or config["burst"] < 1 or not config["weight"] > 0:
+                raise ValueError(f"Request class {name}: rate and weight must be > 0 and burst >= 1, "
+                                 f"got {config}")
+        self.classes = classes
+        self.workers = workers
+        self._busy = 0
+        self._heap = []
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._finish_tags: Dict[Tuple[str, str], float] = {}
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._stats = {name: _ClassStats() for name in classes}
+        # Optional fn -> fn hook applied to every task (profiling.Profiler.wrap)
+        self.task_wrapper: Optional[Callable[[Callable], Callable]] = None
+
+    # ------------------------------------------------------------------
+    # Rate limiting
+    # ------------------------------------------------------------------
+    def admit(self, client_id: str, request_class: str):
+        """Charge one request to the client's token bucket, raise RateLimited if empty"""
+        config = self.classes[request_class]
+        key = (client_id, request_class)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= MAX_BUCKETS:
+                self._prune_buckets()
+            bucket = self._buckets[key] = TokenBucket(config["rate"], config["burst"])
+
+        retry_after = bucket.take()
+        if retry_after > 0:
+            self._stats[request_class].rate_limited += 1
+            raise RateLimited(client_id, request_class, retry_after)
+        self._stats[request_class].admitted += 1
+
+    def _prune_buckets(self):
+        # A full bucket behaves exactly like a fresh one, so it can be forgotten
+        for key in [k for k, b in self._buckets.items() if b.is_full()]:
+            del self._buckets[key]
+            self._finish_tags.pop(key, None)
+
+    # ------------------------------------------------------------------
+    # Fair queueing
+    # ------------------------------------------------------------------
+    def _cost(self, request_class: str) -> float:
+        service_ms = self._stats[request_class].service_ms_avg
+        return (service_ms or 1.0) / self.classes[request_class]["weight"]
+
+    async def acquire(self, client_id: str, request_class: str):
+        """Wait for an inference slot in fair-queueing order"""
+        flow = (client_id, request_class)
+        start_tag = max(self._virtual_time, self._finish_tags.get(flow, 0.0))
+        self._finish_tags[flow] = start_tag + self._cost(request_class)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (start_tag, next(self._seq), future, request_class, time.perf_counter()))
+        self._dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was granted in the same tick the waiter gave up: hand it back
+                self.release()
+            else:
+                future.cancel()
+            raise
+
+    def release(self):
+        self._busy -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._busy < self.workers and self._heap:
+            start_tag, _, future, request_class, queued_at = heapq.heappop(self._heap)
+            if future.done():
+                continue  # waiter cancelled (superseded / disconnected)
+            self._virtual_time = start_tag
+            self._busy += 1
+            self._stats[request_class].waits_ms.append((time.perf_counter() - queued_at) * 1000)
+            future.set_result(None)
+
+    def record_service_time(self, request_class: str, elapsed_ms: float):
+        stats = self._stats[request_class]
+        stats.served += 1
+        if stats.service_ms_avg is None:
+            stats.service_ms_avg = elapsed_ms
+        else:
+            stats.service_ms_avg = 0.9 * stats.service_ms_avg + 0.1 * elapsed_ms
+
+    def wrap_task(self, fn: Callable) -> Callable:
+        return fn if self.task_wrapper is None else self.task_wrapper(fn)
+
+    async def run(self, fn: Callable, *args, client_id: str, request_class: str):
+        """Run fn(*args) in the threadpool once a slot is granted"""
+        await self.acquire(client_id, request_class)
+        start = time.perf_counter()
+        try:
+            return await run_in_threadpool(self.wrap_task(fn), *args)
+        finally:
+            self.record_service_time(request_class, (time.perf_counter() - start) * 1000)
+            self.release()
+
+    def stats(self) -> dict:
+        queued = {name: 0 for name in self.classes}
+        for _, _, future, request_class, _ in self._heap:
+            if not future.done():
+                queued[request_class] += 1
+
+        per_class = {}
+        for name, stats in self._stats.items():
+            waits = np.array(stats.waits_ms) if stats.waits_ms else None
+            per_class[name] = {
+                "weight": self.classes[name]["weight"],
+                "rate_per_client": self.classes[name]["rate"],
+                "burst_per_client": self.classes[name]["burst"],
+                "admitted": stats.admitted,
+                "rate_limited": stats.rate_limited,
+                "served": stats.served,
+                "queued": queued[name],
+                "queue_wait_ms_avg": None if waits is None else round(float(waits.mean()), 1),
+                "queue_wait_ms_p50": None if waits is None else round(float(np.percentile(waits, 50)), 1),
+                "queue_wait_ms_p95": None if waits is None else round(float(np.percentile(waits, 95)), 1),
+                "queue_wait_ms_max": None if waits is None else round(float(waits.max()), 1),
+                "service_ms_avg": None if stats.service_ms_avg is None else round(stats.service_ms_avg, 1),
+            }
+
+        return {
+            "workers": self.workers,
+            "busy": self._busy,
+            "tracked_clients": len({client for client, _ in self._buckets}),
+            "classes": per_class
+        }
+
+
+class _PendingFrame:
+    def __init__(self):
+        self.superseded = asyncio.Event()
+
+
+class LatestFrameCoalescer:
+    """
+    Latest-frame-wins queueing per client.
+
+    submit() returns (status, result) with status:
+        "done"         - fn ran, result is its return value
+        "superseded"   - a newer frame from the same client replaced this one before it started
+        "disconnected" - the client went away before the frame started
+        "cancelled"    - the client went away while the frame was running and fn aborted
+    """
+
+    def __init__(self, scheduler: FairScheduler, request_class: str = "live",
+                 poll_interval: float = 0.05):
+        self.scheduler = scheduler
+        self.request_class = request_class
+        self.poll_interval = poll_interval
+        self._waiting: Dict[str, _PendingFrame] = {}
+        self._counters = {
+            "submitted": 0,
+            "done": 0,
+            "superseded": 0,
+            "disconnected": 0,
+            "cancelled": 0,
+        }
+
+    async def submit(self, client_id: str, request: Request,
+                     fn: Callable, *args) -> Tuple[str, Optional[dict]]:
+        """
+        Run fn(*args, cancel_event) once an inference slot is free, unless a newer
+        frame from client_id arrives first. fn should check cancel_event between
+        stages and return None when it is set.
+        """
+        self._counters["submitted"] += 1
+
+        pending = _PendingFrame()
+        previous = self._waiting.get(client_id)
+        if previous is not None:
+            previous.superseded.set()
+        self._waiting[client_id] = pending
+
+        try:
+            status = await self._wait_for_slot(pending, client_id, request)
+        finally:
+            if self._waiting.get(client_id) is pending:
+                del self._waiting[client_id]
+
+        if status != "started":
+            self._counters[status] += 1
+            return status, None
+
+        cancel_event = threading.Event()
+        watcher = asyncio.ensure_future(self._watch_disconnect(request, cancel_event))
+        start = time.perf_counter()
+        try:
+            result = await run_in_threadpool(self.scheduler.wrap_task(fn), *args, cancel_event)
+        finally:
+            watcher.cancel()
+            self.scheduler.record_service_time(self.request_class, (time.perf_counter() - start) * 1000)
+            self.scheduler.release()
+
+        if result is None and cancel_event.is_set():
+            self._counters["cancelled"] += 1
+            return "cancelled", None
+
+        self._counters["done"] += 1
+        return "done", result
+
+    async def _wait_for_slot(self, pending: _PendingFrame, client_id: str, request: Request) -> str:
+        acquire_task = asyncio.ensure_future(self.scheduler.acquire(client_id, self.request_class))
+        superseded_task = asyncio.ensure_future(pending.superseded.wait())
+        status = None
+        try:
+            while True:
+                done, _ = await asyncio.wait(
+                    {acquire_task, superseded_task},
+                    timeout=self.poll_interval,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if superseded_task in done:
+                    status = "superseded"
+                elif acquire_task in done:
+                    status = "started"
+                elif await request.is_disconnected():
+                    status = "disconnected"
+                if status is not None:
+                    return status
+        finally:
+            superseded_task.cancel()
+            if not acquire_task.done():
+                acquire_task.cancel()
+            elif status != "started" and not acquire_task.cancelled():
+                # Slot was granted in the same tick we gave up: hand it back
+                self.scheduler.release()
+
+    async def _watch_disconnect(self, request: Request, cancel_event: threading.Event):
+        while not cancel_event.is_set():
+            await asyncio.sleep(self.poll_interval)
+            if await request.is_disconnected():
+                cancel_event.set()
+
+    def stats(self) -> dict:
+        return {
+            "waiting_clients": len(self._waiting),
+            **self._counters
+        }
@@ -0,0 +1,335 @@
+"""
+Parallel hyperparameter sweep for the label detector.
+
+Each trial trains train_yolo.train() with a sample of HYPERPARAMS overrides
+drawn from SEARCH_SPACE (trial 0 is the current recipe, as the baseline).
+Up to --parallel trials run at once, each in its own process with:
+    - its own share of the cores (CPU affinity + torch/OpenMP thread count)
+    - an optional address-space cap (--mem-gb, POSIX only)
+All trials read the training split from the same dataset_pack.py pack, built
+once before launching: the images are decoded once and the page cache is
+shared between every trial and dataloader worker.
+
+Early stopping (median rule): after each validation past --grace epochs, a
+trial whose best mAP50-95 so far is below the median of the other trials'
+best at the same epoch is stopped. Trials see each other through
+<sweep>/trials/<trial>/progress.jsonl; Ultralytics runs go to <sweep>/runs/.
+
+At the end every checkpoint is timed through the backend preprocessing path
+(eval_input_sizes.measure_latency) and <sweep>/leaderboard.csv is written,
+best mAP50-95 first. Re-running the same command skips finished trials; a
+trial that died before writing its result.json starts over from epoch 1 (its
+progress.jsonl is rotated to progress.stale.jsonl, its run folder removed).
+
+    python sweep_yolo.py --trials 8 --parallel 4 --epochs 60
+    python sweep_yolo.py --trials 12 --parallel 3 --threads 2 --mem-gb 6 --grace 10
+"""
+import argparse
+import json
+import math
+import multiprocessing as mp
+import os
+import random
+import shutil
+import statistics
+import sys
+import time
+from multiprocessing.connection import wait
+
+# No torch / ultralytics import here: trial processes must set their thread
+# limits before torch is loaded.
+from dataset_pack import build_pack
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SWEEP_DIR = os.path.join(ROOT, "runs", "sweep")
+MAP_KEY = "metrics/mAP50-95(B)"
+MAP50_KEY = "metrics/mAP50(B)"
+
+# list = choice, ("log" | "uniform", low, high) = continuous range
+SEARCH_SPACE = {
+    "optimizer": ["AdamW", "SGD"],
+    "lr0": ("log", 1e-4, 1e-2),
+    "freeze": [0, 5, 10],
+    "hsv_s": ("uniform", 0.3, 0.9),
+    "hsv_v": ("uniform", 0.3, 0.9),
+    "scale": ("uniform", 0.2, 0.6),
+    "degrees": ("uniform", 0.0, 30.0),
+}
+
+
+# ==================================================
+# TRIALS
+# ==================================================
+def sample(space, rng):
+    """One random point of the search space"""
+    hyp = {}
+    for key, values in space.items():
+        if isinstance(values, list):
+            hyp[key] = rng.choice(values)
+        else:
+            kind, low, high = values
+            if kind == "log":
+                value = math.exp(rng.uniform(math.log(low), math.log(high)))
+            else:
+                value = rng.uniform(low, high)
+            hyp[key] = float(f"{value:.4g}")
+    return hyp
+
+
+def make_trials(count, seed, space=SEARCH_SPACE):
+    rng = random.Random(seed)
+    trials = [{"name": "trial00", "hyp": {}}]
+    while len(trials) < count:
+        trials.append({"name": f"trial{len(trials):02d}", "hyp": sample(space, rng)})
+    return trials[:count]
+
+
+def read_jsonl(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def best_until(records, epoch):
+    """Best mAP50-95 reached at or before `epoch`, None if the trial is not that far yet"""
+    if not records or records[-1]["epoch"] < epoch:
+        return None
+    return max(r["map"] for r in records if r["epoch"] <= epoch)
+
+
+def trial_file(sweep_dir, name, filename):
+    return os.path.join(sweep_dir, "trials", name, filename)
+
+
+def median_stop(sweep_dir, name, records, grace, min_peers):
+    """Median stopping rule: below the median of the other trials at the same epoch"""
+    epoch = records[-1]["epoch"]
+    if epoch < grace:
+        return False
+    peers = []
+    for other in os.listdir(os.path.join(sweep_dir, "trials")):
+        if other == name:
+            continue
+        best = best_until(read_jsonl(trial_file(sweep_dir, other, "progress.jsonl")), epoch)
+        if best is not None:
+            peers.append(best)
+    if len(peers) < min_peers:
+        return False
+    return best_until(records, epoch) < statistics.median(peers)
+
+
+# ==================================================
+# TRIAL PROCESS
+# ==================================================
+def limit_resources(cores, threads, mem_gb):
+    """Applied in the trial process before torch is imported (inherited by dataloader workers)"""
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    if mem_gb:
+        try:
+            import resource
+            limit = int(mem_gb * (1 << 30))
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError) as e:
+            print(f"⚠️  Memory limit not applied: {e}")
+
+
+def discard_interrupted_run(sweep_dir, name):
+    """
+    Leftovers of a run killed before result.json: its records must not mix with
+    the new run's (nor count in the peers' median), and its Ultralytics folder
+    would make train() resume it or write to a "<name>2" folder instead
+    """
+    progress = trial_file(sweep_dir, name, "progress.jsonl")
+    if os.path.exists(progress):
+        os.replace(progress, trial_file(sweep_dir, name, "progress.stale.jsonl"))
+        print(f"♻️  {name}: previous run was interrupted, restarting from epoch 1")
+    run_dir = os.path.join(sweep_dir, "runs", name)
+    if os.path.isdir(run_dir):
+        shutil.rmtree(run_dir)
+
+
+def run_trial(trial, config, cores):
+    """Entry point of a trial process; writes <sweep>/trials/<trial>/result.json"""
+    limit_resources(cores, config["threads"], config["mem_gb"])
+
+    import torch
+    from train_yolo import train
+
+    torch.set_num_threads(config["threads"])
+    progress = trial_file(config["sweep_dir"], trial["name"], "progress.jsonl")
+    os.makedirs(os.path.dirname(progress), exist_ok=True)
+    discard_interrupted_run(config["sweep_dir"], trial["name"])
+    state = {"status": "done", "records": []}
+
+    def on_fit_epoch_end(trainer):
+        record = {"epoch": trainer.epoch + 1,
+                  "map50": float(trainer.metrics.get(MAP50_KEY, 0.0)),
+                  "map": float(trainer.metrics.get(MAP_KEY, 0.0))}
+        state["records"].append(record)
+        with open(progress, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        if median_stop(config["sweep_dir"], trial["name"], state["records"],
+                       config["grace"], config["min_peers"]):
+            print(f"✂️  {trial['name']} stopped at epoch {record['epoch']} (below median mAP50-95)")
+            state["status"] = "stopped"
+            trainer.stop = True
+
+    start = time.perf_counter()
+    result = {"name": trial["name"], "hyp": trial["hyp"]}
+    try:
+        best = train(task=config["task"], data=config["data"], imgsz=config["imgsz"],
+                     weights=config["weights"], name=trial["name"], device=config["device"],
+                     batch=config["batch"], workers=config["workers"], pack=True,
+                     epochs=config["epochs"], project=os.path.join(config["sweep_dir"], "runs"),
+                     hyp=trial["hyp"], callbacks={"on_fit_epoch_end": on_fit_epoch_end})
+        result.update(status=state["status"], best=best)
+    except Exception as e:
+        result.update(status="failed", error=repr(e))
+    result["minutes"] = round((time.perf_counter() - start) / 60, 1)
+
+    with open(trial_file(config["sweep_dir"], trial["name"], "result.json"), "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+
+
+# ==================================================
+# SCHEDULER
+# ==================================================
+def core_slots(parallel, threads):
+    """Disjoint core sets, one per concurrent trial (None = no pinning)"""
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    if parallel * threads > len(cores):
+        print(f"⚠️  {parallel} x {threads} threads > {len(cores)} cores: trials are not pinned")
+        return [None] * parallel
+    return [cores[i * threads:(i + 1) * threads] for i in range(parallel)]
+
+
+def run_sweep(trials, config, parallel):
+    """Run the trials, `parallel` at a time; returns the result of every trial"""
+    ctx = mp.get_context("spawn")
+    pending = [t for t in trials if not os.path.exists(trial_file(config["sweep_dir"], t["name"], "result.json"))]
+    if len(pending) < len(trials):
+        print(f"⏭️  {len(trials) - len(pending)} trials already finished")
+
+    free = core_slots(parallel, config["threads"])
+    running = {}   # process sentinel -> (process, trial, cores)
+    while pending or running:
+        while pending and free:
+            trial, cores = pending.pop(0), free.pop(0)
+            process = ctx.Process(target=run_trial, args=(trial, config, cores), name=trial["name"])
+            process.start()
+            running[process.sentinel] = (process, trial, cores)
+            print(f"🚀 {trial['name']} started (cores {cores or 'any'}): {trial['hyp'] or 'baseline recipe'}")
+
+        for sentinel in wait(list(running)):
+            process, trial, cores = running.pop(sentinel)
+            process.join()
+            free.append(cores)
+            if process.exitcode != 0:
+                print(f"❌ {trial['name']} exited with code {process.exitcode}")
+            else:
+                print(f"🏁 {trial['name']} finished")
+
+    results = []
+    for trial in trials:
+        path = trial_file(config["sweep_dir"], trial["name"], "result.json")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                results.append(json.load(f))
+        else:
+            results.append({"name": trial["name"], "hyp": trial["hyp"], "status": "crashed"})
+    return results
+
+
+# ==================================================
+# LEADERBOARD
+# ==================================================
+def leaderboard(results, config, repeats):
+    """mAP from the trial's own validations + backend latency of its best checkpoint"""
+    from eval_input_sizes import load_model, load_split_images, measure_latency, pareto_front, print_table, write_csv
+
+    images = load_split_images(config["data"], "val")
+    rows = []
+    for result in results:
+        records = read_jsonl(trial_file(config["sweep_dir"], result["name"], "progress.jsonl"))
+        best = max(records, key=lambda r: r["map"]) if records else None
+        lat_mean = lat_p95 = None
+        if result.get("best") and os.path.exists(result["best"]) and images:
+            model = load_model(result["best"])
+            lat_mean, lat_p95 = measure_latency(model, images, config["imgsz"], "cpu", repeats)
+        rows.append({
+            "trial": result["name"],
+            "status": result["status"],
+            "epochs": records[-1]["epoch"] if records else 0,
+            "mAP50": round(best["map50"], 4) if best else None,
+            "mAP50-95": round(best["map"], 4) if best else None,
+            "latency_ms": None if lat_mean is None else round(lat_mean, 2),
+            "latency_p95_ms": None if lat_p95 is None else round(lat_p95, 2),
+            "minutes": result.get("minutes"),
+            "hyp": json.dumps(result["hyp"]),
+        })
+
+    rows.sort(key=lambda r: -1 if r["mAP50-95"] is None else r["mAP50-95"], reverse=True)
+    timed = [r for r in rows if r["latency_ms"] is not None]
+    pareto_front(timed, "latency_ms", "mAP50-95")
+    for row in rows:
+        row.setdefault("pareto", "")
+    print_table(rows)
+    write_csv(rows, os.path.join(config["sweep_dir"], "leaderboard.csv"))
+    return rows
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter sweep for the label detector")
+    parser.add_argument("--trials", type=int, default=8, help="Number of configurations (trial00 = current recipe)")
+    parser.add_argument("--parallel", type=int, default=2, help="Trials running at the same time")
+    parser.add_argument("--threads", type=int, help="Torch threads (and pinned cores) per trial "
+                                                     "(default: cores / parallel)")
+    parser.add_argument("--mem-gb", type=float, help="Address-space limit per trial (POSIX)")
+    parser.add_argument("--epochs", type=int, default=60)
+    parser.add_argument("--grace", type=int, default=10, help="Epochs before a trial can be stopped")
+    parser.add_argument("--min-peers", type=int, default=2,
+                        help="Other trials needed at the same epoch before stopping one")
+    parser.add_argument("--task", default="detect")
+    parser.add_argument("--data", default=os.path.join(ROOT, "medicine_dataset", "data.yaml"))
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--weights", help="Initial weights (default: task preset)")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--batch", type=int)
+    parser.add_argument("--workers", type=int, default=1, help="Dataloader workers per trial")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=SWEEP_DIR, help="Sweep folder (trials/, runs/, leaderboard.csv)")
+    parser.add_argument("--repeats", type=int, default=3, help="Latency passes over the val images")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    threads = args.threads or max(1, (os.cpu_count() or 1) // args.parallel)
+    config = {
+        "task": args.task, "data": os.path.abspath(args.data), "imgsz": args.imgsz,
+        "weights": args.weights, "device": args.device, "batch": args.batch,
+        "workers": args.workers, "epochs": args.epochs, "grace": args.grace,
+        "min_peers": args.min_peers, "threads": threads, "mem_gb": args.mem_gb,
+        "sweep_dir": os.path.abspath(args.out),
+    }
+    os.makedirs(os.path.join(config["sweep_dir"], "trials"), exist_ok=True)
+
+    # one pack for every trial, built before any of them starts
+    build_pack(config["data"], "train", args.imgsz)
+
+    trials = make_trials(args.trials, args.seed)
+    print(f"🔬 {len(trials)} trials, {args.parallel} in parallel, {threads} threads each -> {config['sweep_dir']}")
+    results = run_sweep(trials, config, args.parallel)
+
+    if not any(r.get("best") for r in results):
+        print("❌ No trial produced a checkpoint")
+        sys.exit(1)
+    leaderboard(results, config, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,13 +8,26 @@ from datetime import datetime
 # If Windows:
 # pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 
+OCR_CONFIG = r'--oem 3 --psm 6 -l fra'
+
+ROTATIONS = {
+    "0_deg": None,
+    "90_deg": cv2.ROTATE_90_CLOCKWISE,
+    "180_deg": cv2.ROTATE_180,
+    "270_deg": cv2.ROTATE_90_COUNTERCLOCKWISE
+}
+
 def preprocess(image_path):
     img = cv2.imread(image_path)
 
     if img is None:
         raise ValueError("Unable to load image. Check the path.")
 
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return preprocess_image(img)
+
+def preprocess_image(img):
+    """Same preprocessing on an already decoded image (BGR or grayscale)"""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
 
     # Upscale (very important for small text)
     gray = cv2.resize(gray, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
@@ -38,19 +51,17 @@ def preprocess(image_path):
 
     return processed
 
-def extract_text_all_angles(img):
+def extract_text_all_angles(img, angles=None):
+    """
+    Tesseract on each orientation of the image.
+    angles: subset of ROTATIONS keys (default: all four)
+    """
     results = []
-    config = r'--oem 3 --psm 6 -l fra'
-
-    rotations = {
-        "0_deg": img,
-        "90_deg": cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE),
-        "180_deg": cv2.rotate(img, cv2.ROTATE_180),
-        "270_deg": cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
-    }
 
-    for angle, rotated in rotations.items():
-        text = pytesseract.image_to_string(rotated, config=config)
+    for angle in (angles or ROTATIONS):
+        code = ROTATIONS[angle]
+        rotated = img if code is None else cv2.rotate(img, code)
+        text = pytesseract.image_to_string(rotated, config=OCR_CONFIG)
         results.append({
             "orientation": angle,
             "text": text.strip()
@@ -0,0 +1,170 @@
+"""
+Distill the 640 px label detector into smaller-input students (320/416/512).
+
+The labels are large objects in the frame, so a student trained at a lower
+input size keeps most of the accuracy for a fraction of the latency.
+
+Distillation here is teacher pseudo-labelling (hard targets):
+    1. the current model (teacher) predicts on every training image, plus any
+       unlabelled folders given with --unlabeled
+    2. teacher boxes are merged with the ground truth (GT wins on overlap)
+       into medicine_dataset_distill/
+    3. one student per input size is trained with train_yolo.train(),
+       initialized from the teacher weights
+
+Validation and test splits stay on the original ground truth. Compare the
+students afterwards with eval_input_sizes.py.
+"""
+import argparse
+import os
+import shutil
+
+import numpy as np
+from ultralytics import YOLO
+
+from train_yolo import train
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+TEACHER = os.path.join(ROOT, "runs", "detect", "runs", "detect",
+                       "medicine_label_lowdata2", "weights", "best.pt")
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def box_iou(a, b):
+    """IoU between two normalized (cx, cy, w, h) boxes"""
+    ax1, ay1, ax2, ay2 = a[0] - a[2] / 2, a[1] - a[3] / 2, a[0] + a[2] / 2, a[1] + a[3] / 2
+    bx1, by1, bx2, by2 = b[0] - b[2] / 2, b[1] - b[3] / 2, b[0] + b[2] / 2, b[1] + b[3] / 2
+    iw = max(0.0, min(ax2, bx2) - max(ax1, bx1))
+    ih = max(0.0, min(ay2, by2) - max(ay1, by1))
+    inter = iw * ih
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def read_labels(label_path):
+    if not os.path.exists(label_path):
+        return []
+    rows = []
+    with open(label_path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 5:
+                rows.append((int(parts[0]), tuple(map(float, parts[1:]))))
+    return rows
+
+
+def link_or_copy(src, dst):
+    if os.path.exists(dst):
+        return
+    try:
+        os.symlink(os.path.abspath(src), dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def build_distill_dataset(teacher_path, src_root, dst_root, unlabeled_dirs,
+                          teacher_imgsz, pseudo_conf, keep_gt):
+    """Write teacher-labelled train split + data.yaml; returns data.yaml path"""
+    teacher = YOLO(teacher_path)
+
+    dst_images = os.path.join(dst_root, "images", "train")
+    dst_labels = os.path.join(dst_root, "labels", "train")
+    os.makedirs(dst_images, exist_ok=True)
+    os.makedirs(dst_labels, exist_ok=True)
+
+    # (image path, GT label path or None)
+    sources = []
+    train_images = os.path.join(src_root, "images", "train")
+    for filename in sorted(os.listdir(train_images)):
+        if filename.lower().endswith(IMAGE_EXTS):
+            stem = os.path.splitext(filename)[0]
+            sources.append((os.path.join(train_images, filename),
+                            os.path.join(src_root, "labels", "train", stem + ".txt")))
+
+    for folder in unlabeled_dirs:
+        for filename in sorted(os.listdir(folder)):
+            if filename.lower().endswith(IMAGE_EXTS):
+                sources.append((os.path.join(folder, filename), None))
+
+    seen = set()
+    pseudo_boxes = 0
+
+    for img_path, gt_path in sources:
+        filename = os.path.basename(img_path)
+        if filename in seen:
+            continue  # same photo in train and an unlabeled folder: keep the GT copy
+        seen.add(filename)
+
+        results = teacher.predict(img_path, imgsz=teacher_imgsz, conf=pseudo_conf, verbose=False)[0]
+        teacher_rows = []
+        if results.boxes is not None and len(results.boxes) > 0:
+            classes = results.boxes.cls.cpu().numpy().astype(int)
+            xywhn = results.boxes.xywhn.cpu().numpy()
+            teacher_rows = [(int(c), tuple(map(float, b))) for c, b in zip(classes, xywhn)]
+
+        gt_rows = read_labels(gt_path) if (gt_path and keep_gt) else []
+
+        # GT wins; teacher adds boxes the annotation missed
+        rows = list(gt_rows)
+        for cls, box in teacher_rows:
+            if all(box_iou(box, gt_box) < 0.5 for _, gt_box in gt_rows):
+                rows.append((cls, box))
+                pseudo_boxes += 1
+
+        link_or_copy(img_path, os.path.join(dst_images, filename))
+        with open(os.path.join(dst_labels, os.path.splitext(filename)[0] + ".txt"), "w", encoding="utf-8") as f:
+            for cls, box in rows:
+                f.write(f"{cls} " + " ".join(f"{v:.6f}" for v in np.clip(box, 0.0, 1.0)) + "\n")
+
+    src_abs = os.path.abspath(src_root).replace(os.sep, "/")
+    data_yaml = os.path.join(dst_root, "data.yaml")
+    with open(data_yaml, "w", encoding="utf-8") as f:
+        f.write(f"path: {os.path.abspath(dst_root).replace(os.sep, '/')}\n\n")
+        f.write("train: images/train\n")
+        f.write(f"val: {src_abs}/images/val\n")
+        f.write(f"test: {src_abs}/images/test\n\n")
+        f.write('nc: 1\nnames: ["label"]\n')
+
+    print(f"✅ Distillation set: {len(seen)} images, {pseudo_boxes} teacher-only boxes")
+    return data_yaml
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train smaller-input students from the current model")
+    parser.add_argument("--teacher", default=TEACHER)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[320, 416, 512])
+    parser.add_argument("--src", default=os.path.join(ROOT, "medicine_dataset"))
+    parser.add_argument("--dst", default=os.path.join(ROOT, "medicine_dataset_distill"))
+    parser.add_argument("--unlabeled", nargs="*", default=[],
+                        help="Extra image folders labelled only by the teacher")
+    parser.add_argument("--teacher-imgsz", type=int, default=640)
+    parser.add_argument("--pseudo-conf", type=float, default=0.5,
+                        help="Minimum teacher confidence for a pseudo label")
+    parser.add_argument("--no-gt", action="store_true",
+                        help="Train on teacher labels only (pure distillation)")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        if size % 32 != 0:
+            raise ValueError(f"Input size must be a multiple of 32 (YOLO stride): {size}")
+
+    data_yaml = build_distill_dataset(
+        args.teacher, args.src, args.dst, args.unlabeled,
+        args.teacher_imgsz, args.pseudo_conf, keep_gt=not args.no_gt
+    )
+
+    students = {}
+    for size in args.sizes:
+        print(f"\n🎓 Training student @ {size}px")
+        students[size] = train(task="detect", data=data_yaml, imgsz=size,
+                               weights=args.teacher, name=f"medicine_label_student{size}")
+
+    print("\n📦 Students:")
+    for size, ckpt in students.items():
+        print(f" - {size}px: {ckpt}")
+    print("👉 Compare them with: python eval_input_sizes.py --models "
+          + " ".join(f"{ckpt}:{size}" for size, ckpt in students.items()))
+
+
+if __name__ == "__main__":
+    main()
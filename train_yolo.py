@@ -1,31 +1,224 @@
 from ultralytics import YOLO
+from ultralytics.data.dataset import YOLODataset
+from ultralytics.utils import LOGGER, colorstr
+from ultralytics.utils.torch_utils import de_parallel
 import torch
+import argparse
+import inspect
 import os
 import sys
+import time
+
+import cv2
+
+from dataset_pack import PackedImages, build_pack, label_path
+
+# =====================================================
+# TASK PRESETS
+# =====================================================
+# detect: axis-aligned boxes (backend refines rotation with find_label_contour)
+# obb:    oriented boxes, labels produced by convert_obb_labels.py
+TASKS = {
+    "detect": {
+        "data": r"H:/graduation/PharmaLense_Ai/medicine_dataset/data.yaml",
+        "project": "runs/detect",
+        "name": "medicine_label_lowdata",
+        "weights": "yolov8n.pt",
+        "degrees": 10,
+    },
+    "obb": {
+        "data": r"H:/graduation/PharmaLense_Ai/medicine_dataset_obb/data.yaml",
+        "project": "runs/obb",
+        "name": "medicine_label_obb",
+        "weights": "yolov8n-obb.pt",
+        # rotated labels follow the augmentation, so wider angles are cheap data
+        "degrees": 30,
+    },
+}
+
+
+# =====================================================
+# TRAINING RECIPE — OPTIMIZED FOR ~20 IMAGES
+# =====================================================
+# Keys are Ultralytics train() arguments; sweep_yolo.py searches around these.
+HYPERPARAMS = {
+    "optimizer": "AdamW",
+    "lr0": 0.0005,
+    "patience": 50,
+
+    # 🔒 freeze backbone (critical for tiny datasets)
+    "freeze": 10,
+
+    # 🔆 aggressive lighting augmentation
+    "hsv_h": 0.02,
+    "hsv_s": 0.9,
+    "hsv_v": 0.9,
+    "scale": 0.5,
+    "fliplr": 0.5,
+
+    "mosaic": 1.0,
+    "mixup": 0.0,
+    "copy_paste": 0.0,
+}
+
+
+# =====================================================
+# PACKED DATASET (dataset_pack.py)
+# =====================================================
+class PackedYOLODataset(YOLODataset):
+    """
+    YOLODataset whose images come from a dataset_pack.py pack instead of being
+    decoded + resized again at every epoch. Axis-aligned labels come from the
+    pack index too. Falls back to the normal loader if the pack is stale.
+    """
+
+    def __init__(self, *args, pack=None, **kwargs):
+        self.pack = pack
+        self.slots = None
+        super().__init__(*args, **kwargs)
+
+    def get_labels(self):
+        if self.pack.imgsz != self.imgsz or not self.pack.is_current(self.im_files):
+            LOGGER.warning(f"⚠️  Pack {self.pack.pack_dir} is out of date or for another imgsz, "
+                           f"decoding images (rebuild with: python dataset_pack.py build --force)")
+            self.pack = None
+            return super().get_labels()
+
+        self.label_files = [label_path(f) for f in self.im_files]
+        self.slots = [self.pack.slot(f) for f in self.im_files]
+        rows = [self.pack.labels(i) for i in self.slots]
+        if any(lb.shape[1] != 5 for lb in rows):
+            # polygons (obb): let Ultralytics convert them
+            return super().get_labels()
+        return [
+            dict(im_file=f, shape=tuple(self.pack.entries[i]["hw0"]), cls=lb[:, 0:1], bboxes=lb[:, 1:],
+                 segments=[], keypoints=None, normalized=True, bbox_format="xywh")
+            for f, i, lb in zip(self.im_files, self.slots, rows)
+        ]
+
+    def load_image(self, i, rect_mode=True):
+        if self.pack is None or self.ims[i] is not None:
+            return super().load_image(i, rect_mode)
+
+        # same bookkeeping as BaseDataset.load_image, minus imread + resize
+        slot = self.slots[i]
+        im = self.pack.image(slot)
+        h0, w0 = self.pack.entries[slot]["hw0"]
+        if not rect_mode and im.shape[:2] != (self.imgsz, self.imgsz):
+            im = cv2.resize(im, (self.imgsz, self.imgsz), interpolation=cv2.INTER_LINEAR)
+
+        if self.augment:
+            self.ims[i], self.im_hw0[i], self.im_hw[i] = im, (h0, w0), im.shape[:2]
+            self.buffer.append(i)
+            if len(self.buffer) >= self.max_buffer_length:
+                j = self.buffer.pop(0)
+                self.ims[j], self.im_hw0[j], self.im_hw[j] = None, None, None
+
+        return im, (h0, w0), im.shape[:2]
+
+
+def packed_trainer(base, pack):
+    """Trainer class of the task whose training split is read from `pack`"""
+
+    class PackedTrainer(base):
+        def build_dataset(self, img_path, mode="train", batch=None):
+            if mode != "train":
+                return super().build_dataset(img_path, mode, batch)
+            cfg = self.args
+            gs = max(int(de_parallel(self.model).stride.max() if self.model else 0), 32)
+            # same arguments as ultralytics.data.build_yolo_dataset (8.1+ takes task=, 8.0 took use_*)
+            if "task" in inspect.signature(YOLODataset.__init__).parameters:
+                task_args = {"task": cfg.task}
+            else:
+                task_args = {"use_segments": cfg.task == "segment", "use_keypoints": cfg.task == "pose"}
+            return PackedYOLODataset(
+                pack=pack, img_path=img_path, imgsz=cfg.imgsz, batch_size=batch, augment=True,
+                hyp=cfg, rect=cfg.rect, cache=None, single_cls=cfg.single_cls or False,
+                stride=gs, pad=0.0, prefix=colorstr("train: "), classes=cfg.classes,
+                data=self.data, fraction=cfg.fraction, **task_args,
+            )
+
+    return PackedTrainer
+
+
+def add_epoch_timer(model):
+    """Print the wall time of every epoch; returns the list the times are appended to"""
+    times = []
+    start = {}
+
+    def on_epoch_start(trainer):
+        start["t"] = time.perf_counter()
+
+    def on_epoch_end(trainer):
+        times.append(time.perf_counter() - start["t"])
+        print(f"⏱️  Epoch {trainer.epoch + 1}: {times[-1]:.1f}s")
+
+    model.add_callback("on_train_epoch_start", on_epoch_start)
+    model.add_callback("on_train_epoch_end", on_epoch_end)
+    return times
+
+
+def train(task="detect", data=None, imgsz=640, weights=None, name=None,
+          device="auto", batch=None, workers=None, pack=False,
+          epochs=None, project=None, hyp=None, callbacks=None):
+    """
+    Train (or resume) one configuration.
+
+    Args:
+        task: key of TASKS
+        data: data.yaml override (default: task preset)
+        imgsz: training input size
+        weights: initial weights override (default: task preset)
+        name: run name override (default: task preset)
+        device: "auto" (GPU 0 if CUDA is available, else CPU), "cpu" or a GPU index
+        batch: batch size override (default: 2 on GPU, CPU_BATCH_SIZE on CPU)
+        workers: dataloader workers override (default: 2 on GPU, one per core up to 8 on CPU)
+        pack: read the training split from a dataset_pack.py pack (built if missing or stale)
+        epochs: number of epochs (default: 200)
+        project: runs folder override (default: task preset)
+        hyp: HYPERPARAMS overrides, e.g. {"lr0": 0.001, "freeze": 5}
+        callbacks: {ultralytics event: function(trainer)} added to the model
+
+    Returns: path of the best checkpoint
+    """
+    preset = TASKS[task]
 
-def main():
     # =====================================================
     # PATHS & BASIC CONFIG
     # =====================================================
-    DATA_YAML = r"H:/graduation/PharmaLense_Ai/medicine_dataset/data.yaml"
-    PROJECT_DIR = "runs/detect"
-    EXP_NAME = "medicine_label_lowdata"
+    DATA_YAML = data or preset["data"]
+    PROJECT_DIR = project or preset["project"]
+    EXP_NAME = name or preset["name"]
     WEIGHTS_DIR = os.path.join(PROJECT_DIR, EXP_NAME, "weights")
     LAST_CKPT = os.path.join(WEIGHTS_DIR, "last.pt")
+    INIT_WEIGHTS = weights or preset["weights"]
 
-    EPOCHS = 200
+    EPOCHS = epochs or 200
     SAVE_EVERY = 20
-    IMG_SIZE = 640
+    IMG_SIZE = imgsz
     BATCH_SIZE = 2   # safe for GTX 1070 + low data
+    CPU_BATCH_SIZE = 8   # no VRAM limit; bigger batches amortize per-step overhead
 
     # =====================================================
-    # GPU CHECK (HARD FAIL)
+    # DEVICE (GPU, or CPU on build boxes)
     # =====================================================
-    if not torch.cuda.is_available():
-        print("❌ CUDA not available. Aborting.")
-        sys.exit(1)
+    if device == "auto":
+        device = "0" if torch.cuda.is_available() else "cpu"
 
-    print(f"✅ GPU detected: {torch.cuda.get_device_name(0)}")
+    if device == "cpu":
+        DEVICE = "cpu"
+        BATCH_SIZE = batch or CPU_BATCH_SIZE
+        WORKERS = workers if workers is not None else min(8, os.cpu_count() or 1)
+        print(f"🖥️  Training on CPU ({os.cpu_count()} cores, batch {BATCH_SIZE}, workers {WORKERS})")
+    else:
+        # an explicit GPU request still hard-fails without CUDA
+        if not torch.cuda.is_available():
+            print("❌ CUDA not available. Aborting (use --device cpu to train on CPU).")
+            sys.exit(1)
+        DEVICE = int(device) if str(device).isdigit() else device
+        BATCH_SIZE = batch or BATCH_SIZE
+        WORKERS = workers if workers is not None else 2
+        print(f"✅ GPU detected: {torch.cuda.get_device_name(0)}")
 
     if not os.path.exists(DATA_YAML):
         raise FileNotFoundError(f"data.yaml not found: {DATA_YAML}")
@@ -39,13 +232,26 @@ def main():
         resume = True
         pretrained = False
     else:
-        print("🆕 Starting fresh from yolov8n.pt")
-        model = YOLO("yolov8n.pt")
+        print(f"🆕 Starting fresh from {INIT_WEIGHTS} (task: {task}, imgsz: {IMG_SIZE})")
+        model = YOLO(INIT_WEIGHTS)
         resume = False
         pretrained = True
 
     # =====================================================
-    # TRAINING — OPTIMIZED FOR ~20 IMAGES
+    # DATA LOADING: decode every epoch, or memory-mapped pack
+    # =====================================================
+    trainer = None
+    if pack:
+        pack_dir = build_pack(DATA_YAML, "train", IMG_SIZE)
+        trainer = packed_trainer(model.task_map[model.task]["trainer"], PackedImages(pack_dir))
+        print(f"📦 Training images read from {pack_dir}")
+
+    epoch_times = add_epoch_timer(model)
+    for event, callback in (callbacks or {}).items():
+        model.add_callback(event, callback)
+
+    # =====================================================
+    # TRAINING
     # =====================================================
     model.train(
         data=DATA_YAML,
@@ -53,41 +259,57 @@ def main():
         imgsz=IMG_SIZE,
         batch=BATCH_SIZE,
 
-        optimizer="AdamW",
-        lr0=0.0005,
-        patience=50,
-
-        # 🔒 freeze backbone (critical for tiny datasets)
-        freeze=10,
-
-        # 🔆 aggressive lighting augmentation
-        hsv_h=0.02,
-        hsv_s=0.9,
-        hsv_v=0.9,
-        degrees=10,
-        scale=0.5,
-        fliplr=0.5,
-
-        mosaic=1.0,
-        mixup=0.0,
-        copy_paste=0.0,
+        # recipe, task rotation range, then per-run overrides (sweep_yolo.py)
+        **{**HYPERPARAMS, "degrees": preset["degrees"], **(hyp or {})},
 
         # hardware
-        device=0,
+        device=DEVICE,
         amp=False,          # Pascal-safe
-        workers=2,
-        cache=False,
+        workers=WORKERS,
+        cache=False,        # the pack (--pack) replaces the RAM/disk caches
 
         # saving & resume
         save_period=SAVE_EVERY,   # ✅ save every 20 epochs
         resume=resume,            # ✅ resume if stopped
         project=PROJECT_DIR,
         name=EXP_NAME,
-        pretrained=pretrained
+        pretrained=pretrained,
+        trainer=trainer,
     )
 
+    if epoch_times:
+        print(f"⏱️  Epoch time: first {epoch_times[0]:.1f}s, "
+              f"mean {sum(epoch_times) / len(epoch_times):.1f}s over {len(epoch_times)} epochs")
+
+    best_ckpt = f"{PROJECT_DIR}/{EXP_NAME}/weights/best.pt"
     print("🎉 Training finished.")
-    print(f"📦 Best model: {PROJECT_DIR}/{EXP_NAME}/weights/best.pt")
+    print(f"📦 Best model: {best_ckpt}")
+    return best_ckpt
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the medicine label detector")
+    parser.add_argument("--task", choices=sorted(TASKS), default="detect",
+                        help="detect (axis-aligned) or obb (oriented boxes)")
+    parser.add_argument("--data", help="Override the data.yaml of the task preset")
+    parser.add_argument("--imgsz", type=int, default=640, help="Training input size")
+    parser.add_argument("--weights", help="Initial weights (default: task preset)")
+    parser.add_argument("--name", help="Run name (default: task preset)")
+    parser.add_argument("--device", default="auto",
+                        help="auto (GPU if available, else CPU), cpu, or a GPU index")
+    parser.add_argument("--batch", type=int, help="Batch size (default: 2 on GPU, 8 on CPU)")
+    parser.add_argument("--workers", type=int, help="Dataloader workers (default: 2 on GPU, cores on CPU)")
+    parser.add_argument("--pack", action="store_true",
+                        help="Decode + resize the training images once into a memory-mapped pack "
+                             "(dataset_pack.py) instead of at every epoch; saves image loading time only")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    train(task=args.task, data=args.data, imgsz=args.imgsz,
+          weights=args.weights, name=args.name, device=args.device,
+          batch=args.batch, workers=args.workers, pack=args.pack)
 
 if __name__ == "__main__":
     main()